@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from accounts.stats import refresh_user_stats, user_stats_refreshed_at, user_stats_stale
+
+
+class Command(BaseCommand):
+    help = "Refresh the accounts_user_stats materialized view when it is older than USER_STATS_MAX_AGE"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-age", type=int, default=None, help="seconds, overrides USER_STATS_MAX_AGE")
+        parser.add_argument("--force", action="store_true", help="refresh even if the view is fresh")
+        parser.add_argument(
+            "--blocking", action="store_true",
+            help="plain REFRESH: faster, but readers wait for it to finish",
+        )
+
+    def handle(self, *args, **opts):
+        if not opts["force"] and not user_stats_stale(opts["max_age"]):
+            self.stdout.write(f"User stats are fresh (refreshed at {user_stats_refreshed_at()})")
+            return
+
+        self.stdout.write(self.style.WARNING("Refreshing user stats..."))
+        if not refresh_user_stats(concurrently=not opts["blocking"]):
+            self.stdout.write("User stats are a plain view on this database, nothing to refresh")
+            return
+        self.stdout.write(self.style.SUCCESS(f"User stats refreshed at {user_stats_refreshed_at()}"))
@@ -3,43 +3,61 @@ from django.db import models
 from django.db.models import Count, Sum, F, Value, OuterRef, Subquery
 from django.db.models.functions import Coalesce
 
-from orders.models import Order, OrderItem1, OrderItem2
+from orders.models import Order
 
 
 class UserQuerySet(models.QuerySet):
+    def with_stats(self, strategy: str = "subquery") -> "UserQuerySet":
+        """
+        Annotates orders_count, items1_count, items1_spent, items2_count and items2_spent.
 
-    def with_stats(self) -> "UserQuerySet":
+        Item numbers come from the denormalized totals on Order, the item tables
+        are not read. strategy="subquery" runs five correlated subqueries over the
+        user's orders per user row, cheap when only a few users are selected.
+        strategy="join" LEFT JOINs the orders and groups the rows by user in one
+        pass, which wins when most users are selected (reports over long ranges,
+        exports). It adds a GROUP BY, so annotate it last.
+        """
+        if strategy == "subquery":
+            return self._with_stats_subquery()
+        if strategy == "join":
+            return self._with_stats_join()
+        raise ValueError(f"unknown stats strategy: {strategy}")
+
+    def with_cached_stats(self) -> "UserQuerySet":
+        """
+        Annotates the same fields as with_stats plus stats_refreshed_at, read
+        from the accounts_user_stats view with one LEFT JOIN instead of being
+        computed. The numbers are as of the last refresh_user_stats(); users
+        created since then get zeros and a NULL stats_refreshed_at.
+        """
         money_field = models.DecimalField(max_digits=18, decimal_places=2)
         zero_money = Value(0, output_field=money_field)
 
-        orders_count_sq = (
-            Order.objects
-            .filter(user=OuterRef("pk"))
-            .order_by()
-            .values("user")
-            .annotate(c=Count("id"))
-            .values("c")
+        return self.annotate(
+            orders_count=Coalesce(F("cached_stats__orders_count"), Value(0)),
+            items1_count=Coalesce(F("cached_stats__items1_count"), Value(0)),
+            items1_spent=Coalesce(F("cached_stats__items1_spent"), zero_money),
+            items2_count=Coalesce(F("cached_stats__items2_count"), Value(0)),
+            items2_spent=Coalesce(F("cached_stats__items2_spent"), zero_money),
+            stats_refreshed_at=F("cached_stats__refreshed_at"),
         )
 
-        items1_base = (
-            OrderItem1.objects
-            .filter(order__user=OuterRef("pk"))
-            .order_by()
-            .values("order__user")
-        )
-        items1_count_sq = items1_base.annotate(c=Count("id")).values("c")
-        items1_spent_sq = items1_base.annotate(s=Sum("price")).values("s")
+    def _with_stats_subquery(self) -> "UserQuerySet":
+        money_field = models.DecimalField(max_digits=18, decimal_places=2)
+        zero_money = Value(0, output_field=money_field)
 
-        items2_base = (
-            OrderItem2.objects
-            .filter(order__user=OuterRef("pk"))
+        user_orders = (
+            Order.objects
+            .filter(user=OuterRef("pk"))
             .order_by()
-            .values("order__user")
+            .values("user")
         )
-        items2_count_sq = items2_base.annotate(c=Count("id")).values("c")
-        items2_spent_sq = items2_base.annotate(
-            s=Sum(F("placement_price") + F("article_price"))
-        ).values("s")
+        orders_count_sq = user_orders.annotate(c=Count("*")).values("c")
+        items1_count_sq = user_orders.annotate(c=Sum("items1_count")).values("c")
+        items1_spent_sq = user_orders.annotate(s=Sum("items1_total")).values("s")
+        items2_count_sq = user_orders.annotate(c=Sum("items2_count")).values("c")
+        items2_spent_sq = user_orders.annotate(s=Sum("items2_total")).values("s")
 
         return self.annotate(
             orders_count=Coalesce(
@@ -64,7 +82,18 @@ class UserQuerySet(models.QuerySet):
             ),
         )
 
+    def _with_stats_join(self) -> "UserQuerySet":
+        money_field = models.DecimalField(max_digits=18, decimal_places=2)
+        zero_money = Value(0, output_field=money_field)
+
+        return self.annotate(
+            orders_count=Count("orders"),
+            items1_count=Coalesce(Sum("orders__items1_count"), Value(0)),
+            items1_spent=Coalesce(Sum("orders__items1_total"), zero_money),
+            items2_count=Coalesce(Sum("orders__items2_count"), Value(0)),
+            items2_spent=Coalesce(Sum("orders__items2_total"), zero_money),
+        )
+
 
 class UserManagerQS(BaseUserManager.from_queryset(UserQuerySet)):
     pass
-
@@ -0,0 +1,70 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# frozen here, later changes to the view need a migration of their own
+USER_STATS_VIEW = "accounts_user_stats"
+SELECT = """
+    SELECT
+        u.id AS user_id,
+        CAST(count(o.user_id) AS INTEGER) AS orders_count,
+        CAST(coalesce(sum(o.items1_count), 0) AS INTEGER) AS items1_count,
+        CAST(coalesce(sum(o.items1_total), 0) AS DECIMAL(18, 2)) AS items1_spent,
+        CAST(coalesce(sum(o.items2_count), 0) AS INTEGER) AS items2_count,
+        CAST(coalesce(sum(o.items2_total), 0) AS DECIMAL(18, 2)) AS items2_spent,
+        {now} AS refreshed_at
+    FROM accounts_user u
+    LEFT JOIN orders_order o ON o.user_id = u.id
+    GROUP BY u.id
+"""
+
+
+def create_view(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        if schema_editor.connection.vendor == "postgresql":
+            cursor.execute(f"CREATE MATERIALIZED VIEW {USER_STATS_VIEW} AS {SELECT.format(now='now()')}")
+            cursor.execute(f"CREATE UNIQUE INDEX {USER_STATS_VIEW}_user_id ON {USER_STATS_VIEW} (user_id)")
+        else:
+            cursor.execute(f"CREATE VIEW {USER_STATS_VIEW} AS {SELECT.format(now='CURRENT_TIMESTAMP')}")
+
+
+def drop_view(apps, schema_editor):
+    kind = "MATERIALIZED VIEW" if schema_editor.connection.vendor == "postgresql" else "VIEW"
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP {kind} IF EXISTS {USER_STATS_VIEW}")
+
+
+class Migration(migrations.Migration):
+    """
+    The unmanaged UserStats model and the accounts_user_stats view behind it,
+    built from the Order totals, see accounts.stats. It comes after the last
+    orders migration rebuilding orders_order, SQLite cannot rebuild a table
+    a view depends on.
+    """
+
+    dependencies = [
+        ('accounts', '0003_covering_indexes'),
+        ('orders', '0010_covering_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='cached_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('orders_count', models.IntegerField()),
+                ('items1_count', models.IntegerField()),
+                ('items1_spent', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('items2_count', models.IntegerField()),
+                ('items2_spent', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'accounts_user_stats',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_view, drop_view),
+    ]
@@ -14,5 +14,36 @@ class User(AbstractUser):
 
     objects = UserManagerQS()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # report ranges over date_joined read everything they need from the index,
+            # and the (date_joined, id) keyset of the user stats pages is its key
+            models.Index(fields=["date_joined", "id"], include=["is_active"], name="accounts_user_joined_id_cover"),
+        ]
+
     def __str__(self):
         return f"{self.username} {self.date_joined}"
+
+
+class UserStats(models.Model):
+    """Row of the accounts_user_stats materialized view, see accounts.stats."""
+    user = models.OneToOneField(
+        User,
+        primary_key=True,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="cached_stats",
+    )
+    orders_count = models.IntegerField()
+    items1_count = models.IntegerField()
+    items1_spent = models.DecimalField(max_digits=18, decimal_places=2)
+    items2_count = models.IntegerField()
+    items2_spent = models.DecimalField(max_digits=18, decimal_places=2)
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = "accounts_user_stats"
+
+    def __str__(self):
+        return f"{self.user_id} stats @ {self.refreshed_at}"
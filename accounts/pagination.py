@@ -0,0 +1,90 @@
+import base64
+import binascii
+import uuid
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class JoinedKeysetPagination(BasePagination):
+    """
+    Keyset pagination of users on (date_joined, id). The cursor holds the key
+    of the last row of the page and the next page is the rows after it, found
+    by a range scan of the (date_joined, id) index, so deep pages cost the
+    same as the first one. Only forward (next) links are provided.
+    """
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            joined, pk = position
+            # the plain >= bounds the index scan, the OR picks up where the page ended
+            queryset = queryset.filter(
+                Q(date_joined__gt=joined) | Q(date_joined=joined, id__gt=pk),
+                date_joined__gte=joined,
+            )
+
+        rows = list(queryset.order_by("date_joined", "id")[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.last = rows[-1] if rows else None
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last))
+
+    @staticmethod
+    def encode_cursor(user) -> str:
+        key = f"{user.date_joined.isoformat()}|{user.pk}"
+        return base64.urlsafe_b64encode(key.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            joined, pk = base64.urlsafe_b64decode(encoded.encode()).decode().split("|")
+            joined = parse_datetime(joined)
+            pk = uuid.UUID(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if joined is None:
+            raise NotFound(self.invalid_cursor_message)
+        return joined, pk
@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from rest_framework import serializers
+
+User = get_user_model()
+
+
+class JoinedRangeSerializer(serializers.Serializer):
+    joined_from = serializers.DateField(required=False, allow_null=True)
+    joined_to = serializers.DateField(required=False, allow_null=True)
+
+    def validate(self, data):
+        if data.get("joined_from") and data.get("joined_to"):
+            if data["joined_to"] < data["joined_from"]:
+                raise serializers.ValidationError(
+                    {"joined_to": "joined_to must be >= joined_from."}
+                )
+        return super().validate(data)
+
+
+class UserStatsSerializer(serializers.ModelSerializer):
+    """A user with the with_stats (or with_cached_stats) annotations."""
+    orders_count = serializers.IntegerField(read_only=True)
+    items1_count = serializers.IntegerField(read_only=True)
+    items1_spent = serializers.DecimalField(max_digits=18, decimal_places=2, read_only=True)
+    items2_count = serializers.IntegerField(read_only=True)
+    items2_spent = serializers.DecimalField(max_digits=18, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = User
+        fields = (
+            "id", "username", "email", "is_active", "date_joined",
+            "orders_count", "items1_count", "items1_spent", "items2_count", "items2_spent",
+        )
@@ -0,0 +1,51 @@
+"""
+Per-user lifetime stats cached in the accounts_user_stats materialized view
+(PostgreSQL; other backends get a plain view that is always current).
+
+The view is built from the denormalized totals on Order, one row per user,
+and read through the unmanaged accounts.models.UserStats model (created by
+migration accounts/0004_user_stats). It has a unique index on user_id, so it
+can be refreshed CONCURRENTLY without blocking readers. Every row carries the
+time of the refresh that produced it.
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+USER_STATS_VIEW = "accounts_user_stats"
+
+
+def user_stats_refreshed_at(using: str = DEFAULT_DB_ALIAS) -> Optional[datetime]:
+    """Time of the last refresh, None when the view holds no rows."""
+    from accounts.models import UserStats
+
+    return UserStats.objects.using(using).values_list("refreshed_at", flat=True).first()
+
+
+def user_stats_stale(max_age: Optional[int] = None, using: str = DEFAULT_DB_ALIAS) -> bool:
+    """Whether the last refresh is older than `max_age` seconds (default: settings.USER_STATS_MAX_AGE)."""
+    if connections[using].vendor != "postgresql":
+        return False
+    if max_age is None:
+        max_age = getattr(settings, "USER_STATS_MAX_AGE", 300)
+    refreshed_at = user_stats_refreshed_at(using)
+    return refreshed_at is None or timezone.now() - refreshed_at > timedelta(seconds=max_age)
+
+
+def refresh_user_stats(concurrently: bool = True, using: str = DEFAULT_DB_ALIAS) -> bool:
+    """
+    Recomputes the view. CONCURRENTLY keeps it readable during the refresh at
+    the price of diffing against the old contents; a plain refresh is faster
+    but locks readers out. Returns False on backends with a plain view.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"REFRESH MATERIALIZED VIEW {'CONCURRENTLY ' if concurrently else ''}{USER_STATS_VIEW}"
+        )
+    return True
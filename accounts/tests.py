@@ -1,20 +1,38 @@
+import csv
+import gzip
+import io
+import json
 import random
+import tempfile
+import time
 import uuid
-from datetime import timedelta
+from datetime import date, timedelta
 from decimal import Decimal
+from unittest import mock
 
-from django.db.models import Case, When, Value, DateTimeField, Count, Sum, F
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Sum, F
 from django.db.models.functions import Coalesce
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.utils import timezone
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 
 
-from orders.models import Order, OrderItem1, OrderItem2
+from accounts.stats import refresh_user_stats, user_stats_stale
+from orders.bulk import bulk_load
+from orders.models import DailyReportRollup, Order, OrderItem1, OrderItem2, PendingRollupDay
 from report import generate_user_orders_report, print_report_by_rows
-from report.chrono import as_aware_datetime
+from report.approx import iter_rows_approx
+from report.bench import compare, percentile
+from report.cache import PeriodCellCache, report_cache
+from report.chrono import as_aware_datetime, count_buckets, count_periods, iter_buckets, iter_period_starts
+from report.generator import empty_row, iter_rows_per_period
 from report.period import Period
+from report.rollup import ROLLUP_FIELDS, iter_rows_from_rollups, refresh_pending_rollup_days, refresh_rollup_days
+from report.snapshot import Snapshot, export_snapshot
+from report.vectorized import ReportFrame
 
 User = get_user_model()
 
@@ -31,7 +49,6 @@ class TestReport(TestCase):
     ORDERS_PER_USER = 50
     ITEMS_PER_ORDER = 10
     BATCH = 500
-    FLUSH_EVERY_ORDERS = 250
 
     @classmethod
     def setUpTestData(cls):
@@ -40,73 +57,57 @@ class TestReport(TestCase):
         def rand_dt(days_back: int = 120):
             return now - timedelta(days=random.randint(0, days_back))
 
-        def rand_money(a: int, b: int) -> Decimal:
-            return Decimal(str(random.uniform(a, b))).quantize(Decimal("0.01"))
+        def rand_money(a: int, b: int) -> str:
+            cents = random.randint(a * 100, b * 100)
+            return f"{cents // 100}.{cents % 100:02d}"
 
-        users = [
-            User(
-                id=uuid.uuid4(),
-                username=f"user_{i}",
-                email=f"user_{i}@example.com",
-                is_active=True,
-                date_joined=rand_dt(),
-            )
-            for i in range(cls.USERS)
-        ]
-        join_map = {u.id: u.date_joined for u in users}
-        User.objects.bulk_create(users, batch_size=cls.BATCH)
-        whens = [When(id=user_id, then=Value(dt)) for user_id, dt in join_map.items()]
-        User.objects.filter(id__in=join_map.keys()).update(
-            date_joined=Case(*whens, output_field=DateTimeField())
+        user_ids = [uuid.uuid4() for _ in range(cls.USERS)]
+        bulk_load(
+            User,
+            ("id", "username", "email", "is_active", "date_joined"),
+            (
+                (user_id, f"user_{i}", f"user_{i}@example.com", True, rand_dt())
+                for i, user_id in enumerate(user_ids)
+            ),
+            batch_size=cls.BATCH,
         )
-        users = list(User.objects.only("id"))
-
-        orders = []
-        for u in users:
-            for _ in range(cls.ORDERS_PER_USER):
-                orders.append(
-                    Order(
-                        id=uuid.uuid4(),
-                        user=u,
-                        created_at=rand_dt(),
-                    )
-                )
-        Order.objects.bulk_create(orders, batch_size=cls.BATCH)
-
-        orders = list(Order.objects.only("id"))
 
-        item1_buf: list[OrderItem1] = []
-        item2_buf: list[OrderItem2] = []
-
-        for idx, order in enumerate(orders, start=1):
-            for _ in range(cls.ITEMS_PER_ORDER):
-                item1_buf.append(
-                    OrderItem1(
-                        order=order,
-                        price=rand_money(1, 500),
-                        created_at=rand_dt(),
-                    )
-                )
-                item2_buf.append(
-                    OrderItem2(
-                        order=order,
-                        placement_price=rand_money(10, 300),
-                        article_price=rand_money(5, 200),
-                        created_at=rand_dt(),
-                    )
-                )
-
-            if idx % cls.FLUSH_EVERY_ORDERS == 0:
-                OrderItem1.objects.bulk_create(item1_buf, batch_size=cls.BATCH)
-                OrderItem2.objects.bulk_create(item2_buf, batch_size=cls.BATCH)
-                item1_buf.clear()
-                item2_buf.clear()
+        order_ids = [uuid.uuid4() for _ in range(cls.USERS * cls.ORDERS_PER_USER)]
+        bulk_load(
+            Order,
+            ("id", "user_id", "created_at"),
+            (
+                (order_id, user_ids[idx // cls.ORDERS_PER_USER], rand_dt())
+                for idx, order_id in enumerate(order_ids)
+            ),
+            batch_size=cls.BATCH,
+        )
 
-        if item1_buf:
-            OrderItem1.objects.bulk_create(item1_buf, batch_size=cls.BATCH)
-            OrderItem2.objects.bulk_create(item2_buf, batch_size=cls.BATCH)
+        bulk_load(
+            OrderItem1,
+            ("order_id", "price", "created_at"),
+            (
+                (order_id, rand_money(1, 500), rand_dt())
+                for order_id in order_ids
+                for _ in range(cls.ITEMS_PER_ORDER)
+            ),
+            batch_size=cls.BATCH,
+        )
+        bulk_load(
+            OrderItem2,
+            ("order_id", "placement_price", "article_price", "created_at"),
+            (
+                (order_id, rand_money(10, 300), rand_money(5, 200), rand_dt())
+                for order_id in order_ids
+                for _ in range(cls.ITEMS_PER_ORDER)
+            ),
+            batch_size=cls.BATCH,
+        )
+        # COPY skips the item signals
+        Order.objects.refresh_item_totals()
 
     def setUp(self):
+        report_cache.clear()
         self.url = reverse('user-orders-report')
         self.maxDiff = None
         self.user = User.objects.create(username="testuser", email="test@example.com")
@@ -123,6 +124,7 @@ class TestReport(TestCase):
                 "start_date": start_date.date().isoformat(),
                 "end_date": end_date.date().isoformat(),
                 "period": Period.DAILY,
+                "page_size": 100,
             }
         )
         response_rows = response.json()["results"]
@@ -169,3 +171,371 @@ class TestReport(TestCase):
         self.assertEqual(actual_report, expected_report)
 
         print_report_by_rows(report_rows)
+
+    def test_bucketed_engine_matches_per_period(self):
+        start_date, end_date = get_start_end_datetime()
+
+        reference = [
+            r.to_dict()
+            for r in generate_user_orders_report(start=start_date, end=end_date, engine="subquery")
+        ]
+        with self.assertNumQueries(1):
+            bucketed = [
+                r.to_dict()
+                for r in generate_user_orders_report(start=start_date, end=end_date, engine="bucketed")
+            ]
+
+        self.assertEqual(reference, bucketed)
+
+    def test_with_stats_strategies_match(self):
+        fields = ("id", "orders_count", "items1_count", "items1_spent", "items2_count", "items2_spent")
+        start_date, end_date = get_start_end_datetime()
+
+        for users in (User.objects.all(), User.objects.filter(date_joined__gte=start_date, date_joined__lt=end_date)):
+            subquery = list(users.with_stats().order_by("id").values(*fields))
+            join = list(users.with_stats(strategy="join").order_by("id").values(*fields))
+            self.assertEqual(subquery, join)
+
+        with self.assertRaises(ValueError):
+            User.objects.with_stats(strategy="lateral")
+
+    def test_cached_stats_match_after_refresh(self):
+        fields = ("id", "orders_count", "items1_count", "items1_spent", "items2_count", "items2_spent")
+        refresh_user_stats()
+        self.assertFalse(user_stats_stale(max_age=60))
+
+        computed = list(User.objects.with_stats().order_by("id").values(*fields))
+        cached = list(User.objects.with_cached_stats().order_by("id").values(*fields))
+        self.assertEqual(computed, cached)
+
+        user = User.objects.create(username="no_stats_yet", email="no_stats_yet@example.com")
+        stats = User.objects.with_cached_stats().get(pk=user.pk)
+        self.assertEqual((stats.orders_count, stats.items1_spent), (0, 0))
+        if connection.vendor != "postgresql":
+            # a plain view, always current
+            return
+        self.assertIsNone(stats.stats_refreshed_at)
+
+        call_command("refresh_user_stats", force=True, stdout=io.StringIO())
+        self.assertIsNotNone(User.objects.with_cached_stats().get(pk=user.pk).stats_refreshed_at)
+
+    def test_export_user_stats(self):
+        start_date, end_date = get_start_end_datetime()
+        expected = list(
+            User.objects.filter(date_joined__gte=start_date, date_joined__lt=end_date)
+            .with_stats().order_by("date_joined", "id").values("id", "orders_count", "items1_spent")
+        )
+        params = {"joined_from": start_date.date().isoformat(), "joined_to": end_date.date().isoformat()}
+
+        response = self.client.get(reverse("user-stats-export"), params)
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        rows = list(csv.DictReader(io.StringIO(gzip.decompress(b"".join(response.streaming_content)).decode())))
+        self.assertEqual(
+            [(row["id"], int(row["orders_count"]), Decimal(row["items1_spent"])) for row in rows],
+            [(str(row["id"]), row["orders_count"], row["items1_spent"]) for row in expected],
+        )
+
+        with tempfile.TemporaryDirectory() as path:
+            output = f"{path}/stats.ndjson.gz"
+            call_command("export_user_stats", format="ndjson", output=output, chunk_size=7, stdout=io.StringIO())
+            with gzip.open(output, "rt") as f:
+                lines = [json.loads(line) for line in f]
+        self.assertEqual(len(lines), User.objects.count())
+        self.assertEqual(sum(line["orders_count"] for line in lines), Order.objects.count())
+
+        response = self.client.get(reverse("user-stats-export"), {"joined_from": "2025-02-01", "joined_to": "2025-01-01"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_user_stats_keyset_pages(self):
+        url = reverse("user-stats")
+        expected = list(
+            User.objects.with_stats().order_by("date_joined", "id").values_list("id", "orders_count")
+        )
+
+        pages, next_url = [], f"{url}?page_size=7"
+        while next_url:
+            with self.assertNumQueries(1):
+                page = self.client.get(next_url).json()
+            pages.append(page["results"])
+            next_url = page["next"]
+
+        self.assertTrue(all(len(page) == 7 for page in pages[:-1]))
+        self.assertEqual(
+            [(row["id"], row["orders_count"]) for page in pages for row in page],
+            [(str(pk), orders_count) for pk, orders_count in expected],
+        )
+        self.assertEqual(self.client.get(url, {"cursor": "not-a-cursor"}).status_code, 404)
+
+    def test_approx_engine(self):
+        start_date, end_date = get_start_end_datetime()
+        bounds = list(iter_period_starts(start_date, end_date, Period.WEEKLY))
+        exact = [r.to_dict() for r in iter_rows_per_period(bounds)]
+
+        whole = [r.to_dict() for r in iter_rows_approx(bounds, percent=100)]
+        self.assertEqual([r["orders_count"] for r in whole], [r["orders_count"] for r in exact])
+        self.assertEqual(whole[0]["orders_count_ci"], [exact[0]["orders_count"]] * 2)
+
+        response = self.client.get(self.url, {
+            "start_date": start_date.date().isoformat(),
+            "end_date": end_date.date().isoformat(),
+            "accuracy": "approx",
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("orderitem1_amount_ci", response.json()["results"][0])
+        self.assertEqual(len(report_cache), 0)
+
+        if connection.vendor != "postgresql":
+            # no TABLESAMPLE, always exact
+            return
+        sampled = list(iter_rows_approx(bounds, percent=50, seed=7))
+        self.assertEqual(sampled, list(iter_rows_approx(bounds, percent=50, seed=7)))
+        for row in sampled:
+            self.assertEqual((row.sample_percent, row.orders_sample_percent), (50, 50))
+            for name, (low, high) in row.intervals.items():
+                self.assertLessEqual(low, getattr(row, name))
+                self.assertLessEqual(getattr(row, name), high)
+
+    def test_rollup_engine_matches_per_period(self):
+        call_command("refresh_rollups", stdout=io.StringIO())
+        start_date, end_date = get_start_end_datetime()
+
+        reference = [
+            r.to_dict()
+            for r in generate_user_orders_report(start=start_date, end=end_date, engine="subquery")
+        ]
+        # the rollups and the queued days of the range
+        with self.assertNumQueries(2):
+            rollup = [
+                r.to_dict()
+                for r in generate_user_orders_report(start=start_date, end=end_date, engine="rollup")
+            ]
+
+        self.assertEqual(reference, rollup)
+
+    def test_rollups_follow_writes(self):
+        refresh_rollup_days()
+        day = timezone.localdate(self.user.date_joined)
+
+        def rollup_values():
+            return DailyReportRollup.objects.filter(day=day).values(*ROLLUP_FIELDS).first()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(user=self.user, created_at=timezone.now())
+            OrderItem1.objects.create(order=order, price=Decimal("10.50"), created_at=timezone.now())
+            OrderItem2.objects.create(
+                order=order,
+                placement_price=Decimal("1.25"),
+                article_price=Decimal("2.00"),
+                created_at=timezone.now(),
+            )
+        # queued for the worker, not refreshed on commit
+        self.assertTrue(PendingRollupDay.objects.filter(day=day).exists())
+        # until then the rollup engine computes the queued day live
+        bounds = [(as_aware_datetime(day), as_aware_datetime(day + timedelta(days=1)))]
+        self.assertEqual(
+            [r.to_dict() for r in iter_rows_from_rollups(bounds)],
+            [r.to_dict() for r in iter_rows_per_period(bounds)],
+        )
+        call_command("run_report_worker", once=True, stdout=io.StringIO())
+        self.assertFalse(PendingRollupDay.objects.exists())
+        maintained = rollup_values()
+        self.assertEqual(maintained["orders_count"], Order.objects.filter(user__date_joined__date=day).count())
+
+        refresh_rollup_days([day])
+        self.assertEqual(maintained, rollup_values())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.delete()
+        self.assertEqual(refresh_pending_rollup_days(), 1)
+        self.assertEqual(rollup_values()["orders_count"], maintained["orders_count"] - 1)
+
+    def test_vectorized_engine_matches_per_period(self):
+        start_date, end_date = get_start_end_datetime()
+        frame = ReportFrame.load()
+        bounds = list(iter_period_starts(start_date, end_date, Period.DAILY))
+
+        reference = [r.to_dict() for r in iter_rows_per_period(bounds)]
+        with self.assertNumQueries(0):
+            vectorized = [r.to_dict() for r in frame.rows(bounds)]
+
+        self.assertEqual(reference, vectorized)
+
+    def test_snapshot_engine_matches_per_period(self):
+        start_date, end_date = get_start_end_datetime()
+        bounds = list(iter_period_starts(start_date, end_date, Period.DAILY))
+
+        with tempfile.TemporaryDirectory() as path:
+            manifest = export_snapshot(path, chunk_size=1000)
+            self.assertEqual(manifest["tables"]["items1"]["rows"], OrderItem1.objects.count())
+            self.assertEqual(
+                [r.to_dict() for r in Snapshot.open(path).frame().rows(bounds)],
+                [r.to_dict() for r in iter_rows_per_period(bounds)],
+            )
+
+            order = Order.objects.create(user=self.user, created_at=timezone.now())
+            OrderItem1.objects.create(order=order, price=Decimal("7.00"), created_at=timezone.now())
+            manifest = export_snapshot(path, chunk_size=1000)
+
+            self.assertEqual((manifest["generation"], manifest["base"]), (2, 1))
+            self.assertEqual(manifest["tables"]["orders"]["rows"], Order.objects.count())
+            self.assertEqual(
+                [r.to_dict() for r in Snapshot.open(path).frame().rows(bounds)],
+                [r.to_dict() for r in iter_rows_per_period(bounds)],
+            )
+
+            order.delete()
+            manifest = export_snapshot(path, chunk_size=1000)
+            self.assertEqual((manifest["generation"], manifest["base"]), (3, 2))
+            self.assertEqual(manifest["tables"]["orders"]["rows"], Order.objects.count())
+
+            # updates of exported rows do not move the watermarks or row counts
+            User.objects.filter(pk=self.user.pk).update(is_active=not self.user.is_active)
+            self.assertEqual(export_snapshot(path, chunk_size=1000)["base"], 3)
+            OrderItem1.objects.filter(pk=OrderItem1.objects.order_by("id").values("id")[:1]).update(price=F("price") + 1)
+            self.assertEqual(export_snapshot(path, chunk_size=1000)["base"], 4)
+            self.assertEqual(export_snapshot(path, chunk_size=1000)["base"], 4)
+            self.assertEqual(
+                [r.to_dict() for r in Snapshot.open(path).frame().rows(bounds)],
+                [r.to_dict() for r in iter_rows_per_period(bounds)],
+            )
+
+    def test_cache_recomputes_only_open_period(self):
+        start_date, end_date = get_start_end_datetime()
+        cache = PeriodCellCache()
+
+        first = [r.to_dict() for r in generate_user_orders_report(start=start_date, end=end_date, cache=cache)]
+        # the last week is open, partial weeks at the edges are not shared
+        closed_whole_weeks = len([row for row in first[:-1] if not row["partial"]])
+        self.assertEqual(cache.stats()["hits"], 0)
+        self.assertEqual(len(cache), closed_whole_weeks)
+
+        # the shared generation and the open week
+        with self.assertNumQueries(2):
+            second = [r.to_dict() for r in generate_user_orders_report(start=start_date, end=end_date, cache=cache)]
+        self.assertEqual(first, second)
+        self.assertEqual(cache.stats()["hits"], closed_whole_weeks)
+
+
+class TestPeriodCellCache(SimpleTestCase):
+    def setUp(self):
+        self.day = as_aware_datetime(timezone.now() - timedelta(days=30))
+
+    def cell(self, offset: int):
+        start = self.day + timedelta(days=offset)
+        return (start, start + timedelta(days=1), Period.DAILY)
+
+    def test_lru_eviction(self):
+        cache = PeriodCellCache(max_size=2)
+        for offset in range(3):
+            if offset == 2:
+                cache.get(self.cell(0))
+            cache.set(self.cell(offset), empty_row(*self.cell(offset)[:2]))
+
+        self.assertIsNotNone(cache.get(self.cell(0)))
+        self.assertIsNone(cache.get(self.cell(1)))
+        self.assertIsNotNone(cache.get(self.cell(2)))
+        self.assertEqual(cache.stats(), {"size": 2, "max_size": 2, "hits": 3, "misses": 1})
+
+    def test_open_period_is_not_stored(self):
+        cache = PeriodCellCache()
+        start = as_aware_datetime(timezone.now())
+        open_cell = (start, start + timedelta(days=1), Period.DAILY)
+        cache.set(open_cell, empty_row(*open_cell[:2]))
+        self.assertEqual(len(cache), 0)
+
+    def test_invalidate_days(self):
+        cache = PeriodCellCache()
+        for offset in range(3):
+            cache.set(self.cell(offset), empty_row(*self.cell(offset)[:2]))
+
+        cache.invalidate_days([(self.day + timedelta(days=1)).date()])
+
+        self.assertIsNone(cache.get(self.cell(1)))
+        self.assertEqual(len(cache), 2)
+
+    def test_expired_cell_is_recomputed(self):
+        cache = PeriodCellCache(ttl=60)
+        cache.set(self.cell(0), empty_row(*self.cell(0)[:2]))
+        with mock.patch("report.cache.time.monotonic", return_value=time.monotonic() + 61):
+            self.assertIsNone(cache.get(self.cell(0)))
+        self.assertEqual(len(cache), 0)
+
+    def test_row_computed_before_a_newer_sync_is_dropped(self):
+        cache = PeriodCellCache()
+        with mock.patch("report.cache.shared_generation", return_value=1):
+            generation = cache.sync()
+        with mock.patch("report.cache.shared_generation", return_value=2):
+            cache.sync()
+        cache.set(self.cell(0), empty_row(*self.cell(0)[:2]), generation)
+        self.assertEqual(len(cache), 0)
+
+
+class TestChrono(SimpleTestCase):
+    def test_count_periods_matches_iteration(self):
+        for start in (date(2024, 1, 31), date(2024, 2, 29), date(2025, 3, 1)):
+            for days in (0, 1, 6, 7, 30, 31, 59, 366, 800):
+                for period in Period:
+                    start_date = as_aware_datetime(start)
+                    end_date = as_aware_datetime(start + timedelta(days=days), end_of_day=True)
+                    bounds = list(iter_period_starts(start_date, end_date, period))
+                    self.assertEqual(count_periods(start_date, end_date, period), len(bounds))
+                    self.assertEqual(
+                        list(iter_period_starts(start_date, end_date, period, offset=2, limit=3)),
+                        bounds[2:5],
+                    )
+
+    def test_buckets_are_calendar_aligned(self):
+        # Wednesday 2025-01-15 through Monday 2025-03-03
+        start, end = as_aware_datetime(date(2025, 1, 15)), as_aware_datetime(date(2025, 3, 4))
+
+        weeks = list(iter_buckets(start, end, Period.WEEKLY))
+        self.assertEqual(weeks[0].start, as_aware_datetime(date(2025, 1, 13)))
+        self.assertEqual(weeks[0].bounds, (start, as_aware_datetime(date(2025, 1, 20))))
+        self.assertTrue(weeks[0].partial)
+        self.assertFalse(any(week.partial for week in weeks[1:-1]))
+        self.assertEqual(weeks[-1].bounds, (as_aware_datetime(date(2025, 3, 3)), end))
+        self.assertTrue(weeks[-1].partial)
+
+        months = list(iter_buckets(start, end, Period.MONTHLY))
+        self.assertEqual([month.start.date() for month in months], [date(2025, 1, 1), date(2025, 2, 1), date(2025, 3, 1)])
+        self.assertEqual([month.partial for month in months], [True, False, True])
+
+        self.assertFalse(any(day.partial for day in iter_buckets(start, end, Period.DAILY)))
+
+    @override_settings(REPORT_TIME_ZONE="Europe/Berlin")
+    def test_buckets_follow_report_timezone_across_dst(self):
+        start, end = as_aware_datetime(date(2025, 3, 29)), as_aware_datetime(date(2025, 4, 1))
+        days = list(iter_buckets(start, end, Period.DAILY))
+
+        self.assertEqual([day.start.hour for day in days], [0, 0, 0])
+        self.assertEqual(days[1].end.timestamp() - days[1].start.timestamp(), 23 * 3600)
+        self.assertEqual(count_buckets(start, end, Period.DAILY), 3)
+
+
+class TestBench(SimpleTestCase):
+    def test_percentile(self):
+        timings = [5.0, 1.0, 4.0, 2.0, 3.0]
+        self.assertEqual(percentile(timings, 50), 3.0)
+        self.assertEqual(percentile(timings, 95), 5.0)
+        self.assertEqual(percentile([7.0], 95), 7.0)
+
+    def test_compare_flags_regressions(self):
+        baseline = {
+            "a": {"p50_ms": 10.0, "queries": 1},
+            "b": {"p50_ms": 10.0, "queries": 1},
+            "c": {"p50_ms": 10.0, "queries": 1},
+        }
+        results = {
+            "a": {"p50_ms": 11.0, "queries": 1},
+            "b": {"p50_ms": 13.0, "queries": 1},
+            "c": {"p50_ms": 9.0, "queries": 2},
+            "new": {"p50_ms": 1.0, "queries": 1},
+        }
+
+        comparison = compare(results, baseline, threshold=0.2)
+
+        self.assertEqual(set(comparison), {"a", "b", "c"})
+        self.assertFalse(comparison["a"]["regression"])
+        self.assertTrue(comparison["b"]["regression"])
+        self.assertTrue(comparison["c"]["regression"])
+        self.assertEqual(comparison["c"]["queries_delta"], 1)
@@ -0,0 +1,7 @@
+from django.urls import path
+from accounts.views import UserStatsExportView, UserStatsListView
+
+urlpatterns = [
+    path("users/stats/", UserStatsListView.as_view(), name="user-stats"),
+    path("users/stats/export/", UserStatsExportView.as_view(), name="user-stats-export"),
+]
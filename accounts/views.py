@@ -1,3 +1,53 @@
-from django.shortcuts import render
+from django.contrib.auth import get_user_model
+from django.http import StreamingHttpResponse
+from rest_framework.generics import ListAPIView
+from rest_framework.views import APIView
 
-# Create your views here.
+from accounts.export import export_rows, iter_export
+from accounts.pagination import JoinedKeysetPagination
+from accounts.serializers import JoinedRangeSerializer, UserStatsSerializer
+from admix.streaming import CSVRenderer, NDJSONRenderer
+from report.chrono import as_aware_datetime
+
+
+class UserStatsListView(ListAPIView):
+    """
+    Users with their order and item stats, ordered by (date_joined, id) and
+    keyset paginated (?cursor=, ?page_size=), optionally limited to the
+    joined_from/joined_to range. The stats are correlated subqueries, so they
+    are only computed for the rows of the returned page.
+    """
+    serializer_class = UserStatsSerializer
+    pagination_class = JoinedKeysetPagination
+
+    def get_queryset(self):
+        serializer = JoinedRangeSerializer(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        joined_from = serializer.validated_data.get("joined_from")
+        joined_to = serializer.validated_data.get("joined_to")
+
+        users = get_user_model().objects.all()
+        if joined_from is not None:
+            users = users.filter(date_joined__gte=as_aware_datetime(joined_from))
+        if joined_to is not None:
+            users = users.filter(date_joined__lte=as_aware_datetime(joined_to, end_of_day=True))
+        return users.with_stats("subquery")
+
+
+class UserStatsExportView(APIView):
+    """
+    Streams the per-user stats of the users who joined in the optional
+    joined_from/joined_to range as a gzip-compressed ?format=csv (default)
+    or ?format=ndjson file.
+    """
+    renderer_classes = [CSVRenderer, NDJSONRenderer]
+
+    def get(self, request):
+        serializer = JoinedRangeSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        fmt = request.accepted_renderer.format
+        rows = export_rows(serializer.validated_data.get("joined_from"), serializer.validated_data.get("joined_to"))
+        response = StreamingHttpResponse(iter_export(fmt, rows), content_type="application/gzip")
+        response["Content-Disposition"] = f'attachment; filename="user-stats.{fmt}.gz"'
+        return response
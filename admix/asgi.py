@@ -3,6 +3,9 @@ ASGI config for admix project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server (e.g. ``uvicorn admix.asgi:application``) to get
+the concurrent, disconnect-aware ``reports/user-orders/async/`` endpoint.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
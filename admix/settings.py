@@ -70,6 +70,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'admix.wsgi.application'
+ASGI_APPLICATION = 'admix.asgi.application'
 
 
 # Database
@@ -123,3 +124,59 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+
+
+# Reports
+
+# Timezone report days, ISO weeks and months are aligned to (default: TIME_ZONE)
+REPORT_TIME_ZONE = os.getenv("REPORT_TIME_ZONE", TIME_ZONE)
+
+# Upper bound of closed period rows kept by report.cache.report_cache (per process)
+REPORT_CACHE_MAX_CELLS = int(os.getenv("REPORT_CACHE_MAX_CELLS", "10000"))
+
+# Seconds a cached report row is served before it is recomputed, a bound for
+# writes that neither send report_days_changed nor call bump_shared_generation
+REPORT_CACHE_TTL = float(os.getenv("REPORT_CACHE_TTL", "3600"))
+
+# Worker threads (and so DB connections) the async report view computes periods on
+REPORT_ASYNC_WORKERS = int(os.getenv("REPORT_ASYNC_WORKERS", "4"))
+
+# Seconds the in-memory NumPy frame of the "vectorized" report engine is reused before reloading
+REPORT_FRAME_MAX_AGE = int(os.getenv("REPORT_FRAME_MAX_AGE", "300"))
+
+# Directory of the columnar snapshot written by export_snapshot and read by the "snapshot" report engine
+REPORT_SNAPSHOT_DIR = Path(os.getenv("REPORT_SNAPSHOT_DIR", BASE_DIR / "snapshots"))
+
+# POST reports/user-orders/batch/: most reports per request and most periods over all of them
+REPORT_BATCH_MAX_REPORTS = int(os.getenv("REPORT_BATCH_MAX_REPORTS", "50"))
+REPORT_BATCH_MAX_PERIODS = int(os.getenv("REPORT_BATCH_MAX_PERIODS", "10000"))
+
+# Opt-in report request profiling: Server-Timing header on the report endpoint
+# and per-period SQL statement counts/times logged to "report.profiling"
+REPORT_PROFILING = os.getenv("REPORT_PROFILING", "0") == "1"
+
+# With profiling on, log the EXPLAIN plans of this many slowest statements per request
+REPORT_PROFILING_EXPLAIN_SLOWEST = int(os.getenv("REPORT_PROFILING_EXPLAIN_SLOWEST", "0"))
+
+# Seconds after which refresh_user_stats considers the accounts_user_stats view stale
+USER_STATS_MAX_AGE = int(os.getenv("USER_STATS_MAX_AGE", "300"))
+
+# ?accuracy=approx reports: rows to sample from the user and from the order
+# table (the fractions are derived from the planner's estimates of the tables),
+# TABLESAMPLE method (BERNOULLI or SYSTEM) and REPEATABLE seed (empty: a new
+# sample every time)
+REPORT_APPROX_SAMPLE_ROWS = int(os.getenv("REPORT_APPROX_SAMPLE_ROWS", "50000"))
+REPORT_APPROX_METHOD = os.getenv("REPORT_APPROX_METHOD", "BERNOULLI")
+_approx_seed = os.getenv("REPORT_APPROX_SEED", "0")
+REPORT_APPROX_SEED = int(_approx_seed) if _approx_seed else None
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "report.profiling": {"handlers": ["console"], "level": "INFO", "propagate": False},
+    },
+}
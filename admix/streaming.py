@@ -0,0 +1,60 @@
+"""
+Shared pieces of the streamed CSV/NDJSON responses of the accounts and
+orders apps: line encoders for StreamingHttpResponse bodies and the
+renderers that make ?format=ndjson|csv negotiable.
+"""
+import csv
+import json
+from typing import Iterable, Iterator, Sequence
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class _Echo:
+    """File-like object for csv.writer that hands back the written line."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv_lines(rows: Iterable[Sequence], header: Sequence[str]) -> Iterator[bytes]:
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header).encode()
+    for row in rows:
+        yield writer.writerow(row).encode()
+
+
+def iter_ndjson_lines(objects: Iterable[dict], encoder_class=JSONEncoder) -> Iterator[bytes]:
+    encoder = encoder_class(separators=(",", ":"))
+    for obj in objects:
+        yield (encoder.encode(obj) + "\n").encode()
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Rows are streamed by the views, the renderer makes ?format=ndjson
+    negotiable and renders non-streamed responses (errors) as one JSON line.
+    """
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return (json.dumps(data, cls=JSONEncoder) + "\n").encode()
+
+
+class CSVRenderer(BaseRenderer):
+    """See NDJSONRenderer, non-streamed responses are rendered as key,value lines."""
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        writer = csv.writer(_Echo())
+        items = data.items() if isinstance(data, dict) else enumerate(data)
+        return "".join(writer.writerow([key, value]) for key, value in items).encode()
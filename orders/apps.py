@@ -3,3 +3,13 @@ from django.apps import AppConfig
 
 class OrdersConfig(AppConfig):
     name = 'orders'
+
+    def ready(self):
+        from orders.signals import connect_order_totals_signals, connect_report_signals, report_days_changed
+        from report.cache import invalidate_cache_on_change
+        from report.rollup import queue_rollups_on_change
+
+        connect_report_signals()
+        connect_order_totals_signals()
+        report_days_changed.connect(queue_rollups_on_change)
+        report_days_changed.connect(invalidate_cache_on_change)
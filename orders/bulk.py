@@ -0,0 +1,175 @@
+"""
+Bulk loading of generated rows without building model instances.
+
+On PostgreSQL rows are streamed into the table with COPY ... FROM STDIN (text
+format), everywhere else they go through bulk_create in batches. Rows are plain
+tuples matching `fields`; concrete fields that are not given get their model
+default. Loading bypasses save() and model signals, so anything maintained
+by signals (Order item totals, report rollups, report cache) has to be
+refreshed by the caller (report.cache.bump_shared_generation for the cache).
+"""
+import datetime
+import uuid
+from decimal import Decimal
+from itertools import islice
+from typing import Iterable, Iterator, Optional, Sequence
+
+from django.db import DEFAULT_DB_ALIAS, connections, models
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def copy_text_value(value) -> str:
+    """Formats a Python value as a COPY text format field."""
+    if value is None:
+        return "\\N"
+    if value is True:
+        return "t"
+    if value is False:
+        return "f"
+    if isinstance(value, (int, Decimal, uuid.UUID)):
+        return str(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value).translate(_COPY_ESCAPES)
+
+
+class _CopyStream:
+    """Read-only file object producing COPY text lines from row tuples on demand."""
+
+    def __init__(self, rows: Iterable[tuple], chunk_rows: int):
+        self._rows = iter(rows)
+        self._chunk_rows = chunk_rows
+        self._buffer = b""
+        self.count = 0
+
+    def _fill(self, size: int):
+        while size < 0 or len(self._buffer) < size:
+            chunk = list(islice(self._rows, self._chunk_rows))
+            if not chunk:
+                return
+            self.count += len(chunk)
+            self._buffer += "".join(
+                "\t".join(map(copy_text_value, row)) + "\n" for row in chunk
+            ).encode()
+
+    def read(self, size: int = -1) -> bytes:
+        self._fill(size)
+        if size < 0:
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def chunks(self, size: int) -> Iterator[bytes]:
+        while data := self.read(size):
+            yield data
+
+
+def _load_fields(model, fields: Sequence[str]) -> tuple[list[models.Field], list[models.Field]]:
+    """Fields given by the rows, and the remaining concrete fields filled with defaults."""
+    opts = model._meta
+    given = [opts.get_field(name) for name in fields]
+    missing = [
+        field for field in opts.concrete_fields
+        if field not in given and not isinstance(field, models.AutoField)
+    ]
+    return given, missing
+
+
+def _with_defaults(rows: Iterable[tuple], missing: list[models.Field]) -> Iterator[tuple]:
+    if not missing:
+        yield from rows
+        return
+
+    now = timezone.now()
+    auto_now = _auto_now_fields(missing)
+    constant, per_row = {}, []
+    for idx, field in enumerate(missing):
+        if field in auto_now:
+            constant[idx] = now
+        elif callable(field.default):
+            per_row.append((idx, field))
+        else:
+            constant[idx] = field.get_default()
+
+    defaults = [constant.get(idx) for idx in range(len(missing))]
+    for row in rows:
+        values = list(defaults)
+        for idx, field in per_row:
+            values[idx] = field.get_default()
+        yield (*row, *values)
+
+
+def _copy(model, columns: list[str], rows: Iterable[tuple], connection, batch_size: int) -> int:
+    qn = connection.ops.quote_name
+    sql = "COPY {} ({}) FROM STDIN".format(qn(model._meta.db_table), ", ".join(qn(c) for c in columns))
+    stream = _CopyStream(rows, chunk_rows=batch_size)
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, "copy_expert"):
+            # psycopg2
+            raw.copy_expert(sql, stream, size=1 << 16)
+        else:
+            # psycopg 3
+            with raw.copy(sql) as copy:
+                for data in stream.chunks(1 << 16):
+                    copy.write(data)
+    return stream.count
+
+
+def _auto_now_fields(fields: list[models.Field]) -> list[models.Field]:
+    return [
+        field for field in fields
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+    ]
+
+
+def _bulk_create(model, given: list[models.Field], rows: Iterable[tuple], using: str, batch_size: int) -> int:
+    objects = model._default_manager.using(using)
+    pk_name = model._meta.pk.name
+    auto_now = _auto_now_fields(given)
+    rows = iter(rows)
+    count = 0
+    while batch := list(islice(rows, batch_size)):
+        objs = [model(**{field.attname: value for field, value in zip(given, row)}) for row in batch]
+        # bulk_create overwrites auto_now(_add) fields, the given values are put back afterwards
+        restore = {field: [getattr(obj, field.attname) for obj in objs] for field in auto_now}
+        objects.bulk_create(objs, batch_size=batch_size)
+        for field, values in restore.items():
+            whens = [When(**{pk_name: obj.pk}, then=Value(value)) for obj, value in zip(objs, values)]
+            objects.filter(pk__in=[obj.pk for obj in objs]).update(
+                **{field.attname: Case(*whens, output_field=DateTimeField())}
+            )
+            for obj, value in zip(objs, values):
+                setattr(obj, field.attname, value)
+        count += len(objs)
+    return count
+
+
+def bulk_load(
+    model,
+    fields: Sequence[str],
+    rows: Iterable[tuple],
+    *,
+    using: str = DEFAULT_DB_ALIAS,
+    batch_size: int = 5000,
+    use_copy: Optional[bool] = None,
+) -> int:
+    """
+    Loads `rows` (tuples of values for `fields`, by field name or attname) into
+    the table of `model` and returns the number of rows loaded. `rows` may be a
+    generator, it is consumed `batch_size` rows at a time. use_copy=None picks
+    COPY on PostgreSQL and bulk_create elsewhere.
+    """
+    connection = connections[using]
+    given, missing = _load_fields(model, fields)
+    if use_copy is None:
+        use_copy = connection.vendor == "postgresql"
+
+    if use_copy:
+        columns = [field.column for field in (*given, *missing)]
+        return _copy(model, columns, _with_defaults(rows, missing), connection, batch_size)
+    return _bulk_create(model, given, rows, using, batch_size)
@@ -0,0 +1,126 @@
+import json
+import platform
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection
+from django.utils import timezone
+
+from orders.models import DailyReportRollup, Order, OrderItem1, OrderItem2
+from report.bench import BENCH_ANCHOR, BENCH_SEED, RANGES, SCALES, compare, dataset_matches, iter_cases, run_cases
+from report.generator import DEFAULT_ENGINE, ENGINES
+
+
+class Command(BaseCommand):
+    help = "Benchmark the user/orders report on a fixed-scale dataset and compare with a baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", choices=SCALES, default="S")
+        parser.add_argument(
+            "--reseed", action="store_true",
+            help="delete all users (and rows referencing them), orders and items and seed the dataset even if it looks current",
+        )
+        parser.add_argument("--engines", nargs="+", choices=ENGINES, default=[DEFAULT_ENGINE])
+        parser.add_argument("--ranges", nargs="+", choices=RANGES, default=list(RANGES))
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--warmup", type=int, default=1)
+        parser.add_argument("--workers", type=int, default=1, help="seed_db workers when seeding")
+        parser.add_argument("--output", help="write the results as JSON to this file")
+        parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+        parser.add_argument("--threshold", type=float, default=0.2, help="p50 slowdown counted as regression")
+        parser.add_argument("--fail-on-regression", action="store_true")
+
+    def handle(self, *args, **opts):
+        if opts["repeat"] < 1:
+            raise CommandError("--repeat must be positive")
+
+        scale_name = opts["scale"]
+        scale = SCALES[scale_name]
+        self.prepare_dataset(scale_name, opts["reseed"], opts["workers"])
+
+        cases = iter_cases(opts["engines"], {name: RANGES[name] for name in opts["ranges"]})
+        self.stdout.write(self.style.WARNING(f"Running cases ({opts['repeat']} runs each)..."))
+        results = run_cases(cases, opts["repeat"], opts["warmup"])
+
+        baseline = None
+        if opts["baseline"]:
+            with open(opts["baseline"]) as f:
+                baseline = json.load(f)
+            if baseline["scale"] != scale_name:
+                raise CommandError(f"baseline was recorded at scale {baseline['scale']}, not {scale_name}")
+        comparison = compare(results, baseline["cases"], opts["threshold"]) if baseline else {}
+
+        self.print_results(results, comparison)
+
+        if opts["output"]:
+            output = Path(opts["output"])
+            output.parent.mkdir(parents=True, exist_ok=True)
+            output.write_text(json.dumps(
+                {
+                    "scale": scale_name,
+                    "dataset": {"users": scale.users, "orders": scale.orders, "items": scale.items},
+                    "recorded_at": timezone.now().isoformat(),
+                    "python": platform.python_version(),
+                    "repeat": opts["repeat"],
+                    "cases": results,
+                },
+                indent=2,
+            ))
+            self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+        regressions = [name for name, diff in comparison.items() if diff["regression"]]
+        if regressions:
+            message = f"{len(regressions)} regression(s): {', '.join(regressions)}"
+            if opts["fail_on_regression"]:
+                raise CommandError(message)
+            self.stdout.write(self.style.ERROR(message))
+
+    def prepare_dataset(self, scale_name, reseed, workers):
+        scale = SCALES[scale_name]
+        User = get_user_model()
+        if not reseed and dataset_matches(scale):
+            self.stdout.write(f"Reusing the {scale_name} dataset")
+            return
+
+        if not reseed and User.objects.exists():
+            raise CommandError(
+                f"the database holds data that does not match scale {scale_name}, "
+                f"use --reseed to replace it"
+            )
+
+        self.stdout.write(self.style.WARNING(f"Seeding the {scale_name} dataset..."))
+        # flush the tables directly, deleting through the ORM would fire the
+        # report signals for every row
+        tables = [model._meta.db_table for model in (User, Order, OrderItem1, OrderItem2, DailyReportRollup)]
+        connection.ops.execute_sql_flush(connection.ops.sql_flush(no_style(), tables, reset_sequences=True, allow_cascade=True))
+        call_command(
+            "seed_db",
+            users=scale.users,
+            orders_per_user=scale.orders_per_user,
+            items_per_order=scale.items_per_order,
+            workers=workers,
+            seed=BENCH_SEED,
+            anchor=BENCH_ANCHOR.isoformat(),
+            stdout=self.stdout,
+        )
+
+    def print_results(self, results, comparison):
+        width = max(len(name) for name in results)
+        header = f"{'case':<{width}}  {'p50 ms':>10}  {'p95 ms':>10}  {'queries':>7}  {'db ms':>10}  {'rows':>6}"
+        if comparison:
+            header += f"  {'vs base':>8}"
+        self.stdout.write(header)
+        for name, result in results.items():
+            line = (
+                f"{name:<{width}}  {result['p50_ms']:>10.2f}  {result['p95_ms']:>10.2f}  "
+                f"{result['queries']:>7}  {result['db_ms']:>10.2f}  {result['rows']:>6}"
+            )
+            diff = comparison.get(name)
+            if diff:
+                line += f"  {diff['p50_ratio']:>7.2f}x"
+                if diff["regression"]:
+                    line = self.style.ERROR(line)
+            self.stdout.write(line)
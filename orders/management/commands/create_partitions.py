@@ -0,0 +1,41 @@
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from orders.partitions import (
+    MONTHS_AHEAD, PARTITIONED_TABLES, detach_partitions, ensure_partitions, is_partitioned, month_start,
+)
+
+
+class Command(BaseCommand):
+    help = "Create the monthly item partitions ahead of time and optionally detach old ones (PostgreSQL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months-ahead", type=int, default=MONTHS_AHEAD)
+        parser.add_argument(
+            "--detach-before", type=parse_date,
+            help="detach partitions of months before this date (YYYY-MM-DD) into standalone tables",
+        )
+
+    def handle(self, *args, **opts):
+        if connection.vendor != "postgresql":
+            raise CommandError("partitioning is only used on PostgreSQL")
+        if opts["months_ahead"] < 0:
+            raise CommandError("--months-ahead must be >= 0")
+
+        until = month_start(timezone.now().date()) + relativedelta(months=opts["months_ahead"])
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(connection, table):
+                raise CommandError(f"{table} is not partitioned, run migrate first")
+
+            created = ensure_partitions(connection, table, until=until)
+            self.stdout.write(self.style.SUCCESS(
+                f"{table}: created {', '.join(created)}" if created else f"{table}: partitions through {until:%Y-%m} exist"
+            ))
+
+            if opts["detach_before"]:
+                detached = detach_partitions(connection, table, before=opts["detach_before"])
+                for name in detached:
+                    self.stdout.write(self.style.WARNING(f"{table}: detached {name}"))
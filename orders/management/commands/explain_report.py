@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils.dateparse import parse_date
+
+from report import UserOrdersReport
+from report.chrono import report_localdate
+from report.generator import DEFAULT_ENGINE, ENGINES
+from report.period import Period
+from report.profiling import ReportProfile, explain
+
+
+class Command(BaseCommand):
+    help = "Print EXPLAIN (ANALYZE, BUFFERS) of every statement the report issues for a range"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", type=parse_date, help="YYYY-MM-DD (default: 90 days before --end)")
+        parser.add_argument("--end", type=parse_date, help="YYYY-MM-DD (default: today)")
+        parser.add_argument("--period", choices=[p.value for p in Period], default=Period.WEEKLY.value)
+        parser.add_argument("--engine", choices=ENGINES, default=DEFAULT_ENGINE)
+        parser.add_argument("--no-analyze", action="store_true", help="plans only, do not run the statements again")
+
+    def handle(self, *args, **opts):
+        if connection.vendor != "postgresql":
+            raise CommandError("EXPLAIN (ANALYZE, BUFFERS) output is PostgreSQL specific")
+
+        end = opts["end"] or report_localdate()
+        start = opts["start"] or end - timedelta(days=90)
+        if end < start:
+            raise CommandError("--end must be >= --start")
+
+        profile = ReportProfile()
+        report = UserOrdersReport(start, end, period=Period(opts["period"]), engine=opts["engine"], profile=profile)
+        rows = list(report)
+
+        self.stdout.write(self.style.WARNING(
+            f"{opts['engine']} report {start} - {end} ({opts['period']}): "
+            f"{len(rows)} rows, {len(profile.statements)} statements"
+        ))
+        for number, statement in enumerate(profile.statements, start=1):
+            self.stdout.write(self.style.SUCCESS(
+                f"\n#{number} period {statement.period}, {statement.duration * 1000:.2f} ms"
+            ))
+            self.stdout.write(statement.sql)
+            self.stdout.write(explain(statement, analyze=not opts["no_analyze"]))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from orders.models import Order
+from orders.signals import mark_report_days
+from report.chrono import report_localdate
+
+
+class Command(BaseCommand):
+    help = "Compare the denormalized item totals of orders with the item tables and optionally repair them"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="recompute the totals of drifted orders")
+        parser.add_argument("--batch-size", type=int, default=10_000, help="orders checked per query")
+
+    def handle(self, *args, **opts):
+        batch_size = opts["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive")
+
+        checked = drifted_total = 0
+        last_pk = None
+        while True:
+            orders = Order.objects.order_by("pk")
+            if last_pk is not None:
+                orders = orders.filter(pk__gt=last_pk)
+            pks = list(orders.values_list("pk", flat=True)[:batch_size])
+            if not pks:
+                break
+            last_pk = pks[-1]
+            checked += len(pks)
+
+            drifted = dict(
+                Order.objects
+                .filter(pk__in=pks)
+                .with_drifted_item_totals()
+                .values_list("pk", "user__date_joined")
+            )
+            drifted_total += len(drifted)
+            if drifted and opts["fix"]:
+                with transaction.atomic():
+                    Order.objects.filter(pk__in=drifted.keys()).refresh_item_totals()
+                    # report rollups and cached rows of these users changed too
+                    mark_report_days({report_localdate(joined) for joined in drifted.values()})
+
+        message = f"Orders checked: {checked}, with drifted totals: {drifted_total}"
+        if drifted_total and opts["fix"]:
+            self.stdout.write(self.style.SUCCESS(f"{message}, repaired"))
+        elif drifted_total:
+            self.stdout.write(self.style.WARNING(f"{message}, run with --fix to repair"))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from orders.models import DailyReportRollup
+from report.rollup import refresh_pending_rollup_days, refresh_rollup_days
+
+
+class Command(BaseCommand):
+    help = "Backfill or repair the daily report rollups from the source tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", type=parse_date, help="first day to repair (YYYY-MM-DD)")
+        parser.add_argument("--end", type=parse_date, help="last day to repair, inclusive (YYYY-MM-DD)")
+        parser.add_argument("--pending", action="store_true", help="only refresh the days queued by writes")
+
+    def handle(self, *args, **opts):
+        start, end = opts["start"], opts["end"]
+
+        if opts["pending"]:
+            if start is not None or end is not None:
+                raise CommandError("--pending cannot be combined with --start/--end")
+            written = 0
+            while refreshed := refresh_pending_rollup_days():
+                written += refreshed
+        elif start is None and end is None:
+            self.stdout.write(self.style.WARNING("Rebuilding all rollups..."))
+            written = refresh_rollup_days()
+        elif start is None or end is None:
+            raise CommandError("--start and --end must be given together")
+        elif end < start:
+            raise CommandError("--end must be >= --start")
+        else:
+            self.stdout.write(self.style.WARNING(f"Repairing rollups {start} - {end}..."))
+            written = refresh_rollup_days(start + timedelta(days=i) for i in range((end - start).days + 1))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rollup days written: {written} (total: {DailyReportRollup.objects.count()})"
+        ))
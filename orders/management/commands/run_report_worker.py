@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from report.jobs import CHUNK_PERIODS, claim_job, requeue_stale_jobs, run_job, worker_name
+from report.rollup import refresh_pending_rollup_days
+
+
+class Command(BaseCommand):
+    help = "Compute queued report jobs and rollup days, polling the database for new ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--poll-interval", type=float, default=2.0, help="seconds to sleep when the queue is empty")
+        parser.add_argument("--chunk-periods", type=int, default=CHUNK_PERIODS, help="periods computed between progress updates")
+        parser.add_argument(
+            "--stale-after", type=int, default=600,
+            help="requeue running jobs without progress for this many seconds",
+        )
+        parser.add_argument("--once", action="store_true", help="exit once the queues are empty")
+
+    def handle(self, *args, **opts):
+        if opts["chunk_periods"] < 1:
+            raise CommandError("--chunk-periods must be positive")
+
+        worker = worker_name()
+        self.stdout.write(f"Report worker {worker} started")
+        while True:
+            requeued = requeue_stale_jobs(opts["stale_after"])
+            if requeued:
+                self.stdout.write(self.style.WARNING(f"Requeued {requeued} stale job(s)"))
+
+            refreshed = refresh_pending_rollup_days()
+            if refreshed:
+                self.stdout.write(f"Refreshed {refreshed} rollup day(s)")
+
+            job = claim_job(worker)
+            if job is None:
+                if refreshed:
+                    continue
+                if opts["once"]:
+                    return
+                # idle: drop the connection if it is broken or past CONN_MAX_AGE
+                close_old_connections()
+                time.sleep(opts["poll_interval"])
+                continue
+
+            self.stdout.write(f"Running {job.pk}: {job}")
+            started = time.perf_counter()
+            try:
+                job = run_job(job, opts["chunk_periods"])
+            except Exception as exc:
+                self.stdout.write(self.style.ERROR(f"Job {job.pk} failed: {exc}"))
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f"Job {job.pk} done: {job.periods_done} periods in {time.perf_counter() - started:.1f}s"
+            ))
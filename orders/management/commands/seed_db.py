@@ -1,17 +1,17 @@
+import multiprocessing
 import random
-import uuid
-from decimal import Decimal
-from datetime import timedelta
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, time as dt_time
 
-from django.core.management.base import BaseCommand
+import django
+from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
-from django.contrib.auth import get_user_model
-from django.db import transaction
 
-from orders.models import Order, OrderItem1, OrderItem2
-
-
-User = get_user_model()
+from accounts.stats import refresh_user_stats
+from orders.seeding import TABLES, Shard, seed_shard
+from report.cache import bump_shared_generation
+from report.rollup import refresh_rollup_days
 
 
 class Command(BaseCommand):
@@ -22,84 +22,91 @@ class Command(BaseCommand):
         parser.add_argument("--orders-per-user", type=int, default=50)
         parser.add_argument("--items-per-order", type=int, default=10)
         parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--workers", type=int, default=1, help="Worker processes, 1 loads in this process")
+        parser.add_argument("--shard-size", type=int, default=1000, help="Users per shard (one transaction each)")
+        parser.add_argument("--seed", type=int, default=None, help="Random seed, printed when not given")
+        parser.add_argument(
+            "--anchor",
+            default=None,
+            help="YYYY-MM-DD, dates are generated up to a year back from it (default: today). "
+                 "The same seed and anchor produce the same dataset.",
+        )
 
-    @transaction.atomic
     def handle(self, *args, **opts):
-        self.stdout.write(f"{opts}")
-        users_n = opts["users"]
-        orders_n = opts["orders_per_user"]
-        items_n = opts["items_per_order"]
-        batch = opts["batch_size"]
-
-        now = timezone.now()
+        if opts["workers"] < 1 or opts["shard_size"] < 1:
+            raise CommandError("--workers and --shard-size must be positive")
 
-        self.stdout.write(self.style.WARNING("Seeding users..."))
+        seed = opts["seed"] if opts["seed"] is not None else random.randrange(2 ** 32)
+        anchor = self.parse_anchor(opts["anchor"])
+        self.stdout.write(f"{opts}")
+        self.stdout.write(f"seed={seed} anchor={anchor.date().isoformat()}")
 
-        users = [
-            User(
-                id=uuid.uuid4(),
-                username=f"user_{i}",
-                email=f"user_{i}@example.com",
-                is_active=True,
-                date_joined=now - timedelta(days=random.randint(0, 365)),
+        users_n = opts["users"]
+        shards = [
+            Shard(
+                first_user=first,
+                users=min(opts["shard_size"], users_n - first),
+                orders_per_user=opts["orders_per_user"],
+                items_per_order=opts["items_per_order"],
+                seed=seed,
+                anchor=anchor,
+                batch_size=opts["batch_size"],
             )
-            for i in range(users_n)
+            for first in range(0, users_n, opts["shard_size"])
         ]
 
-        User.objects.bulk_create(users, batch_size=batch)
-        self.stdout.write(self.style.SUCCESS(f"Users: {len(users)}"))
-
-        self.stdout.write(self.style.WARNING("Seeding orders..."))
-
-        orders = []
-        for user in users:
-            for _ in range(orders_n):
-                orders.append(
-                    Order(
-                        id=uuid.uuid4(),
-                        user=user,
-                        created_at=now - timedelta(days=random.randint(0, 365)),
-                    )
-                )
-
-        Order.objects.bulk_create(orders, batch_size=batch)
-        self.stdout.write(self.style.SUCCESS(f"Orders: {len(orders)}"))
-
-        self.stdout.write(self.style.WARNING("Seeding order items (chunked)..."))
-
-        item1_buf = []
-        item2_buf = []
-
-        for idx, order in enumerate(orders, start=1):
-            for _ in range(items_n):
-                ts = now - timedelta(days=random.randint(0, 365))
-
-                item1_buf.append(
-                    OrderItem1(
-                        order=order,
-                        price=Decimal(str(random.uniform(1, 500))).quantize(Decimal("0.01")),
-                        created_at=ts,
-                    )
-                )
-
-                item2_buf.append(
-                    OrderItem2(
-                        order=order,
-                        placement_price=Decimal(str(random.uniform(10, 300))).quantize(Decimal("0.01")),
-                        article_price=Decimal(str(random.uniform(5, 200))).quantize(Decimal("0.01")),
-                        created_at=ts,
-                    )
-                )
-
-            if idx % 1000 == 0:
-                OrderItem1.objects.bulk_create(item1_buf, batch_size=batch)
-                OrderItem2.objects.bulk_create(item2_buf, batch_size=batch)
-                item1_buf.clear()
-                item2_buf.clear()
-
-        if item1_buf:
-            OrderItem1.objects.bulk_create(item1_buf, batch_size=batch)
-            OrderItem2.objects.bulk_create(item2_buf, batch_size=batch)
+        self.stdout.write(self.style.WARNING(f"Seeding {len(shards)} shard(s) with {opts['workers']} worker(s)..."))
+        # table -> [rows, seconds spent loading it, summed over the shards]
+        totals = {table: [0, 0.0] for table in TABLES}
+        started = time.perf_counter()
+        for done, stats in enumerate(self.run_shards(shards, opts["workers"]), start=1):
+            for table, (rows, seconds) in stats.items():
+                totals[table][0] += rows
+                totals[table][1] += seconds
+            self.stdout.write(f"shard {done}/{len(shards)} committed")
+        elapsed = time.perf_counter() - started
+
+        for table, (rows, seconds) in totals.items():
+            self.stdout.write(self.style.SUCCESS(
+                f"{table}: {rows} rows in {seconds:.1f}s, {rows / max(seconds, 1e-9):,.0f} rows/s per worker"
+            ))
+        loaded = sum(rows for rows, _ in totals.values())
+        self.stdout.write(f"Loaded {loaded} rows in {elapsed:.1f}s, {loaded / max(elapsed, 1e-9):,.0f} rows/s overall")
+
+        # bulk loading skips the signals that keep the rollups up to date
+        self.stdout.write(self.style.WARNING("Refreshing report rollups..."))
+        refresh_rollup_days()
+        self.stdout.write(self.style.WARNING("Refreshing user stats..."))
+        refresh_user_stats(concurrently=False)
+        bump_shared_generation()
 
         self.stdout.write(self.style.SUCCESS("Database fully seeded 🚀"))
 
+    @staticmethod
+    def parse_anchor(value) -> datetime:
+        if value is None:
+            day = timezone.localdate()
+        else:
+            try:
+                day = datetime.strptime(value, "%Y-%m-%d").date()
+            except ValueError:
+                raise CommandError("--anchor must be YYYY-MM-DD")
+        return timezone.make_aware(datetime.combine(day, dt_time(12)))
+
+    @staticmethod
+    def run_shards(shards, workers):
+        if workers == 1:
+            for shard in shards:
+                yield seed_shard(shard)
+            return
+
+        # spawn: forked children would share the parent's DB connection;
+        # spawned ones set up Django before unpickling the first shard
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        ) as executor:
+            futures = [executor.submit(seed_shard, shard) for shard in shards]
+            for future in as_completed(futures):
+                yield future.result()
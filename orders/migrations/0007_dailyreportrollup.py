@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_remove_orderitem2_q'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyReportRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('new_users', models.IntegerField(default=0)),
+                ('activated_users', models.IntegerField(default=0)),
+                ('orders_count', models.IntegerField(default=0)),
+                ('orderitem1_count', models.IntegerField(default=0)),
+                ('orderitem1_amount', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('orderitem2_count', models.IntegerField(default=0)),
+                ('orderitem2_amount', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+            ],
+        ),
+    ]
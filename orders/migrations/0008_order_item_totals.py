@@ -0,0 +1,62 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:20
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_item_totals(apps, schema_editor):
+    Order = apps.get_model("orders", "Order")
+    money_field = models.DecimalField(max_digits=18, decimal_places=2)
+    values = {}
+    for prefix, model_name, amount in (
+        ("items1", "OrderItem1", F("price")),
+        ("items2", "OrderItem2", F("placement_price") + F("article_price")),
+    ):
+        items = (
+            apps.get_model("orders", model_name).objects
+            .using(schema_editor.connection.alias)
+            .filter(order=OuterRef("pk"))
+            .order_by()
+            .values("order")
+        )
+        values[f"{prefix}_count"] = Coalesce(
+            Subquery(items.annotate(c=Count("id")).values("c")[:1], output_field=models.IntegerField()),
+            Value(0),
+        )
+        values[f"{prefix}_total"] = Coalesce(
+            Subquery(items.annotate(s=Sum(amount)).values("s")[:1], output_field=money_field),
+            Value(0, output_field=money_field),
+        )
+    Order.objects.using(schema_editor.connection.alias).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_dailyreportrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='items1_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='items1_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=18),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='items2_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='items2_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=18),
+        ),
+        migrations.RunPython(backfill_item_totals, migrations.RunPython.noop),
+    ]
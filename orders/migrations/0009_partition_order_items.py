@@ -0,0 +1,137 @@
+from datetime import date, timezone as dt_timezone
+
+from dateutil.relativedelta import relativedelta
+from django.db import migrations
+from django.utils import timezone
+
+# frozen copy of the orders.partitions DDL, later changes there must not change this migration
+PARTITIONED_TABLES = ("orders_orderitem1", "orders_orderitem2")
+PARTITION_KEY = "created_at"
+MONTHS_AHEAD = 3
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+def default_partition_name(table: str) -> str:
+    return f"{table}_default"
+
+
+def _bound(month: date) -> str:
+    return f"'{month:%Y-%m-%d} 00:00:00+00'"
+
+
+def is_partitioned(connection, table: str) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table],
+        )
+        return cursor.fetchone() is not None
+
+
+def _table_ddl(cursor, table: str) -> tuple[list[str], list[str]]:
+    """CREATE INDEX statements (without the primary key) and foreign key constraints of `table`."""
+    cursor.execute(
+        "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+        [table, f"{table}_pkey"],
+    )
+    # indexes of a partitioned table are reported as "ON ONLY <table>"
+    indexes = [indexdef.replace(" ON ONLY ", " ON ") for indexdef, in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+        [table],
+    )
+    foreign_keys = [f'CONSTRAINT "{name}" {definition}' for name, definition in cursor.fetchall()]
+    return indexes, foreign_keys
+
+
+def _rebuild(connection, table: str, partitioned: bool, months_ahead: int = MONTHS_AHEAD):
+    """
+    Recreates `table` as a partitioned (or plain) table with the same columns,
+    index and constraint names, and copies its rows over. Partitioned tables
+    get monthly partitions from the oldest row through `months_ahead` months
+    from now.
+    """
+    qn = connection.ops.quote_name
+    new = f"{table}_rebuild"
+    with connection.cursor() as cursor:
+        indexes, foreign_keys = _table_ddl(cursor, table)
+        cursor.execute(f"SELECT min({qn(PARTITION_KEY)}) FROM {qn(table)}")
+        oldest = cursor.fetchone()[0]
+
+        cursor.execute(
+            f"CREATE TABLE {qn(new)} (LIKE {qn(table)} INCLUDING DEFAULTS INCLUDING IDENTITY)"
+            + (f" PARTITION BY RANGE ({qn(PARTITION_KEY)})" if partitioned else "")
+        )
+        primary_key = f"id, {qn(PARTITION_KEY)}" if partitioned else "id"
+        cursor.execute(f"ALTER TABLE {qn(new)} ADD CONSTRAINT {qn(table + '_pkey_rebuild')} PRIMARY KEY ({primary_key})")
+        if partitioned:
+            # partitions for every month with rows, so the copy does not land in the default one
+            this_month = month_start(timezone.now().date())
+            month = month_start(oldest.astimezone(dt_timezone.utc).date()) if oldest else this_month
+            while month <= this_month + relativedelta(months=months_ahead):
+                cursor.execute(
+                    f"CREATE TABLE {qn(partition_name(table, month))} PARTITION OF {qn(new)} "
+                    f"FOR VALUES FROM ({_bound(month)}) TO ({_bound(month + relativedelta(months=1))})"
+                )
+                month += relativedelta(months=1)
+            cursor.execute(f"CREATE TABLE {qn(default_partition_name(table))} PARTITION OF {qn(new)} DEFAULT")
+
+        cursor.execute(f"INSERT INTO {qn(new)} SELECT * FROM {qn(table)}")
+        cursor.execute(f"DROP TABLE {qn(table)}")
+        cursor.execute(f"ALTER TABLE {qn(new)} RENAME TO {qn(table)}")
+        cursor.execute(f"ALTER TABLE {qn(table)} RENAME CONSTRAINT {qn(table + '_pkey_rebuild')} TO {qn(table + '_pkey')}")
+        cursor.execute(f"ALTER SEQUENCE {qn(new + '_id_seq')} RENAME TO {qn(table + '_id_seq')}")
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), coalesce(max(id), 0) + 1, false) FROM {qn(table)}",
+            [table],
+        )
+        for statement in indexes:
+            cursor.execute(statement)
+        for constraint in foreign_keys:
+            cursor.execute(f"ALTER TABLE {qn(table)} ADD {constraint}")
+
+
+def partition_table(connection, table: str, months_ahead: int = MONTHS_AHEAD):
+    if not is_partitioned(connection, table):
+        _rebuild(connection, table, partitioned=True, months_ahead=months_ahead)
+
+
+def unpartition_table(connection, table: str):
+    if is_partitioned(connection, table):
+        _rebuild(connection, table, partitioned=False)
+
+
+def partition_item_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for table in PARTITIONED_TABLES:
+        partition_table(schema_editor.connection, table)
+
+
+def unpartition_item_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for table in PARTITIONED_TABLES:
+        unpartition_table(schema_editor.connection, table)
+
+
+class Migration(migrations.Migration):
+    """
+    Monthly range partitioning of the item tables on created_at, see
+    orders.partitions. The model state does not change.
+    """
+
+    dependencies = [
+        ('orders', '0008_order_item_totals'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_item_tables, unpartition_item_tables),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# item rows are appended in created_at order, so block ranges are enough to
+# find a day; BRIN is PostgreSQL only and not part of the model state
+BRIN_INDEXES = {
+    "orders_item1_created_brin": "orders_orderitem1",
+    "orders_item2_created_brin": "orders_orderitem2",
+}
+
+
+def create_brin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, table in BRIN_INDEXES.items():
+        schema_editor.execute(f"CREATE INDEX {name} ON {table} USING brin (created_at)")
+
+
+def drop_brin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in BRIN_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_partition_order_items'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='orders', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='orderitem1',
+            name='created_at',
+            field=models.DateTimeField(),
+        ),
+        migrations.AlterField(
+            model_name='orderitem1',
+            name='order',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='item1', to='orders.order'),
+        ),
+        migrations.AlterField(
+            model_name='orderitem2',
+            name='created_at',
+            field=models.DateTimeField(),
+        ),
+        migrations.AlterField(
+            model_name='orderitem2',
+            name='order',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='item2', to='orders.order'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user'], include=('items1_count', 'items1_total', 'items2_count', 'items2_total'), name='orders_order_user_totals_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem1',
+            index=models.Index(fields=['order'], include=('price',), name='orders_item1_order_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem2',
+            index=models.Index(fields=['order'], include=('placement_price', 'article_price'), name='orders_item2_order_prices_idx'),
+        ),
+        migrations.RunPython(create_brin_indexes, drop_brin_indexes),
+    ]
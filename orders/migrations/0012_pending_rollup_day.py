@@ -0,0 +1,20 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_report_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingRollupDay',
+            fields=[
+                ('day', models.DateField(primary_key=True, serialize=False)),
+                ('queued_at', models.DateTimeField()),
+            ],
+        ),
+    ]
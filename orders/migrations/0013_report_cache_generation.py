@@ -0,0 +1,20 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0012_pending_rollup_day'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportCacheGeneration',
+            fields=[
+                ('id', models.PositiveSmallIntegerField(default=1, primary_key=True, serialize=False)),
+                ('generation', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0013_report_cache_generation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dailyreportrollup',
+            name='id',
+            field=models.BigAutoField(primary_key=True, serialize=False),
+        ),
+    ]
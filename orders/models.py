@@ -1,38 +1,263 @@
+import operator
 import uuid
+from decimal import Decimal
+from functools import reduce
 
 from django.db import models
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+TOTAL_FIELD = dict(max_digits=18, decimal_places=2, default=0)
+
+
+class OrderQuerySet(models.QuerySet):
+    def refresh_item_totals(self) -> int:
+        """
+        Recomputes items*_count/items*_total of the selected orders from the item
+        tables in one UPDATE. Used after writes that bypass the item signals.
+        """
+        return self.update(**_order_totals_expressions())
+
+    def with_drifted_item_totals(self) -> "OrderQuerySet":
+        """Selected orders whose stored item totals differ from the item tables."""
+        expected = {f"expected_{name}": value for name, value in _order_totals_expressions().items()}
+        drifted = Q()
+        for name in expected:
+            drifted |= ~Q(**{name.removeprefix("expected_"): F(name)})
+        return self.alias(**expected).filter(drifted)
+
+
+def _order_totals_expressions() -> dict:
+    values = {}
+    for item_model in (OrderItem1, OrderItem2):
+        values.update(item_model.order_totals_expressions())
+    return values
 
 
 class Order(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name="orders", on_delete=models.CASCADE, db_index=True)
+    # user lookups are served by the (user, ...) indexes below
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name="orders", on_delete=models.CASCADE, db_index=False)
     created_at = models.DateTimeField(db_index=True)
 
+    # Denormalized item totals, kept up to date by orders.signals and the item
+    # querysets; reconcile_order_totals repairs drift.
+    items1_count = models.IntegerField(default=0)
+    items1_total = models.DecimalField(**TOTAL_FIELD)
+    items2_count = models.IntegerField(default=0)
+    items2_total = models.DecimalField(**TOTAL_FIELD)
+
+    objects = OrderQuerySet.as_manager()
+
     class Meta:
         indexes = [
             models.Index(fields=["user", "created_at"]),
+            # with_stats sums the totals per user with index-only scans
+            models.Index(
+                fields=["user"],
+                include=["items1_count", "items1_total", "items2_count", "items2_total"],
+                name="orders_order_user_totals_idx",
+            ),
         ]
 
 
-class OrderItem1(models.Model):
-    order = models.ForeignKey(Order, related_name="item1", on_delete=models.CASCADE, db_index=True)
+class OrderItemQuerySet(models.QuerySet):
+    """
+    Bulk writes skip the model signals that maintain the order totals, so they
+    recompute the totals of the orders they touched.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        self._refresh_orders({obj.order_id for obj in objs})
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if not self.model.changes_totals(fields):
+            return super().bulk_update(objs, fields, *args, **kwargs)
+        objs = list(objs)
+        order_ids = {obj.order_id for obj in objs}
+        order_ids |= set(self.filter(pk__in=[obj.pk for obj in objs]).values_list("order_id", flat=True))
+        rows = super().bulk_update(objs, fields, *args, **kwargs)
+        self._refresh_orders(order_ids)
+        return rows
+
+    def update(self, **kwargs):
+        if not self.model.changes_totals(kwargs):
+            return super().update(**kwargs)
+        pks = list(self.values_list("pk", flat=True))
+        order_ids = set(self.model.objects.filter(pk__in=pks).values_list("order_id", flat=True))
+        rows = super().update(**kwargs)
+        order_ids |= set(self.model.objects.filter(pk__in=pks).values_list("order_id", flat=True))
+        self._refresh_orders(order_ids)
+        return rows
+
+    update.alters_data = True
+
+    def _refresh_orders(self, order_ids):
+        if order_ids:
+            Order.objects.using(self.db).filter(pk__in=order_ids).refresh_item_totals()
+
+
+class OrderItem(models.Model):
+    # prefix of the Order fields holding the totals of this item table
+    totals_prefix = None
+    # fields summed into the item amount
+    amount_fields = ()
+
+    objects = OrderItemQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def amount_expression(cls):
+        return reduce(operator.add, (F(name) for name in cls.amount_fields))
+
+    @classmethod
+    def changes_totals(cls, fields) -> bool:
+        return bool(set(fields) & {"order", "order_id", *cls.amount_fields})
+
+    @property
+    def line_amount(self) -> Decimal:
+        return sum(
+            (self._meta.get_field(name).to_python(getattr(self, name)) for name in self.amount_fields),
+            Decimal(0),
+        )
+
+    @classmethod
+    def order_totals_expressions(cls) -> dict:
+        """UPDATE values recomputing the totals of this item table per order."""
+        items = cls.objects.filter(order=OuterRef("pk")).order_by().values("order")
+        money_field = models.DecimalField(max_digits=18, decimal_places=2)
+        return {
+            f"{cls.totals_prefix}_count": Coalesce(
+                Subquery(items.annotate(c=Count("id")).values("c")[:1], output_field=models.IntegerField()),
+                Value(0),
+            ),
+            f"{cls.totals_prefix}_total": Coalesce(
+                Subquery(items.annotate(s=Sum(cls.amount_expression())).values("s")[:1], output_field=money_field),
+                Value(0, output_field=money_field),
+            ),
+        }
+
+
+class OrderItem1(OrderItem):
+    order = models.ForeignKey(Order, related_name="item1", on_delete=models.CASCADE, db_index=False)
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    created_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField()
+
+    totals_prefix = "items1"
+    amount_fields = ("price",)
 
     class Meta:
         indexes = [
             models.Index(fields=["order", "created_at"]),
+            # order totals are recomputed with index-only scans
+            models.Index(fields=["order"], include=["price"], name="orders_item1_order_price_idx"),
+            # on PostgreSQL created_at also has a BRIN index, see migration 0010
         ]
 
 
-class OrderItem2(models.Model):
-    order = models.ForeignKey(Order, related_name="item2", on_delete=models.CASCADE, db_index=True)
+class OrderItem2(OrderItem):
+    order = models.ForeignKey(Order, related_name="item2", on_delete=models.CASCADE, db_index=False)
     placement_price = models.DecimalField(max_digits=10, decimal_places=2)
     article_price = models.DecimalField(max_digits=10, decimal_places=2)
-    created_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField()
+
+    totals_prefix = "items2"
+    amount_fields = ("placement_price", "article_price")
 
     class Meta:
         indexes = [
             models.Index(fields=["order", "created_at"]),
+            models.Index(
+                fields=["order"], include=["placement_price", "article_price"], name="orders_item2_order_prices_idx",
+            ),
+        ]
+
+
+class DailyReportRollup(models.Model):
+    """
+    Per-day totals for the user/orders report, keyed by the day users joined.
+    Kept up to date through PendingRollupDay and rebuilt by the refresh_rollups command.
+    """
+    id = models.BigAutoField(primary_key=True)
+    day = models.DateField(unique=True)
+    new_users = models.IntegerField(default=0)
+    activated_users = models.IntegerField(default=0)
+    orders_count = models.IntegerField(default=0)
+    orderitem1_count = models.IntegerField(default=0)
+    orderitem1_amount = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    orderitem2_count = models.IntegerField(default=0)
+    orderitem2_amount = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+
+class PendingRollupDay(models.Model):
+    """
+    Join day whose DailyReportRollup is out of date. Committed writes queue
+    their days here (orders.signals, report.rollup.queue_rollup_days) and
+    run_report_worker refreshes them in batches, so the rollups are not
+    recomputed on the request path and many writes to one day cost one refresh.
+    """
+    day = models.DateField(primary_key=True)
+    queued_at = models.DateTimeField()
+
+
+class ReportCacheGeneration(models.Model):
+    """
+    Single row counter bumped on every committed report data change, so the
+    in-process report caches of all workers notice writes made elsewhere
+    (see report.cache).
+    """
+    id = models.PositiveSmallIntegerField(primary_key=True, default=1)
+    generation = models.BigIntegerField(default=0)
+
+
+class ReportJob(models.Model):
+    """
+    A user/orders report computed in the background by the run_report_worker
+    command (see report.jobs). Pending and running jobs with the same
+    parameters are deduplicated, the result is stored as column names plus
+    one value list per period.
+    """
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        RUNNING = "running"
+        DONE = "done"
+        FAILED = "failed"
+
+    ACTIVE = (Status.PENDING, Status.RUNNING)
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    period = models.CharField(max_length=16)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+    periods_done = models.IntegerField(default=0)
+    periods_total = models.IntegerField(default=0)
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True, default="")
+    worker = models.CharField(max_length=255, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # bumped with every progress update, running jobs that stop updating are requeued
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["start_date", "end_date", "period"],
+                condition=Q(status__in=["pending", "running"]),
+                name="orders_reportjob_active_unique",
+            ),
         ]
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="orders_reportjob_queue_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.period} report {self.start_date} - {self.end_date} ({self.status})"
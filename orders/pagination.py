@@ -0,0 +1,11 @@
+from rest_framework.pagination import PageNumberPagination
+
+
+class ReportPeriodPagination(PageNumberPagination):
+    """
+    Paginates a report.UserOrdersReport. The count comes from period arithmetic
+    and slicing the report computes the periods of the requested page only.
+    """
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
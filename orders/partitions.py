@@ -0,0 +1,126 @@
+"""
+Monthly range partitioning of the item tables on created_at (PostgreSQL only).
+
+The item tables are append-only, so each calendar month (UTC) gets its own
+partition named <table>_pYYYYMM, plus a <table>_default partition catching
+rows outside the created months. Queries bounded on created_at only scan the
+matching partitions, and old months can be detached into standalone tables
+with a metadata-only DETACH. The primary key of a partitioned table has to
+include the partition key, so it is (id, created_at) in the database; ids
+still come from the identity sequence and Django keeps using id alone.
+
+The tables are converted by migration 0009, which carries its own frozen
+copy of the DDL. This module creates and detaches partitions at runtime
+(the create_partitions command).
+"""
+import re
+from datetime import date
+
+from dateutil.relativedelta import relativedelta
+from django.db import transaction
+from django.utils import timezone
+
+PARTITIONED_TABLES = ("orders_orderitem1", "orders_orderitem2")
+PARTITION_KEY = "created_at"
+MONTHS_AHEAD = 3
+
+_MONTH_SUFFIX = re.compile(r"_p(\d{4})(\d{2})$")
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+def default_partition_name(table: str) -> str:
+    return f"{table}_default"
+
+
+def _bound(month: date) -> str:
+    return f"'{month:%Y-%m-%d} 00:00:00+00'"
+
+
+def is_partitioned(connection, table: str) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(connection, table: str) -> dict[date, str]:
+    """Monthly partitions of `table` by month (the default partition is not included)."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(%s)",
+            [table],
+        )
+        names = [name for name, in cursor.fetchall()]
+    partitions = {}
+    for name in names:
+        match = _MONTH_SUFFIX.search(name)
+        if match:
+            partitions[date(int(match[1]), int(match[2]), 1)] = name
+    return partitions
+
+
+def create_partition(connection, table: str, month: date) -> str:
+    """
+    Creates the partition of `month`. Rows of that month already caught by the
+    default partition are moved into it first, otherwise the partition could
+    not be attached.
+    """
+    qn = connection.ops.quote_name
+    month = month_start(month)
+    name = partition_name(table, month)
+    bounds = f"FROM ({_bound(month)}) TO ({_bound(month + relativedelta(months=1))})"
+    default = default_partition_name(table)
+    in_month = f"{qn(PARTITION_KEY)} >= {_bound(month)} AND {qn(PARTITION_KEY)} < {_bound(month + relativedelta(months=1))}"
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [default])
+        has_default = cursor.fetchone()[0]
+        if has_default:
+            cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {qn(default)} WHERE {in_month})")
+            has_default = cursor.fetchone()[0]
+
+        if not has_default:
+            cursor.execute(f"CREATE TABLE {qn(name)} PARTITION OF {qn(table)} FOR VALUES {bounds}")
+            return name
+
+        cursor.execute(f"CREATE TABLE {qn(name)} (LIKE {qn(table)} INCLUDING DEFAULTS)")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {qn(default)} WHERE {in_month} RETURNING *) "
+            f"INSERT INTO {qn(name)} SELECT * FROM moved"
+        )
+        cursor.execute(f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(name)} FOR VALUES {bounds}")
+    return name
+
+
+def ensure_partitions(connection, table: str, until: date, since: date = None) -> list[str]:
+    """Creates the missing monthly partitions from `since` (default: this month) through `until`."""
+    existing = list_partitions(connection, table)
+    month = month_start(since or timezone.now().date())
+    created = []
+    while month <= until:
+        if month not in existing:
+            created.append(create_partition(connection, table, month))
+        month += relativedelta(months=1)
+    return created
+
+
+def detach_partitions(connection, table: str, before: date) -> list[str]:
+    """Detaches the monthly partitions older than `before`; they stay as standalone tables."""
+    qn = connection.ops.quote_name
+    detached = []
+    with connection.cursor() as cursor:
+        for month, name in sorted(list_partitions(connection, table).items()):
+            if month < month_start(before):
+                cursor.execute(f"ALTER TABLE {qn(table)} DETACH PARTITION {qn(name)}")
+                detached.append(name)
+    return detached
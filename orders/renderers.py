@@ -0,0 +1,88 @@
+import json
+from typing import Iterable, Iterator
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from admix.streaming import iter_csv_lines
+from report.generator import REPORT_COLUMNS, ReportRow
+
+
+def iter_ndjson(rows: Iterable[ReportRow]) -> Iterator[bytes]:
+    for row in rows:
+        yield (row.to_json() + "\n").encode()
+
+
+def iter_csv(rows: Iterable[ReportRow], columns: tuple[str, ...] = REPORT_COLUMNS) -> Iterator[bytes]:
+    return iter_csv_lines(([getattr(row, column) for column in columns] for row in rows), columns)
+
+
+def iter_cohort_json(report) -> Iterator[bytes]:
+    """A report.cohort.CohortReport as one JSON object: the cohort sizes, then the cells as they are read."""
+    sizes = report.cohort_sizes()
+    header = json.dumps(
+        {
+            "period": report.period,
+            "cohorts": [{"cohort": cohort, "users": users} for cohort, users in sorted(sizes.items())],
+        },
+        cls=JSONEncoder,
+        separators=(",", ":"),
+    )
+    yield f'{header[:-1]},"cells":['.encode()
+    separator = ""
+    for cell in report.cells(sizes):
+        yield f"{separator}{cell.to_json()}".encode()
+        separator = ","
+    yield b"]}"
+
+
+def _is_report_page(data) -> bool:
+    return (
+        isinstance(data, dict)
+        and isinstance(data.get("results"), list)
+        and all(isinstance(row, ReportRow) for row in data["results"])
+    )
+
+
+def _is_report_batch(data) -> bool:
+    return (
+        isinstance(data, dict)
+        and isinstance(data.get("reports"), list)
+        and all(_is_report_page(page) for page in data["reports"])
+    )
+
+
+def _rows_as_dicts(page: dict) -> dict:
+    return {**page, "results": [row.to_dict() for row in page["results"]]}
+
+
+class ReportJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that takes report pages ({..., "results": [ReportRow, ...]})
+    and batches of them ({"reports": [page, ...]}) as they are: compact
+    responses are assembled from row.to_json() without per-row dicts or the
+    generic encoder. Anything else (errors, indented output for the browsable
+    API) goes through JSONRenderer, with rows converted by to_dict.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        compact = self.get_indent(accepted_media_type, renderer_context or {}) is None
+        if _is_report_page(data):
+            if compact:
+                return self.page_json(data).encode()
+            data = _rows_as_dicts(data)
+        elif _is_report_batch(data):
+            if compact:
+                return f'{{"reports":[{",".join(self.page_json(page) for page in data["reports"])}]}}'.encode()
+            data = {**data, "reports": [_rows_as_dicts(page) for page in data["reports"]]}
+        return super().render(data, accepted_media_type, renderer_context)
+
+    def page_json(self, page: dict) -> str:
+        envelope = json.dumps(
+            {key: value for key, value in page.items() if key != "results"},
+            cls=self.encoder_class,
+            ensure_ascii=self.ensure_ascii,
+            separators=(",", ":"),
+        )
+        results = ",".join(row.to_json() for row in page["results"])
+        return f'{envelope[:-1]}{"," if len(envelope) > 2 else ""}"results":[{results}]}}'
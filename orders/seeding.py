@@ -0,0 +1,119 @@
+"""
+Deterministic random dataset for pressure testing, generated shard by shard.
+
+Every user gets its own random generator seeded with (seed, user index), so a
+given seed and anchor produce the same users, orders and items whatever the
+number of shards or workers. Shards are loaded with orders.bulk and committed
+one by one; memory use is bounded by the batch size, not by the dataset size.
+Shards are plain frozen dataclasses so they can be sent to worker processes.
+"""
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterator
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from orders.bulk import bulk_load
+from orders.models import Order, OrderItem1, OrderItem2
+
+TABLES = ("users", "orders", "items1", "items2")
+
+
+@dataclass(frozen=True)
+class Shard:
+    first_user: int
+    users: int
+    orders_per_user: int
+    items_per_order: int
+    seed: int
+    anchor: datetime
+    days_back: int = 365
+    batch_size: int = 5000
+
+
+@dataclass
+class _UserRows:
+    user: tuple
+    orders: list[tuple]
+    items1: list[tuple]
+    items2: list[tuple]
+
+
+def random_uuid(rng: random.Random) -> uuid.UUID:
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def format_cents(cents: int) -> str:
+    return f"{cents // 100}.{cents % 100:02d}"
+
+
+def generate_user(shard: Shard, index: int) -> _UserRows:
+    rng = random.Random(f"{shard.seed}:{index}")
+
+    def random_dt():
+        return shard.anchor - timedelta(days=rng.randint(0, shard.days_back))
+
+    user_id = random_uuid(rng)
+    rows = _UserRows(
+        user=(user_id, f"user_{index}", f"user_{index}@example.com", True, random_dt()),
+        orders=[], items1=[], items2=[],
+    )
+    for _ in range(shard.orders_per_user):
+        order_id = random_uuid(rng)
+        created_at = random_dt()
+        # the order totals are known here, so orders are loaded with them filled in
+        items1_cents = items2_cents = 0
+        for _ in range(shard.items_per_order):
+            ts = random_dt()
+            price = rng.randint(100, 50_000)
+            placement_price, article_price = rng.randint(1_000, 30_000), rng.randint(500, 20_000)
+            items1_cents += price
+            items2_cents += placement_price + article_price
+            rows.items1.append((order_id, format_cents(price), ts))
+            rows.items2.append((order_id, format_cents(placement_price), format_cents(article_price), ts))
+        rows.orders.append((
+            order_id, user_id, created_at,
+            shard.items_per_order, format_cents(items1_cents),
+            shard.items_per_order, format_cents(items2_cents),
+        ))
+    return rows
+
+
+def _chunks(shard: Shard) -> Iterator[list[_UserRows]]:
+    """Users of the shard in chunks of about batch_size items each."""
+    per_user = max(1, shard.orders_per_user * max(1, shard.items_per_order))
+    users_per_chunk = max(1, shard.batch_size // per_user)
+    end = shard.first_user + shard.users
+    for first in range(shard.first_user, end, users_per_chunk):
+        yield [generate_user(shard, index) for index in range(first, min(first + users_per_chunk, end))]
+
+
+def seed_shard(shard: Shard) -> dict[str, tuple[int, float]]:
+    """Loads one shard in a single transaction; returns {table: (rows, seconds)}."""
+    User = get_user_model()
+    targets = {
+        "users": (User, ("id", "username", "email", "is_active", "date_joined")),
+        "orders": (
+            Order,
+            ("id", "user_id", "created_at", "items1_count", "items1_total", "items2_count", "items2_total"),
+        ),
+        "items1": (OrderItem1, ("order_id", "price", "created_at")),
+        "items2": (OrderItem2, ("order_id", "placement_price", "article_price", "created_at")),
+    }
+    stats = {table: [0, 0.0] for table in TABLES}
+
+    with transaction.atomic():
+        for chunk in _chunks(shard):
+            for table, (model, fields) in targets.items():
+                if table == "users":
+                    rows = [user.user for user in chunk]
+                else:
+                    rows = [row for user in chunk for row in getattr(user, table)]
+                started = time.perf_counter()
+                stats[table][0] += bulk_load(model, fields, rows, batch_size=shard.batch_size)
+                stats[table][1] += time.perf_counter() - started
+    return {table: (rows, seconds) for table, (rows, seconds) in stats.items()}
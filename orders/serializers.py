@@ -1,8 +1,12 @@
+from django.conf import settings
 from rest_framework import serializers
+from orders.models import ReportJob
+from report.chrono import report_localdate
+from report.generator import ACCURACIES, UserOrdersReport
 from report.period import Period
 
 
-class ReportRequestSerializer(serializers.Serializer):
+class ReportSpecSerializer(serializers.Serializer):
     start_date = serializers.DateField(required=True)
     end_date = serializers.DateField(required=False, allow_null=True)
     period = serializers.ChoiceField(
@@ -17,3 +21,46 @@ class ReportRequestSerializer(serializers.Serializer):
                     {"end_date": "End date must be >= start_date."}
                 )
         return super().validate(data)
+
+
+class ReportRequestSerializer(ReportSpecSerializer):
+    accuracy = serializers.ChoiceField(choices=ACCURACIES, default="exact")
+
+
+class ReportJobRequestSerializer(ReportSpecSerializer):
+    # jobs store exact rows only; estimates are cheap enough to request directly
+    accuracy = serializers.ChoiceField(choices=["exact"], default="exact")
+
+
+class CohortRequestSerializer(ReportSpecSerializer):
+    period = serializers.ChoiceField(
+        choices=[(p.value, p.name) for p in Period],
+        default=Period.MONTHLY,
+    )
+
+
+class ReportBatchSerializer(serializers.Serializer):
+    reports = ReportSpecSerializer(many=True, allow_empty=False, max_length=settings.REPORT_BATCH_MAX_REPORTS)
+
+    def validate_reports(self, reports):
+        reports = [{**spec, "end_date": spec.get("end_date") or report_localdate()} for spec in reports]
+        periods = sum(len(UserOrdersReport(spec["start_date"], spec["end_date"], spec["period"])) for spec in reports)
+        if periods > settings.REPORT_BATCH_MAX_PERIODS:
+            raise serializers.ValidationError(
+                f"The reports have {periods} periods, at most {settings.REPORT_BATCH_MAX_PERIODS} are allowed."
+            )
+        return reports
+
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReportJob
+        fields = (
+            "id", "status", "start_date", "end_date", "period", "progress",
+            "created_at", "started_at", "finished_at", "error", "result",
+        )
+
+    def get_progress(self, job) -> dict:
+        return {"done": job.periods_done, "total": job.periods_total}
@@ -0,0 +1,151 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal
+
+from orders.models import Order, OrderItem1, OrderItem2
+from report.chrono import report_localdate
+
+# Sent after commit with the set of `days` (users' join days, in the report
+# timezone) whose report numbers were touched by the committed writes.
+report_days_changed = Signal()
+
+_state = threading.local()
+
+
+def _pending() -> set:
+    if not hasattr(_state, "days"):
+        _state.days = set()
+    return _state.days
+
+
+def _flush():
+    days = _pending()
+    if not days:
+        return
+    _state.days = set()
+    report_days_changed.send(sender=None, days=frozenset(days))
+
+
+def mark_report_days(days):
+    days = {d for d in days if d is not None}
+    if not days:
+        return
+    _pending().update(days)
+    transaction.on_commit(_flush)
+
+
+def _join_day(joined_at):
+    return report_localdate(joined_at) if joined_at else None
+
+
+def _stored_join_day(instance):
+    """Join day of the user the row belongs to, as currently stored in the db."""
+    if isinstance(instance, get_user_model()):
+        lookup = "date_joined"
+    elif isinstance(instance, Order):
+        lookup = "user__date_joined"
+    else:
+        lookup = "order__user__date_joined"
+    joined_at = (
+        type(instance).objects
+        .filter(pk=instance.pk)
+        .values_list(lookup, flat=True)
+        .first()
+    )
+    return _join_day(joined_at)
+
+
+def _current_join_day(instance):
+    """Join day of the user the row belongs to after it is saved."""
+    if isinstance(instance, get_user_model()):
+        return _join_day(instance.date_joined)
+    if isinstance(instance, Order):
+        user_filter = {"pk": instance.user_id}
+    else:
+        user_filter = {"orders__pk": instance.order_id}
+    joined_at = (
+        get_user_model().objects
+        .filter(**user_filter)
+        .values_list("date_joined", flat=True)
+        .first()
+    )
+    return _join_day(joined_at)
+
+
+def remember_previous_day(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._report_previous_day = _stored_join_day(instance)
+
+
+def mark_saved_row(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous_day = getattr(instance, "_report_previous_day", None)
+    mark_report_days({previous_day, _current_join_day(instance)})
+
+
+def mark_deleted_row(sender, instance, **kwargs):
+    mark_report_days({_stored_join_day(instance)})
+
+
+def connect_report_signals():
+    for model in (get_user_model(), Order, OrderItem1, OrderItem2):
+        pre_save.connect(remember_previous_day, sender=model)
+        post_save.connect(mark_saved_row, sender=model)
+        pre_delete.connect(mark_deleted_row, sender=model)
+
+
+def _add_to_order_totals(item_model, order_id, count, amount):
+    prefix = item_model.totals_prefix
+    Order.objects.filter(pk=order_id).update(**{
+        f"{prefix}_count": F(f"{prefix}_count") + count,
+        f"{prefix}_total": F(f"{prefix}_total") + amount,
+    })
+
+
+def remember_previous_item(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._totals_previous = (
+        sender.objects
+        .filter(pk=instance.pk)
+        .annotate(line_amount=sender.amount_expression())
+        .values_list("order_id", "line_amount")
+        .first()
+    )
+
+
+def add_saved_item(sender, instance, created, raw=False, **kwargs):
+    # increments instead of recomputing: UPDATE re-reads the locked order row,
+    # so concurrent item writes to one order do not lose each other's change
+    if raw:
+        return
+    amount = instance.line_amount
+    previous = None if created else getattr(instance, "_totals_previous", None)
+    if previous is None:
+        _add_to_order_totals(sender, instance.order_id, 1, amount)
+        return
+
+    previous_order_id, previous_amount = previous
+    if previous_order_id == instance.order_id:
+        if amount != previous_amount:
+            _add_to_order_totals(sender, instance.order_id, 0, amount - previous_amount)
+    else:
+        _add_to_order_totals(sender, previous_order_id, -1, -previous_amount)
+        _add_to_order_totals(sender, instance.order_id, 1, amount)
+
+
+def subtract_deleted_item(sender, instance, **kwargs):
+    _add_to_order_totals(sender, instance.order_id, -1, -instance.line_amount)
+
+
+def connect_order_totals_signals():
+    for model in (OrderItem1, OrderItem2):
+        pre_save.connect(remember_previous_item, sender=model)
+        post_save.connect(add_saved_item, sender=model)
+        post_delete.connect(subtract_deleted_item, sender=model)
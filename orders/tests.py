@@ -1,3 +1,585 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import multiprocessing
+import uuid
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import skipUnless
 
-# Create your tests here.
+from dateutil.relativedelta import relativedelta
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from orders.bulk import bulk_load, copy_text_value
+from orders.models import Order, OrderItem1, OrderItem2, ReportJob
+from orders.partitions import (
+    detach_partitions, ensure_partitions, is_partitioned, list_partitions, partition_name,
+)
+from orders.renderers import ReportJSONRenderer
+from report.cache import report_cache
+from report.chrono import align_day, as_aware_datetime, report_localdate
+from report.cohort import CohortReport
+from report.generator import ReportRow, elementary_bounds, to_cents
+from report.period import Period
+from report.vectorized import ReportFrame
+
+User = get_user_model()
+
+
+def create_report_data(users: int):
+    now = timezone.now()
+    for i in range(users):
+        user = User.objects.create(username=f"user_{i}", email=f"user_{i}@example.com")
+        User.objects.filter(pk=user.pk).update(date_joined=now - timedelta(days=3 * i))
+        order = Order.objects.create(user=user, created_at=now - timedelta(days=i))
+        OrderItem1.objects.create(order=order, price=Decimal("10.25") * (i + 1), created_at=now)
+        OrderItem2.objects.create(
+            order=order,
+            placement_price=Decimal("3.50"),
+            article_price=Decimal("1.15") * i,
+            created_at=now,
+        )
+
+
+def create_order_in_child(user_id: int):
+    """Forked process target: its own connection, report_cache and signal receivers."""
+    Order.objects.create(user_id=user_id, created_at=timezone.now())
+    connections.close_all()
+
+
+def report_params(days: int = 20, period: Period = Period.DAILY) -> dict:
+    return {
+        "start_date": (timezone.localdate() - timedelta(days=days)).isoformat(),
+        "end_date": timezone.localdate().isoformat(),
+        "period": period,
+    }
+
+
+class TestUserOrdersReportView(TestCase):
+    USERS = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        create_report_data(cls.USERS)
+
+    def setUp(self):
+        report_cache.clear()
+        self.url = reverse("user-orders-report")
+        self.params = report_params()
+
+    def test_streams_ndjson_rows(self):
+        expected = self.client.get(self.url, self.params).json()["results"]
+
+        response = self.client.get(self.url, {**self.params, "format": "ndjson"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], expected)
+
+    def test_streams_csv_rows(self):
+        expected = self.client.get(self.url, self.params).json()["results"]
+
+        response = self.client.get(self.url, {**self.params, "format": "csv"})
+
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual([r["period"] for r in rows], [r["period"] for r in expected])
+        self.assertEqual(
+            sum(Decimal(r["orders_total_amount"]) for r in rows),
+            sum(Decimal(str(r["orders_total_amount"])) for r in expected),
+        )
+
+    def test_streaming_validation_error(self):
+        response = self.client.get(self.url, {"format": "ndjson"})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("start_date", json.loads(response.content))
+
+    def test_paginates_periods_of_requested_page_only(self):
+        full = self.client.get(self.url, {**self.params, "page_size": 500}).json()
+        report_cache.clear()
+
+        # the report cache generation and the one period
+        with self.assertNumQueries(2):
+            page = self.client.get(self.url, {**self.params, "page_size": 1, "page": 2}).json()
+
+        self.assertEqual(page["count"], full["count"])
+        self.assertEqual(page["results"], full["results"][1:2])
+
+    def test_honours_requested_period(self):
+        daily = self.client.get(self.url, {**self.params, "page_size": 500}).json()
+        monthly = self.client.get(self.url, {**self.params, "period": Period.MONTHLY}).json()
+
+        self.assertEqual(daily["count"], 21)
+        self.assertFalse(any(row["partial"] for row in daily["results"]))
+        self.assertEqual(monthly["count"], len({row["period"][:7] for row in daily["results"]}))
+        self.assertEqual(
+            sum(row["orders_count"] for row in monthly["results"]),
+            sum(row["orders_count"] for row in daily["results"]),
+        )
+
+    def test_no_server_timing_by_default(self):
+        response = self.client.get(self.url, self.params)
+
+        self.assertNotIn("Server-Timing", response)
+
+    @override_settings(REPORT_PROFILING=True, REPORT_PROFILING_EXPLAIN_SLOWEST=1)
+    def test_profiling(self):
+        with self.assertLogs("report.profiling", level="INFO") as logs:
+            response = self.client.get(self.url, {**self.params, "page_size": 5})
+
+        self.assertEqual(response.status_code, 200)
+        stages = [metric.split(";")[0] for metric in response["Server-Timing"].split(", ")]
+        self.assertEqual(stages, ["validate", "query", "build", "paginate", "render", "total"])
+        # the report cache generation and the page of periods
+        self.assertIn('desc="2 statements"', response["Server-Timing"])
+        output = "\n".join(logs.output)
+        self.assertIn("2 statements", output)
+        if connection.vendor == "postgresql":
+            self.assertIn("Scan", output)
+
+    @override_settings(REPORT_PROFILING=True)
+    def test_profiling_streamed_report(self):
+        with self.assertLogs("report.profiling", level="INFO") as logs:
+            response = self.client.get(self.url, {**self.params, "format": "ndjson"})
+            content = b"".join(response.streaming_content)
+
+        self.assertTrue(content)
+        self.assertTrue(response["Server-Timing"].startswith("validate;dur="))
+        self.assertIn("render;dur=", logs.output[0])
+
+
+class TestAsyncUserOrdersReportView(TransactionTestCase):
+    """Worker threads use their own connections, so the data has to be committed."""
+
+    def setUp(self):
+        report_cache.clear()
+        create_report_data(6)
+
+    async def test_matches_sync_view(self):
+        params = {**report_params(days=40), "page_size": 2, "page": 2}
+        expected = (await self.async_client.get(reverse("user-orders-report"), params)).json()
+        report_cache.clear()
+
+        response = await self.async_client.get(reverse("user-orders-report-async"), params)
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["count"], expected["count"])
+        self.assertEqual(data["results"], expected["results"])
+        self.assertIn("page=3", data["next"])
+        self.assertNotIn("page=", data["previous"])
+
+    async def test_validation_error(self):
+        response = await self.async_client.get(reverse("user-orders-report-async"))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("start_date", response.json())
+
+
+@skipUnless(connection.vendor == "postgresql", "the forked writer needs a server database")
+class TestReportCacheAcrossProcesses(TransactionTestCase):
+    def setUp(self):
+        report_cache.clear()
+        create_report_data(6)
+
+    def test_write_in_another_process_invalidates_cache(self):
+        url, params = reverse("user-orders-report"), report_params()
+        before = self.client.get(url, params).json()["results"]
+        self.assertGreater(len(report_cache), 0)
+
+        # the user joined 3 days ago, a closed (cached) daily period
+        user = User.objects.get(username="user_1")
+        connections.close_all()
+        child = multiprocessing.get_context("fork").Process(target=create_order_in_child, args=(user.pk,))
+        child.start()
+        child.join()
+        self.assertEqual(child.exitcode, 0)
+
+        after = self.client.get(url, params).json()["results"]
+        self.assertEqual(
+            sum(row["orders_count"] for row in after),
+            sum(row["orders_count"] for row in before) + 1,
+        )
+
+
+@skipUnless(connection.vendor == "postgresql", "isolation levels are PostgreSQL specific")
+class TestReportFrameSnapshot(TransactionTestCase):
+    def test_load_reads_one_snapshot(self):
+        create_report_data(3)
+
+        with CaptureQueriesContext(connection) as queries:
+            frame = ReportFrame.load()
+
+        # must be the first statement of the transaction
+        self.assertEqual(
+            [query["sql"] for query in queries[:2]],
+            ["BEGIN", "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"],
+        )
+        self.assertEqual(len(frame), 3)
+
+
+class TestReportBatch(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_report_data(12)
+
+    def setUp(self):
+        report_cache.clear()
+        self.url = reverse("user-orders-report-batch")
+
+    def test_matches_separate_reports(self):
+        specs = [
+            report_params(days=40, period=Period.WEEKLY),
+            report_params(days=90, period=Period.MONTHLY),
+            report_params(days=10, period=Period.DAILY),
+        ]
+
+        response = self.client.post(self.url, {"reports": specs}, content_type="application/json")
+
+        self.assertEqual(response.status_code, 200)
+        reports = response.json()["reports"]
+        self.assertEqual([report["period"] for report in reports], [spec["period"] for spec in specs])
+        for spec, report in zip(specs, reports):
+            expected = self.client.get(reverse("user-orders-report"), {**spec, "page_size": 500}).json()
+            self.assertEqual(report["count"], expected["count"])
+            self.assertEqual(report["results"], expected["results"])
+
+    def test_elementary_bounds(self):
+        day = lambda n: datetime(2025, 1, n, tzinfo=dt_timezone.utc)
+        self.assertEqual(
+            elementary_bounds([[(day(1), day(3)), (day(3), day(5))], [(day(2), day(4))], [(day(7), day(8))]]),
+            [(day(1), day(2)), (day(2), day(3)), (day(3), day(4)), (day(4), day(5)), (day(7), day(8))],
+        )
+
+    def test_invalid_batches(self):
+        for body in ({"reports": []}, {"reports": [{"start_date": "2025-02-01", "end_date": "2025-01-01"}]}):
+            response = self.client.post(self.url, body, content_type="application/json")
+            self.assertEqual(response.status_code, 400)
+        with self.settings(REPORT_BATCH_MAX_PERIODS=5):
+            response = self.client.post(self.url, {"reports": [report_params(days=10)]}, content_type="application/json")
+            self.assertEqual(response.status_code, 400)
+
+
+class TestCohortReport(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_report_data(12)
+
+    def setUp(self):
+        self.url = reverse("user-cohorts-report")
+        self.params = report_params(days=40, period=Period.WEEKLY)
+
+    def expected_cells(self, start: date, period: Period) -> dict:
+        cells = {}
+        for order in Order.objects.select_related("user").filter(user__date_joined__gte=as_aware_datetime(start)):
+            key = (
+                align_day(report_localdate(order.user.date_joined), period),
+                align_day(report_localdate(order.created_at), period),
+            )
+            count, amount = cells.get(key, (0, Decimal("0")))
+            cells[key] = (count + 1, amount + order.items1_total)
+        return cells
+
+    def test_cells_match_orders(self):
+        start = timezone.localdate() - timedelta(days=40)
+
+        with self.assertNumQueries(2):
+            cells = list(CohortReport(start, period=Period.WEEKLY))
+
+        self.assertEqual(
+            {(cell.cohort, cell.period): (cell.orders_count, cell.orderitem1_amount) for cell in cells},
+            self.expected_cells(start, Period.WEEKLY),
+        )
+        keys = [(cell.cohort, cell.period) for cell in cells]
+        self.assertEqual(keys, sorted(keys))
+        self.assertTrue(all(cell.offset == (cell.period - cell.cohort).days // 7 for cell in cells))
+        self.assertTrue(all(0 < cell.users <= cell.cohort_users for cell in cells))
+
+    def test_streams_json_ndjson_and_csv(self):
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        data = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(sum(cohort["users"] for cohort in data["cohorts"]), User.objects.count())
+        self.assertTrue(data["cells"])
+
+        response = self.client.get(self.url, {**self.params, "format": "ndjson"})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], data["cells"])
+
+        response = self.client.get(self.url, {**self.params, "format": "csv"})
+        rows = list(csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual([int(row["orders_count"]) for row in rows], [cell["orders_count"] for cell in data["cells"]])
+
+    def test_validation_error(self):
+        response = self.client.get(self.url, {"start_date": "2025-02-01", "end_date": "2025-01-01"})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("end_date", response.json())
+
+
+class TestReportJobs(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_report_data(6)
+
+    def setUp(self):
+        report_cache.clear()
+        self.url = reverse("user-orders-report-jobs")
+        self.params = report_params(days=40)
+
+    def test_job_lifecycle(self):
+        response = self.client.post(self.url, self.params)
+        self.assertEqual(response.status_code, 202)
+        job = response.json()
+        self.assertEqual((job["status"], job["result"]), ("pending", None))
+
+        duplicate = self.client.post(self.url, self.params).json()
+        self.assertEqual(duplicate["id"], job["id"])
+
+        call_command("run_report_worker", once=True, chunk_periods=7, stdout=io.StringIO())
+
+        done = self.client.get(response["Location"]).json()
+        self.assertEqual(done["status"], "done")
+        self.assertEqual(done["progress"], {"done": 41, "total": 41})
+        expected = self.client.get(reverse("user-orders-report"), {**self.params, "page_size": 500}).json()["results"]
+        columns = done["result"]["columns"]
+        self.assertEqual(
+            [dict(zip(columns, row))["orders_count"] for row in done["result"]["rows"]],
+            [row["orders_count"] for row in expected],
+        )
+
+        self.assertNotEqual(self.client.post(self.url, self.params).json()["id"], job["id"])
+
+    def test_failed_job_records_error(self):
+        job = ReportJob.objects.create(start_date=date(2025, 1, 1), end_date=date(2025, 1, 31), period="hourly")
+
+        call_command("run_report_worker", once=True, stdout=io.StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.Status.FAILED)
+        self.assertIn("hourly", job.error)
+
+    def test_invalid_parameters(self):
+        response = self.client.post(self.url, {"start_date": "2025-02-01", "end_date": "2025-01-01"})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ReportJob.objects.exists())
+
+    def test_rejects_approx_accuracy(self):
+        response = self.client.post(self.url, {**self.params, "accuracy": "approx"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("accuracy", response.json())
+        self.assertFalse(ReportJob.objects.exists())
+
+
+class TestOrderItemTotals(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="totals", email="totals@example.com")
+        self.order = Order.objects.create(user=self.user, created_at=timezone.now())
+        self.other = Order.objects.create(user=self.user, created_at=timezone.now())
+
+    def totals(self, order) -> tuple:
+        order.refresh_from_db()
+        return order.items1_count, order.items1_total, order.items2_count, order.items2_total
+
+    def test_single_row_writes(self):
+        now = timezone.now()
+        item1 = OrderItem1.objects.create(order=self.order, price="10.50", created_at=now)
+        OrderItem2.objects.create(order=self.order, placement_price=Decimal("3"), article_price=Decimal("2.25"), created_at=now)
+        self.assertEqual(self.totals(self.order), (1, Decimal("10.50"), 1, Decimal("5.25")))
+
+        item1.price = Decimal("12.00")
+        item1.save()
+        self.assertEqual(self.totals(self.order)[:2], (1, Decimal("12.00")))
+
+        item1.order = self.other
+        item1.save()
+        self.assertEqual(self.totals(self.order)[:2], (0, Decimal("0.00")))
+        self.assertEqual(self.totals(self.other)[:2], (1, Decimal("12.00")))
+
+        item1.delete()
+        self.assertEqual(self.totals(self.other)[:2], (0, Decimal("0.00")))
+
+    def test_bulk_writes(self):
+        now = timezone.now()
+        items = OrderItem1.objects.bulk_create(
+            [OrderItem1(order=self.order, price=Decimal("1.10"), created_at=now) for _ in range(3)]
+        )
+        self.assertEqual(self.totals(self.order)[:2], (3, Decimal("3.30")))
+
+        OrderItem1.objects.filter(pk=items[0].pk).update(order=self.other)
+        self.assertEqual(self.totals(self.order)[:2], (2, Decimal("2.20")))
+        self.assertEqual(self.totals(self.other)[:2], (1, Decimal("1.10")))
+
+        for item in items:
+            item.price = Decimal("2.00")
+        OrderItem1.objects.bulk_update(items, ["price"])
+        self.assertEqual(self.totals(self.order)[:2], (2, Decimal("4.00")))
+
+        OrderItem1.objects.filter(order=self.order).delete()
+        self.assertEqual(self.totals(self.order)[:2], (0, Decimal("0.00")))
+
+    def test_reconcile_command(self):
+        OrderItem1.objects.create(order=self.order, price=Decimal("4.00"), created_at=timezone.now())
+        Order.objects.filter(pk=self.order.pk).update(items1_count=7)
+        self.assertEqual(list(Order.objects.with_drifted_item_totals()), [self.order])
+
+        out = io.StringIO()
+        call_command("reconcile_order_totals", stdout=out)
+        self.assertIn("with drifted totals: 1", out.getvalue())
+        self.assertEqual(self.totals(self.order)[0], 7)
+
+        call_command("reconcile_order_totals", fix=True, batch_size=1, stdout=io.StringIO())
+        self.assertEqual(self.totals(self.order)[:2], (1, Decimal("4.00")))
+        self.assertFalse(Order.objects.with_drifted_item_totals().exists())
+
+
+@skipUnless(connection.vendor == "postgresql", "item partitioning is PostgreSQL only")
+class TestItemPartitions(TestCase):
+    table = OrderItem1._meta.db_table
+
+    def test_item_tables_are_partitioned(self):
+        for model in (OrderItem1, OrderItem2):
+            self.assertTrue(is_partitioned(connection, model._meta.db_table))
+        this_month = timezone.now().date().replace(day=1)
+        self.assertIn(this_month, list_partitions(connection, self.table))
+
+    def test_create_partition_moves_rows_from_default(self):
+        user = User.objects.create(username="partitions", email="partitions@example.com")
+        order = Order.objects.create(user=user, created_at=timezone.now())
+        far_month = date(timezone.now().year + 5, 3, 1)
+        item = OrderItem1.objects.create(
+            order=order, price=Decimal("1.00"), created_at=datetime(far_month.year, 3, 15, tzinfo=dt_timezone.utc),
+        )
+
+        created = ensure_partitions(connection, self.table, until=far_month, since=far_month - relativedelta(months=1))
+
+        self.assertEqual(created, [partition_name(self.table, far_month - relativedelta(months=1)), partition_name(self.table, far_month)])
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT id FROM {partition_name(self.table, far_month)}")
+            self.assertEqual(cursor.fetchall(), [(item.pk,)])
+        self.assertEqual(OrderItem1.objects.get(pk=item.pk).price, Decimal("1.00"))
+
+        detached = detach_partitions(connection, self.table, before=far_month)
+        self.assertIn(partition_name(self.table, far_month - relativedelta(months=1)), detached)
+        self.assertNotIn(partition_name(self.table, far_month), detached)
+        self.assertTrue(OrderItem1.objects.filter(pk=item.pk).exists())
+
+
+@skipUnless(connection.vendor == "postgresql", "EXPLAIN output is PostgreSQL specific")
+class TestExplainReport(TestCase):
+    def test_prints_a_plan_per_statement(self):
+        create_report_data(3)
+        out = io.StringIO()
+        call_command("explain_report", period=Period.DAILY.value, stdout=out)
+        output = out.getvalue()
+        self.assertIn("statements", output)
+        self.assertIn("Execution Time", output)
+        self.assertIn("Buffers", output)
+
+
+class TestBulkLoad(TestCase):
+    joined = timezone.now() - timedelta(days=30)
+
+    def load(self, use_copy: bool) -> list[tuple]:
+        joined = self.joined
+        user_ids = [uuid.uuid4() for _ in range(3)]
+        bulk_load(
+            User,
+            ("id", "username", "email", "is_active", "date_joined"),
+            ((user_id, f"bulk\t{i}", f"bulk_{i}@example.com", i != 1, joined) for i, user_id in enumerate(user_ids)),
+            batch_size=2,
+            use_copy=use_copy,
+        )
+        order_ids = [uuid.uuid4() for _ in user_ids]
+        bulk_load(
+            Order,
+            ("id", "user_id", "created_at"),
+            zip(order_ids, user_ids, [joined] * 3),
+            use_copy=use_copy,
+        )
+        loaded = bulk_load(
+            OrderItem1,
+            ("order_id", "price", "created_at"),
+            ((order_id, "12.30", joined) for order_id in order_ids for _ in range(2)),
+            batch_size=4,
+            use_copy=use_copy,
+        )
+        self.assertEqual(loaded, 6)
+        return list(
+            User.objects.filter(id__in=user_ids)
+            .order_by("username")
+            .values_list("username", "is_active", "date_joined", "password", "is_staff", "orders__item1__price")
+        )
+
+    @skipUnless(connection.vendor == "postgresql", "COPY is PostgreSQL only")
+    def test_copy_matches_bulk_create(self):
+        copied = self.load(use_copy=True)
+        self.assertEqual(len(copied), 6)
+        self.assertEqual(copied[0][0], "bulk\t0")
+        self.assertEqual({row[3:5] for row in copied}, {("", False)})
+
+        Order.objects.all().delete()
+        User.objects.all().delete()
+        self.assertEqual(self.load(use_copy=False), copied)
+
+
+class TestSeedDb(TestCase):
+    def seed(self, shard_size: int) -> list[tuple]:
+        call_command(
+            "seed_db", users=5, orders_per_user=3, items_per_order=2, batch_size=4,
+            shard_size=shard_size, seed=42, anchor="2025-06-01", stdout=io.StringIO(),
+        )
+        return list(
+            OrderItem2.objects
+            .order_by("order__user__username", "order__created_at", "order_id", "placement_price", "article_price")
+            .values_list(
+                "order__user_id", "order__user__date_joined", "order_id", "order__created_at",
+                "placement_price", "article_price", "created_at",
+            )
+        )
+
+    def test_same_seed_same_dataset(self):
+        first = self.seed(shard_size=5)
+        self.assertEqual(len(first), 5 * 3 * 2)
+        self.assertEqual(OrderItem1.objects.count(), 5 * 3 * 2)
+
+        User.objects.all().delete()
+        self.assertEqual(self.seed(shard_size=2), first)
+
+
+class TestCopyTextValue(SimpleTestCase):
+    def test_formats_values(self):
+        self.assertEqual(copy_text_value(None), "\\N")
+        self.assertEqual(copy_text_value(True), "t")
+        self.assertEqual(copy_text_value(Decimal("1.50")), "1.50")
+        self.assertEqual(copy_text_value("a\tb\\c\n"), "a\\tb\\\\c\\n")
+
+
+class TestReportJSONRenderer(SimpleTestCase):
+    def test_matches_generic_json(self):
+        rows = [
+            ReportRow("2024-01-01 - 2024-01-08", 3, 2, 5, 1, Decimal("12.5"), 4, Decimal("0.05"), partial=True),
+            ReportRow("2024-01-08 - 2024-01-15", orderitem1_cents=-1999, orderitem2_cents=7),
+        ]
+        page = {"count": 2, "next": None, "previous": "http://testserver/?page=1", "results": rows}
+
+        fast = ReportJSONRenderer().render(page)
+        generic = JSONRenderer().render({**page, "results": [row.to_dict() for row in rows]})
+        self.assertEqual(json.loads(fast), json.loads(generic))
+        self.assertEqual(rows[1].orderitem1_amount, Decimal("-19.99"))
+        self.assertEqual([to_cents(0.29), to_cents(Decimal("1.005")), to_cents(None)], [29, 101, 0])
+        self.assertEqual(rows[0].copy(), rows[0])
+
+    def test_falls_back_for_other_data(self):
+        self.assertEqual(ReportJSONRenderer().render({"detail": "x"}), b'{"detail":"x"}')
@@ -1,6 +1,14 @@
 from django.urls import path
-from orders.views import UserOrdersReportView
+from orders.views import (
+    AsyncUserOrdersReportView, CohortReportView, ReportBatchView, ReportJobListView, ReportJobView,
+    UserOrdersReportView,
+)
 
 urlpatterns = [
     path("reports/user-orders/", UserOrdersReportView.as_view(), name="user-orders-report"),
+    path("reports/user-orders/async/", AsyncUserOrdersReportView.as_view(), name="user-orders-report-async"),
+    path("reports/user-orders/batch/", ReportBatchView.as_view(), name="user-orders-report-batch"),
+    path("reports/user-orders/jobs/", ReportJobListView.as_view(), name="user-orders-report-jobs"),
+    path("reports/user-orders/jobs/<uuid:pk>/", ReportJobView.as_view(), name="user-orders-report-job"),
+    path("reports/user-cohorts/", CohortReportView.as_view(), name="user-cohorts-report"),
 ]
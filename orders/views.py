@@ -1,29 +1,240 @@
+from functools import partial
+
+from django.core.paginator import InvalidPage, Paginator
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views import View
 from rest_framework import status
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.reverse import reverse
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from rest_framework.views import APIView
 
-from report import generate_user_orders_report
-from orders.serializers import ReportRequestSerializer
+from admix.streaming import CSVRenderer, NDJSONRenderer
+from report import UserOrdersReport, generate_user_orders_reports
+from report.cache import report_cache
+from report.cohort import COHORT_COLUMNS, CohortReport
+from report.jobs import submit_job
+from report.parallel import compute_rows_concurrently
+from report.profiling import ReportProfile, profile_stage, profiling_enabled
+from orders.models import ReportJob
+from orders.pagination import ReportPeriodPagination
+from orders.renderers import ReportJSONRenderer, iter_cohort_json, iter_csv, iter_ndjson
+from orders.serializers import (
+    CohortRequestSerializer, ReportBatchSerializer, ReportJobRequestSerializer, ReportJobSerializer,
+    ReportRequestSerializer,
+)
 
 
 class UserOrdersReportView(APIView):
+    renderer_classes = [ReportJSONRenderer, BrowsableAPIRenderer, NDJSONRenderer, CSVRenderer]
+    # ?format=ndjson|csv streams every row as soon as it is generated, unpaginated
+    streaming_formats = {
+        NDJSONRenderer.format: iter_ndjson,
+        CSVRenderer.format: iter_csv,
+    }
+
     def get(self, request):
-        serializer = ReportRequestSerializer(data=request.query_params)
-        serializer.is_valid(raise_exception=True)
+        # settings.REPORT_PROFILING: Server-Timing header and per-period SQL stats in the log
+        profile = self.profile = ReportProfile() if profiling_enabled() else None
+
+        with profile_stage(profile, "validate"):
+            serializer = ReportRequestSerializer(data=request.query_params)
+            serializer.is_valid(raise_exception=True)
 
         validated_data = serializer.validated_data
 
-        report_data = generate_user_orders_report(
+        report_data = UserOrdersReport(
             start=validated_data["start_date"],
             end=validated_data["end_date"],
             period=validated_data["period"],
+            cache=report_cache,
+            profile=profile,
+            accuracy=validated_data["accuracy"],
         )
 
-        paginator = PageNumberPagination()
-        paginator.page_size = 50
+        renderer = request.accepted_renderer
+        if renderer.format in self.streaming_formats:
+            return self.stream(report_data, renderer)
+
+        paginator = ReportPeriodPagination()
 
-        result = paginator.paginate_queryset([r.to_dict() for r in report_data], request)
+        with profile_stage(profile, "paginate"):
+            # rows stay objects, ReportJSONRenderer writes them out directly
+            result = list(paginator.paginate_queryset(report_data, request))
 
         return paginator.get_paginated_response(result)
 
+    def stream(self, report_data, renderer):
+        content = self.streaming_formats[renderer.format](report_data)
+        if self.profile is not None:
+            content = self.profile.track_stream(content, self.profile_label())
+        response = StreamingHttpResponse(content, content_type=renderer.media_type)
+        response["Content-Disposition"] = f'attachment; filename="user-orders-report.{renderer.format}"'
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        profile = getattr(self, "profile", None)
+        if profile is None:
+            return response
+
+        if isinstance(response, Response):
+            # render now so that rendering is part of the timings
+            with profile.stage("render"):
+                response.render()
+            profile.log(self.profile_label())
+        response["Server-Timing"] = profile.server_timing()
+        return response
+
+    def profile_label(self) -> str:
+        return f"{self.request.method} {self.request.get_full_path()}"
+
+
+class AsyncUserOrdersReportView(View):
+    """
+    Async variant of UserOrdersReportView for ASGI deployments (admix.asgi).
+    The periods of the requested page are computed concurrently on the report
+    pool (REPORT_ASYNC_WORKERS) and pending periods are dropped when the client
+    disconnects. Same parameters and response shape as the paginated JSON view.
+    """
+    pagination_class = ReportPeriodPagination
+
+    async def get(self, request):
+        serializer = ReportRequestSerializer(data=request.GET)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        validated_data = serializer.validated_data
+
+        report_data = UserOrdersReport(
+            start=validated_data["start_date"],
+            end=validated_data["end_date"],
+            period=validated_data["period"],
+            cache=report_cache,
+            accuracy=validated_data["accuracy"],
+        )
+
+        paginator = Paginator(range(len(report_data)), self.get_page_size(request))
+        try:
+            page = paginator.page(request.GET.get("page", 1))
+        except InvalidPage as exc:
+            return JsonResponse({"detail": str(exc)}, status=status.HTTP_404_NOT_FOUND)
+
+        periods = page.object_list
+        rows = await compute_rows_concurrently(
+            report_data, report_data.bounds(offset=periods.start, limit=len(periods)),
+        )
+
+        url = request.build_absolute_uri()
+        content = ReportJSONRenderer().render({
+            "count": paginator.count,
+            "next": self.page_url(url, page.next_page_number()) if page.has_next() else None,
+            "previous": self.page_url(url, page.previous_page_number()) if page.has_previous() else None,
+            "results": list(rows),
+        })
+        return HttpResponse(content, content_type="application/json")
+
+    @staticmethod
+    def page_url(url: str, number: int) -> str:
+        if number == 1:
+            return remove_query_param(url, "page")
+        return replace_query_param(url, "page", number)
+
+    def get_page_size(self, request) -> int:
+        pagination = self.pagination_class
+        try:
+            page_size = int(request.GET[pagination.page_size_query_param])
+        except (KeyError, ValueError):
+            return pagination.page_size
+        if page_size <= 0:
+            return pagination.page_size
+        return min(page_size, pagination.max_page_size)
+
+
+class CohortReportView(APIView):
+    """
+    Cohort matrix (report.cohort) of the users who joined from start_date
+    through end_date, by period (default monthly). The response is always
+    streamed: a JSON object with the cohort sizes and the cells, or one
+    cell per line with ?format=ndjson|csv.
+    """
+    renderer_classes = [JSONRenderer, NDJSONRenderer, CSVRenderer]
+    streaming_formats = {
+        JSONRenderer.format: iter_cohort_json,
+        NDJSONRenderer.format: iter_ndjson,
+        CSVRenderer.format: partial(iter_csv, columns=COHORT_COLUMNS),
+    }
+
+    def get(self, request):
+        serializer = CohortRequestSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        validated_data = serializer.validated_data
+
+        report = CohortReport(validated_data["start_date"], validated_data["end_date"], validated_data["period"])
+
+        renderer = request.accepted_renderer
+        content = self.streaming_formats[renderer.format](report)
+        response = StreamingHttpResponse(content, content_type=renderer.media_type)
+        if renderer.format != JSONRenderer.format:
+            response["Content-Disposition"] = f'attachment; filename="user-cohorts.{renderer.format}"'
+        return response
+
+
+class ReportBatchView(APIView):
+    """
+    POST {"reports": [{"start_date", "end_date", "period"}, ...]} to get all
+    the reports in one response, unpaginated and in the requested order. They
+    are computed together from their common elementary periods, see
+    report.generate_user_orders_reports.
+    """
+    renderer_classes = [ReportJSONRenderer, BrowsableAPIRenderer]
+
+    def post(self, request):
+        serializer = ReportBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        specs = serializer.validated_data["reports"]
+
+        reports = generate_user_orders_reports(
+            [(spec["start_date"], spec["end_date"], spec["period"]) for spec in specs]
+        )
+        return Response({
+            "reports": [
+                {
+                    "start_date": spec["start_date"],
+                    "end_date": spec["end_date"],
+                    "period": spec["period"],
+                    "count": len(rows),
+                    "results": rows,
+                }
+                for spec, rows in zip(specs, reports)
+            ],
+        })
+
+
+class ReportJobListView(APIView):
+    """
+    POST the report parameters (as for UserOrdersReportView) to compute the
+    report in the background with run_report_worker. Returns 202 with the
+    job, which is an already pending or running one for the same parameters
+    if there is one. Jobs are always exact, accuracy=approx is rejected.
+    """
+
+    def post(self, request):
+        serializer = ReportJobRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        validated_data = serializer.validated_data
+
+        job, _ = submit_job(validated_data["start_date"], validated_data["end_date"], validated_data["period"])
+        response = Response(ReportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+        response["Location"] = reverse("user-orders-report-job", args=[job.pk], request=request)
+        return response
+
+
+class ReportJobView(APIView):
+    """Status and progress of a report job, with the result once it is done."""
+
+    def get(self, request, pk):
+        job = get_object_or_404(ReportJob, pk=pk)
+        return Response(ReportJobSerializer(job).data)
@@ -1,6 +1,8 @@
 from report.period import Period
-from report.chrono import iter_period_starts, as_aware_datetime
-from report.generator import ReportRow, generate_user_orders_report
+from report.chrono import Bucket, as_aware_datetime, count_buckets, count_periods, iter_buckets, iter_period_starts
+from report.generator import (
+    ReportRow, ReportSpec, UserOrdersReport, generate_user_orders_report, generate_user_orders_reports,
+)
 
 
 def print_report_by_rows(rows: list[ReportRow]):
@@ -28,10 +30,17 @@ def print_report_by_rows(rows: list[ReportRow]):
 
 
 __all__ = (
+    "Bucket",
     "Period",
     "ReportRow",
+    "ReportSpec",
+    "UserOrdersReport",
+    "count_buckets",
+    "count_periods",
+    "iter_buckets",
     "iter_period_starts",
     "print_report_by_rows",
     "generate_user_orders_report",
+    "generate_user_orders_reports",
     "as_aware_datetime",
 )
@@ -0,0 +1,218 @@
+"""
+Approximate report engine ("approx"): aggregates over TABLESAMPLEs of the
+users and of the orders (PostgreSQL).
+
+The user fields (new and activated users) are estimated from a sample of the
+user table. The order fields are estimated from a separate sample of the
+order table. Each sampled order is mapped to the period of its user by a
+primary key lookup, and brings its item counts and amounts from the
+denormalized Order totals, so sampling orders samples the item data too. The
+work is proportional to the two samples rather than to the tables. Each
+sample fraction p is chosen to keep about REPORT_APPROX_SAMPLE_ROWS rows of
+its table, from the planner's row estimate.
+
+Every field is estimated as sum(y) / p over the sampled rows of the period.
+The Bernoulli-sampling variance (1 - p) / p^2 * sum(y^2) gives a normal 95%
+confidence interval. The two samples are independent, and each interval
+only covers the error of the sample its field comes from.
+
+BERNOULLI draws rows independently, which is what the intervals assume.
+SYSTEM draws whole pages: it reads fewer pages, but rows on the same page
+(users who joined, or orders placed, at about the same time) are correlated,
+so its intervals are too narrow. The samples are REPEATABLE with
+REPORT_APPROX_SEED, so refreshing a dashboard does not make the numbers
+jitter while the tables do not change.
+"""
+import json
+import math
+from decimal import Decimal
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from rest_framework.utils.encoders import JSONEncoder
+
+from orders.models import Order
+from report.generator import Bounds, ReportRow, iter_rows_bucketed, period_label
+
+SAMPLE_METHODS = ("BERNOULLI", "SYSTEM")
+Z_95 = 1.959964
+CENTS = Decimal("0.01")
+
+# ReportRow field -> value of one sampled user (u) or order (o) row
+USER_FIELDS = {
+    "new_users": "1",
+    "activated_users": "CASE WHEN u.is_active THEN 1 ELSE 0 END",
+}
+ORDER_FIELDS = {
+    "orders_count": "1",
+    "orderitem1_count": "o.items1_count",
+    "orderitem1_amount": "o.items1_total",
+    "orderitem2_count": "o.items2_count",
+    "orderitem2_amount": "o.items2_total",
+}
+ESTIMATED_FIELDS = {**USER_FIELDS, **ORDER_FIELDS}
+AMOUNT_FIELDS = ("orderitem1_amount", "orderitem2_amount")
+
+
+class ApproxReportRow(ReportRow):
+    __slots__ = (
+        # field -> (low, high) of its 95% confidence interval
+        "intervals",
+        # sampled percentages of the user and the order table
+        "sample_percent",
+        "orders_sample_percent",
+    )
+
+    def __init__(
+        self,
+        *args,
+        intervals: Optional[dict] = None,
+        sample_percent: float = 100.0,
+        orders_sample_percent: float = 100.0,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.intervals = intervals or {}
+        self.sample_percent = sample_percent
+        self.orders_sample_percent = orders_sample_percent
+
+    def _values(self) -> tuple:
+        return super()._values() + (self.intervals, self.sample_percent, self.orders_sample_percent)
+
+    def to_dict(self):
+        data = super().to_dict()
+        for name, (low, high) in self.intervals.items():
+            data[f"{name}_ci"] = [low, high]
+        data["sample_percent"] = self.sample_percent
+        data["orders_sample_percent"] = self.orders_sample_percent
+        return data
+
+    def to_json(self) -> str:
+        # rare path (sampled reports are small), the generic encoder is fine
+        return json.dumps(self.to_dict(), cls=JSONEncoder, separators=(",", ":"))
+
+
+def sample_percent(model, target_rows: int) -> float:
+    """Percentage of the table of `model` that is about `target_rows` rows (planner estimate)."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)",
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    estimate = row[0] if row else -1
+    if estimate <= 0:
+        # never analyzed
+        return 100.0
+    return min(100.0, 100.0 * target_rows / estimate)
+
+
+def _estimate(name: str, total, squares, p: float):
+    """Scaled total and confidence interval of one field."""
+    total, squares = float(total or 0), float(squares or 0)
+    estimate = total / p
+    margin = Z_95 * math.sqrt((1 - p) / (p * p) * squares)
+    low, high = max(0.0, estimate - margin), estimate + margin
+    if name in AMOUNT_FIELDS:
+        return tuple(Decimal(value).quantize(CENTS) for value in (estimate, low, high))
+    return round(estimate), math.floor(low), math.ceil(high)
+
+
+def _exact_rows(bounds: Bounds) -> Iterator[ApproxReportRow]:
+    for row in iter_rows_bucketed(bounds):
+        yield ApproxReportRow(
+            period=row.period,
+            **{name: getattr(row, name) for name in ESTIMATED_FIELDS},
+            partial=row.partial,
+            intervals={name: (getattr(row, name),) * 2 for name in ESTIMATED_FIELDS},
+        )
+
+
+def _sampled_sums(table_sql: str, fields: dict, bounds: Bounds, method: str, percent: float, seed) -> dict:
+    """bucket -> (sum(y), sum(y * y)) per field over the sampled rows of `table_sql` ("... u" is the user)."""
+    bucket = " ".join(
+        f"WHEN u.date_joined >= %s AND u.date_joined < %s THEN {idx}" for idx in range(len(bounds))
+    )
+    values = ", ".join(f"{value} AS {name}" for name, value in fields.items())
+    sums = ", ".join(f"sum({name}), sum({name} * {name})" for name in fields)
+    repeatable = " REPEATABLE (%s)" if seed is not None else ""
+    sql = f"""
+        SELECT bucket, {sums}
+        FROM (
+            SELECT CASE {bucket} END AS bucket, {values}
+            FROM {table_sql.format(sample=f"TABLESAMPLE {method} (%s){repeatable}")}
+            WHERE u.date_joined >= %s AND u.date_joined < %s
+        ) sampled
+        WHERE bucket IS NOT NULL
+        GROUP BY bucket
+    """
+    params = [value for start, end in bounds for value in (start, end)]
+    params.append(percent)
+    if seed is not None:
+        params.append(seed)
+    params += [min(start for start, _ in bounds), max(end for _, end in bounds)]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {row[0]: row[1:] for row in cursor.fetchall()}
+
+
+def iter_rows_approx(
+    bounds: Bounds,
+    percent: Optional[float] = None,
+    method: Optional[str] = None,
+    seed: Optional[int] = None,
+) -> Iterator[ApproxReportRow]:
+    """
+    Engine computing estimated rows from samples of `percent` of the users and
+    of the orders (default: see sample_percent, per table). Falls back to exact
+    rows with zero-width intervals when both tables are sampled whole or the
+    database has no TABLESAMPLE.
+    """
+    if not bounds:
+        return
+    method = (method or getattr(settings, "REPORT_APPROX_METHOD", "BERNOULLI")).upper()
+    if method not in SAMPLE_METHODS:
+        raise ValueError(f"unknown sample method: {method}")
+    if seed is None:
+        seed = getattr(settings, "REPORT_APPROX_SEED", None)
+
+    if connection.vendor != "postgresql":
+        yield from _exact_rows(bounds)
+        return
+    User = get_user_model()
+    target = getattr(settings, "REPORT_APPROX_SAMPLE_ROWS", 50_000)
+    users_percent = percent if percent is not None else sample_percent(User, target)
+    orders_percent = percent if percent is not None else sample_percent(Order, target)
+    if users_percent >= 100 and orders_percent >= 100:
+        yield from _exact_rows(bounds)
+        return
+    users_percent, orders_percent = min(users_percent, 100.0), min(orders_percent, 100.0)
+
+    qn = connection.ops.quote_name
+    users, orders = qn(User._meta.db_table), qn(Order._meta.db_table)
+    user_sums = _sampled_sums(f"{users} u {{sample}}", USER_FIELDS, bounds, method, users_percent, seed)
+    order_sums = _sampled_sums(
+        f"{orders} o {{sample}} JOIN {users} u ON u.id = o.user_id",
+        ORDER_FIELDS, bounds, method, orders_percent, seed,
+    )
+    samples = ((USER_FIELDS, users_percent, user_sums), (ORDER_FIELDS, orders_percent, order_sums))
+
+    for idx, (start, end) in enumerate(bounds):
+        values, intervals = {}, {}
+        for fields, sampled_percent, grouped in samples:
+            sums = grouped.get(idx, (0,) * (2 * len(fields)))
+            for position, name in enumerate(fields):
+                p = sampled_percent / 100
+                estimate, low, high = _estimate(name, sums[2 * position], sums[2 * position + 1], p)
+                values[name] = estimate
+                intervals[name] = (low, high)
+        yield ApproxReportRow(
+            period=period_label(start, end),
+            **values,
+            intervals=intervals,
+            sample_percent=round(users_percent, 4),
+            orders_sample_percent=round(orders_percent, 4),
+        )
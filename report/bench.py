@@ -0,0 +1,164 @@
+"""
+Benchmark cases for the report, run by the bench_report command.
+
+Datasets have fixed scales and are seeded with a fixed seed and anchor date, so
+results from different runs and machines are comparable. Ranges end at the
+anchor. Every case is timed over several runs after a warm-up run; query count
+and DB time come from CaptureQueriesContext.
+"""
+import math
+import statistics
+import time
+from dataclasses import asdict, dataclass
+from datetime import date, timedelta
+from typing import Callable, Iterator, Optional
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from orders.models import Order, OrderItem1
+from report.chrono import as_aware_datetime
+from report.generator import DEFAULT_ENGINE, generate_user_orders_report
+from report.period import Period
+
+BENCH_SEED = 20250101
+BENCH_ANCHOR = date(2025, 1, 1)
+
+
+@dataclass(frozen=True)
+class Scale:
+    users: int
+    orders_per_user: int
+    items_per_order: int
+
+    @property
+    def orders(self) -> int:
+        return self.users * self.orders_per_user
+
+    @property
+    def items(self) -> int:
+        return self.orders * self.items_per_order
+
+
+SCALES = {
+    "S": Scale(users=500, orders_per_user=10, items_per_order=5),
+    "M": Scale(users=5_000, orders_per_user=20, items_per_order=10),
+    "L": Scale(users=50_000, orders_per_user=50, items_per_order=10),
+}
+
+RANGES = {"30d": 30, "90d": 90, "365d": 365}
+PERIODS = (Period.DAILY, Period.WEEKLY, Period.MONTHLY)
+STATS_STRATEGIES = ("subquery", "join")
+
+
+@dataclass
+class CaseResult:
+    runs: int
+    p50_ms: float
+    p95_ms: float
+    queries: int
+    db_ms: float
+    rows: int
+
+
+@dataclass(frozen=True)
+class Case:
+    name: str
+    run: Callable[[], int]
+
+
+def dataset_matches(scale: Scale) -> bool:
+    return (
+        get_user_model().objects.count() == scale.users
+        and Order.objects.count() == scale.orders
+        and OrderItem1.objects.count() == scale.items
+    )
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def measure(run: Callable[[], int], repeat: int, warmup: int = 1) -> CaseResult:
+    for _ in range(warmup):
+        run()
+
+    timings, queries, db_time, rows = [], [], [], 0
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            rows = run()
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured.captured_queries))
+        db_time.append(sum(float(query["time"]) for query in captured.captured_queries) * 1000)
+
+    return CaseResult(
+        runs=repeat,
+        p50_ms=round(percentile(timings, 50), 3),
+        p95_ms=round(percentile(timings, 95), 3),
+        queries=max(queries),
+        db_ms=round(statistics.median(db_time), 3),
+        rows=rows,
+    )
+
+
+def range_bounds(days: int):
+    end = as_aware_datetime(BENCH_ANCHOR, end_of_day=True)
+    return as_aware_datetime(BENCH_ANCHOR - timedelta(days=days - 1)), end
+
+
+def iter_cases(engines=(DEFAULT_ENGINE,), ranges=RANGES) -> Iterator[Case]:
+    User = get_user_model()
+
+    for range_name, days in ranges.items():
+        start, end = range_bounds(days)
+
+        for engine in engines:
+            for period in PERIODS:
+                def run_report(start=start, end=end, period=period, engine=engine):
+                    return len(list(generate_user_orders_report(start, end, period=period, engine=engine)))
+
+                yield Case(f"generate/{engine}/{period.name.lower()}/{range_name}", run_report)
+
+        for strategy in STATS_STRATEGIES:
+            def run_with_stats(start=start, end=end, strategy=strategy):
+                users = User.objects.filter(date_joined__gte=start, date_joined__lt=end).with_stats(strategy)
+                return len(list(users.values_list(
+                    "id", "orders_count", "items1_count", "items1_spent", "items2_count", "items2_spent",
+                )))
+
+            yield Case(f"with_stats/{strategy}/{range_name}", run_with_stats)
+
+        def run_with_cached_stats(start=start, end=end):
+            users = User.objects.filter(date_joined__gte=start, date_joined__lt=end).with_cached_stats()
+            return len(list(users.values_list(
+                "id", "orders_count", "items1_count", "items1_spent", "items2_count", "items2_spent",
+            )))
+
+        yield Case(f"with_cached_stats/{range_name}", run_with_cached_stats)
+
+
+def run_cases(cases, repeat: int, warmup: int = 1) -> dict[str, dict]:
+    return {case.name: asdict(measure(case.run, repeat, warmup)) for case in cases}
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict], threshold: float) -> dict[str, dict]:
+    """
+    Per case in both runs: p50 ratio against the baseline and whether it is a
+    regression (p50 more than `threshold` slower, or more queries).
+    """
+    comparison = {}
+    for name, result in results.items():
+        before: Optional[dict] = baseline.get(name)
+        if before is None:
+            continue
+        ratio = result["p50_ms"] / before["p50_ms"] if before["p50_ms"] else 1.0
+        comparison[name] = {
+            "p50_ratio": round(ratio, 3),
+            "queries_delta": result["queries"] - before["queries"],
+            "regression": ratio > 1 + threshold or result["queries"] > before["queries"],
+        }
+    return comparison
@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from orders.models import ReportCacheGeneration
+from report.chrono import as_aware_datetime
+from report.generator import ReportRow
+
+CellKey = tuple[datetime, datetime, str]
+
+
+def shared_generation() -> int:
+    return ReportCacheGeneration.objects.filter(pk=1).values_list("generation", flat=True).first() or 0
+
+
+def bump_shared_generation():
+    """
+    Invalidates the report caches of every process, each drops its cells on its
+    next sync(). Writes that bypass signals (bulk_load, queryset.update, raw
+    SQL) must call this once they are committed.
+    """
+    if not ReportCacheGeneration.objects.filter(pk=1).update(generation=F("generation") + 1):
+        ReportCacheGeneration.objects.get_or_create(pk=1)
+        ReportCacheGeneration.objects.filter(pk=1).update(generation=F("generation") + 1)
+
+
+class PeriodCellCache:
+    """
+    In-process LRU of report rows keyed by (period start, period end, period kind).
+
+    Only closed periods (end <= now) are stored: their rows only change when
+    historical data is written. The open period is always recomputed.
+    The cache is local to the process but its validity is shared: committed
+    writes bump ReportCacheGeneration (report_days_changed, or an explicit
+    bump_shared_generation()), and sync(), run once per report, drops every
+    cell when the generation moved. Cells older than `ttl` seconds are
+    recomputed too, which bounds staleness after writes nobody reported.
+    """
+
+    def __init__(self, max_size: int = 10_000, ttl: Optional[float] = 3600):
+        if max_size < 1:
+            raise ValueError("max_size must be >= 1")
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # cell -> (row, time.monotonic() it was stored at)
+        self._cells: OrderedDict[CellKey, tuple[ReportRow, float]] = OrderedDict()
+        self._generation: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._cells)
+
+    @staticmethod
+    def is_closed(start: datetime, end: datetime) -> bool:
+        return end <= timezone.now()
+
+    def sync(self) -> int:
+        """
+        Reads the shared generation, drops every cell if it moved since the
+        last sync and returns it, to be handed to set() with the rows computed
+        after this call.
+        """
+        generation = shared_generation()
+        with self._lock:
+            if generation != self._generation:
+                self._cells.clear()
+                self._generation = generation
+        return generation
+
+    def get(self, key: CellKey) -> Optional[ReportRow]:
+        with self._lock:
+            cell = self._cells.get(key)
+            if cell is not None and self.ttl is not None and time.monotonic() - cell[1] > self.ttl:
+                del self._cells[key]
+                cell = None
+            if cell is None:
+                self.misses += 1
+                return None
+            self._cells.move_to_end(key)
+            self.hits += 1
+            return cell[0].copy()
+
+    def set(self, key: CellKey, row: ReportRow, generation: Optional[int] = None):
+        """param generation: what sync() returned before `row` was computed, the row is
+        dropped if another sync saw a newer one since (it may predate that write)"""
+        start, end, _ = key
+        if not self.is_closed(start, end):
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._cells[key] = (row.copy(), time.monotonic())
+            self._cells.move_to_end(key)
+            while len(self._cells) > self.max_size:
+                self._cells.popitem(last=False)
+
+    def invalidate_days(self, days: Iterable[date]):
+        """Drop every cell whose period contains the start of one of `days`."""
+        day_starts = [as_aware_datetime(day) for day in days]
+        with self._lock:
+            stale = [
+                key for key in self._cells
+                if any(key[0] <= day_start < key[1] for day_start in day_starts)
+            ]
+            for key in stale:
+                del self._cells[key]
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._cells),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+report_cache = PeriodCellCache(
+    max_size=getattr(settings, "REPORT_CACHE_MAX_CELLS", 10_000),
+    ttl=getattr(settings, "REPORT_CACHE_TTL", 3600),
+)
+
+
+def invalidate_cache_on_change(sender, days, **kwargs):
+    report_cache.invalidate_days(days)
+    bump_shared_generation()
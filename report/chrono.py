@@ -1,6 +1,20 @@
-from datetime import date, datetime, time
+"""
+Calendar-aligned report periods.
+
+Periods are days, ISO weeks (Monday to Monday) and calendar months in the
+report timezone (settings.REPORT_TIME_ZONE, default TIME_ZONE), so the same
+period has the same bounds in every request and caches and rollups can share
+it. The requested range is clipped to whole periods: the first and last
+bucket may be partial, they keep their aligned start/end and carry the
+clipped lower/upper bounds the report is computed over.
+"""
+import zoneinfo
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, tzinfo
 from dateutil.relativedelta import relativedelta
+from functools import lru_cache
 
+from django.conf import settings
 from django.utils import timezone
 
 from typing import Iterator, Optional
@@ -8,49 +22,161 @@ from typing import Iterator, Optional
 from report.period import Period
 
 
+@lru_cache(maxsize=None)
+def _zone(name: str) -> tzinfo:
+    return zoneinfo.ZoneInfo(name)
+
+
+def report_timezone() -> tzinfo:
+    return _zone(getattr(settings, "REPORT_TIME_ZONE", None) or settings.TIME_ZONE)
+
+
+def report_localdate(value: Optional[datetime] = None) -> date:
+    """Day of `value` (default: now) in the report timezone."""
+    return timezone.localdate(value, report_timezone())
+
+
 def as_aware_datetime(v, *, end_of_day=False):
+    """
+    Start (or with end_of_day the last microsecond) of the day of `v` in the
+    report timezone. Datetimes are reduced to their own date first.
+    """
+    if v is None:
+        raise ValueError("a date is required")
     v = v.date() if isinstance(v, datetime) else v
     if isinstance(v, date) and not isinstance(v, datetime):
         t = time.max if end_of_day else time.min
         v = datetime.combine(v, t)
 
     if timezone.is_naive(v):
-        v = timezone.make_aware(v, timezone.get_current_timezone())
+        v = timezone.make_aware(v, report_timezone())
 
     return v
 
 
-def iter_period_starts(
+def period_step(period: Period) -> relativedelta:
+    if period == Period.DAILY:
+        return relativedelta(days=1)
+    elif period == Period.WEEKLY:
+        return relativedelta(weeks=1)
+    elif period == Period.MONTHLY:
+        return relativedelta(months=1)
+    raise ValueError(f"unknown period: {period}")
+
+
+def align_day(day: date, period: Period) -> date:
+    """First day of the period containing `day`."""
+    if period == Period.DAILY:
+        return day
+    elif period == Period.WEEKLY:
+        return day - timedelta(days=day.weekday())
+    elif period == Period.MONTHLY:
+        return day.replace(day=1)
+    raise ValueError(f"unknown period: {period}")
+
+
+@dataclass(frozen=True)
+class Bucket:
+    """
+    One aligned period. start/end are its calendar bounds, lower/upper the
+    part of it inside the requested range (equal to start/end unless partial).
+    """
+    start: datetime
+    end: datetime
+    lower: datetime
+    upper: datetime
+
+    @property
+    def partial(self) -> bool:
+        return self.lower != self.start or self.upper != self.end
+
+    @property
+    def bounds(self) -> tuple[datetime, datetime]:
+        return self.lower, self.upper
+
+
+def _day_start(day: date) -> datetime:
+    # combining per day keeps midnights right across DST changes
+    return as_aware_datetime(day)
+
+
+def _last_day(end_date: datetime) -> date:
+    """Day of the last instant before the exclusive `end_date`."""
+    return report_localdate(end_date - timedelta(microseconds=1))
+
+
+def bucket_of(start: datetime, end: datetime, period: Period) -> Bucket:
+    """The aligned bucket `start` falls into, clipped to [start, end)."""
+    first_day = align_day(report_localdate(start), period)
+    bucket_start = _day_start(first_day)
+    bucket_end = _day_start(first_day + period_step(period))
+    return Bucket(bucket_start, bucket_end, max(start, bucket_start), min(end, bucket_end))
+
+
+def is_partial(start: datetime, end: datetime, period: Period) -> bool:
+    return bucket_of(start, end, period).partial
+
+
+def count_buckets(
+    start_date: datetime,
+    end_date: datetime,
+    period: Period = Period.WEEKLY,
+) -> int:
+    """Number of buckets iter_buckets yields for the same arguments, worked out without iterating."""
+    if end_date <= start_date:
+        return 0
+    first = align_day(report_localdate(start_date), period)
+    last = align_day(_last_day(end_date), period)
+    if period == Period.MONTHLY:
+        return (last.year - first.year) * 12 + last.month - first.month + 1
+    return (last - first).days // period_step(period).days + 1
+
+
+def iter_buckets(
     start_date: datetime,
     end_date: Optional[datetime] = None,
     period: Period = Period.WEEKLY,
-) -> Iterator[datetime]:
+    offset: int = 0,
+    limit: Optional[int] = None,
+) -> Iterator[Bucket]:
     """
-    Yields dates between start and end.
-    param start: required, cannot be None
-    param end: if None, end = now()
-    param period: default 'weekly'
+    Yields the aligned buckets overlapping [start_date, end_date).
+    param end: exclusive, if None the end of today
+    param offset, limit: skip the first `offset` buckets and stop after `limit`,
+        bucket starts are computed directly so skipping is free
     """
-
     if start_date is None:
         raise ValueError("start date is required")
 
     if end_date is None:
-        end_date = timezone.now().date()
+        end_date = as_aware_datetime(report_localdate() + timedelta(days=1))
 
-    if period == Period.DAILY:
-        step = relativedelta(days=1)
-    elif period == Period.WEEKLY:
-        step = relativedelta(weeks=1)
-    elif period == Period.MONTHLY:
-        step = relativedelta(months=1)
-    else:
-        raise ValueError(f"unknown period: {period}")
-
-    current_date = start_date
-    while current_date <= end_date:
-        if current_date + step > end_date:
-            yield current_date, end_date
-        else:
-            yield current_date, current_date + step
-        current_date += step
+    step = period_step(period)
+    first_day = align_day(report_localdate(start_date), period)
+    count = count_buckets(start_date, end_date, period)
+    stop = count if limit is None else min(count, offset + limit)
+
+    for index in range(offset, stop):
+        day = first_day + step * index
+        bucket_start, bucket_end = _day_start(day), _day_start(day + step)
+        yield Bucket(bucket_start, bucket_end, max(start_date, bucket_start), min(end_date, bucket_end))
+
+
+def count_periods(
+    start_date: datetime,
+    end_date: datetime,
+    period: Period = Period.WEEKLY,
+) -> int:
+    return count_buckets(start_date, end_date, period)
+
+
+def iter_period_starts(
+    start_date: datetime,
+    end_date: Optional[datetime] = None,
+    period: Period = Period.WEEKLY,
+    offset: int = 0,
+    limit: Optional[int] = None,
+) -> Iterator[tuple[datetime, datetime]]:
+    """(lower, upper) bounds of iter_buckets, the form report engines take."""
+    for bucket in iter_buckets(start_date, end_date, period, offset, limit):
+        yield bucket.bounds
@@ -0,0 +1,152 @@
+"""
+Cohort report: users grouped by the period they joined in, crossed with the
+periods their orders were placed in.
+
+Every cell of the matrix comes from one grouped query over the orders joined
+to their users. Both timestamps are truncated to the calendar periods of
+report.chrono (report timezone, ISO weeks, calendar months), and item counts
+and amounts are summed from the Order totals, so the item tables are not read.
+The cohort sizes, which include users without orders, come from one grouped
+query over the users. Cells are read with .iterator(), which is a server-side
+cursor on PostgreSQL, so a matrix of any size can be streamed.
+"""
+import json
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Iterator, Optional
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, DecimalField, Sum, Value
+from django.db.models.functions import Coalesce, Trunc
+from rest_framework.utils.encoders import JSONEncoder
+
+from orders.models import Order
+from report.chrono import as_aware_datetime, period_step, report_localdate, report_timezone
+from report.period import Period
+
+TRUNC_KINDS = {
+    Period.DAILY: "day",
+    Period.WEEKLY: "week",
+    Period.MONTHLY: "month",
+}
+COHORT_COLUMNS = (
+    "cohort",
+    "period",
+    "offset",
+    "cohort_users",
+    "users",
+    "orders_count",
+    "orderitem1_count",
+    "orderitem1_amount",
+    "orderitem2_count",
+    "orderitem2_amount",
+)
+CHUNK_SIZE = 2000
+
+
+@dataclass(frozen=True)
+class CohortCell:
+    """Orders placed in `period` by the users who joined in `cohort` (first days of the periods)."""
+    cohort: date
+    period: date
+    # periods from the cohort to `period`, 0 is the period the users joined in
+    offset: int
+    cohort_users: int
+    # users of the cohort with orders in the period
+    users: int
+    orders_count: int
+    orderitem1_count: int
+    orderitem1_amount: Decimal
+    orderitem2_count: int
+    orderitem2_amount: Decimal
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in COHORT_COLUMNS}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), cls=JSONEncoder, separators=(",", ":"))
+
+
+def period_offset(cohort: date, period: date, kind: Period) -> int:
+    if kind == Period.MONTHLY:
+        return (period.year - cohort.year) * 12 + period.month - cohort.month
+    return (period - cohort).days // period_step(kind).days
+
+
+class CohortReport:
+    """
+    Cohort matrix of the users who joined from start through end (default:
+    today) and their orders placed in the same range, by `period`.
+    Iterating it yields the non-empty cells ordered by cohort and period.
+    Periods cut by the range edges only count the days inside it.
+    """
+
+    def __init__(self, start: date, end: date = None, period: Period = Period.MONTHLY):
+        if start is None:
+            raise ValueError("start date is required")
+        if end is None:
+            end = report_localdate()
+        end = end.date() if isinstance(end, datetime) else end
+        if end < start:
+            raise ValueError("end must be >= start")
+        if period not in TRUNC_KINDS:
+            raise ValueError(f"unknown period: {period}")
+
+        self.start_date = as_aware_datetime(start)
+        self.end_date = as_aware_datetime(end + timedelta(days=1))
+        self.period = Period(period)
+
+    def _trunc(self, field: str) -> Trunc:
+        return Trunc(field, TRUNC_KINDS[self.period], tzinfo=report_timezone())
+
+    def cohort_sizes(self) -> dict[date, int]:
+        """Users who joined per cohort, keyed by the first day of the cohort period."""
+        users = (
+            get_user_model().objects
+            .filter(date_joined__gte=self.start_date, date_joined__lt=self.end_date)
+            .annotate(cohort=self._trunc("date_joined"))
+            .order_by()
+            .values("cohort")
+            .annotate(users=Count("id"))
+        )
+        return {report_localdate(row["cohort"]): row["users"] for row in users}
+
+    def cells(self, sizes: Optional[dict[date, int]] = None, chunk_size: int = CHUNK_SIZE) -> Iterator[CohortCell]:
+        """param sizes: cohort_sizes() if the caller has them already"""
+        if sizes is None:
+            sizes = self.cohort_sizes()
+        money_zero = Value(Decimal("0.00"), output_field=DecimalField())
+        grouped = (
+            Order.objects
+            .filter(
+                user__date_joined__gte=self.start_date,
+                user__date_joined__lt=self.end_date,
+                created_at__gte=self.start_date,
+                created_at__lt=self.end_date,
+            )
+            .annotate(cohort=self._trunc("user__date_joined"), order_period=self._trunc("created_at"))
+            .order_by()
+            .values("cohort", "order_period")
+            .annotate(
+                users=Count("user_id", distinct=True),
+                orders_count=Count("*"),
+                orderitem1_count=Coalesce(Sum("items1_count"), 0),
+                orderitem1_amount=Coalesce(Sum("items1_total"), money_zero),
+                orderitem2_count=Coalesce(Sum("items2_count"), 0),
+                orderitem2_amount=Coalesce(Sum("items2_total"), money_zero),
+            )
+            .order_by("cohort", "order_period")
+        )
+        for row in grouped.iterator(chunk_size=chunk_size):
+            cohort, period = report_localdate(row.pop("cohort")), report_localdate(row.pop("order_period"))
+            yield CohortCell(
+                cohort=cohort,
+                period=period,
+                offset=period_offset(cohort, period, self.period),
+                cohort_users=sizes.get(cohort, 0),
+                **row,
+            )
+
+    def __iter__(self):
+        return self.cells()
@@ -1,50 +1,220 @@
-from dataclasses import dataclass, asdict
-from datetime import date
-from decimal import Decimal
+from collections.abc import Sequence
+from datetime import date, datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Iterable, Iterator, NamedTuple, Optional
 
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Sum, Q, Value
+from django.db.models import Case, Count, IntegerField, Q, Sum, Value, When
 from django.db.models.functions import Coalesce
+from django.utils.module_loading import import_string
 
-from report.chrono import iter_period_starts, as_aware_datetime
+from report.chrono import as_aware_datetime, count_periods, is_partial, iter_period_starts, report_localdate
 from report.period import Period
 
+Bounds = list[tuple[datetime, datetime]]
+
+# Engines take the list of (start, end) period bounds and yield one ReportRow
+# per bound, in the same order. "subquery" is the original one-query-per-period
+# implementation and is kept as the reference the other engines are checked against.
+ENGINES = {
+    "subquery": "report.generator.iter_rows_per_period",
+    "bucketed": "report.generator.iter_rows_bucketed",
+    "rollup": "report.rollup.iter_rows_from_rollups",
+    "vectorized": "report.vectorized.iter_rows_vectorized",
+    "snapshot": "report.snapshot.iter_rows_from_snapshot",
+    "approx": "report.approx.iter_rows_approx",
+}
+DEFAULT_ENGINE = "bucketed"
+
+# accuracy="approx" runs the "approx" engine: estimates with confidence
+# intervals from a sample of users, see report.approx
+ACCURACIES = ("exact", "approx")
+
+
+def to_cents(amount) -> int:
+    """Amount (Decimal, str, int or float) as integer cents, rounded half up; None is 0."""
+    if amount is None:
+        return 0
+    if isinstance(amount, float):
+        # the shortest repr, not the binary expansion: 0.29 is 29 cents
+        amount = repr(amount)
+    return int(Decimal(amount).scaleb(2).to_integral_value(ROUND_HALF_UP))
+
+
+def cents_to_str(cents: int) -> str:
+    sign = "-" if cents < 0 else ""
+    cents = abs(cents)
+    return f"{sign}{cents // 100}.{cents % 100:02d}"
+
+
+# public columns of a ReportRow, in output order
+REPORT_COLUMNS = (
+    "period",
+    "new_users",
+    "activated_users",
+    "orders_count",
+    "orderitem1_count",
+    "orderitem1_amount",
+    "orderitem2_count",
+    "orderitem2_amount",
+    "orders_total_amount",
+    "partial",
+)
+
 
-@dataclass()
 class ReportRow:
-    period: str
-    new_users: int
-    activated_users: int
-    orders_count: int
-    orderitem1_count: int
-    orderitem1_amount: Decimal
-    orderitem2_count: int
-    orderitem2_amount: Decimal
+    """
+    Numbers of one report period. Amounts are stored as integer cents and
+    exposed as Decimal through orderitem1_amount/orderitem2_amount; with
+    __slots__ and no per-row dict, long daily ranges stay cheap to build, cache
+    and render (to_json writes the JSON object directly).
+    """
+    __slots__ = (
+        "period",
+        "new_users",
+        "activated_users",
+        "orders_count",
+        "orderitem1_count",
+        "orderitem1_cents",
+        "orderitem2_count",
+        "orderitem2_cents",
+        # the period is cut by the start or end of the requested range
+        "partial",
+    )
+
+    def __init__(
+        self,
+        period: str,
+        new_users: int = 0,
+        activated_users: int = 0,
+        orders_count: int = 0,
+        orderitem1_count: int = 0,
+        orderitem1_amount=None,
+        orderitem2_count: int = 0,
+        orderitem2_amount=None,
+        partial: bool = False,
+        *,
+        orderitem1_cents: int = 0,
+        orderitem2_cents: int = 0,
+    ):
+        self.period = period
+        self.new_users = new_users
+        self.activated_users = activated_users
+        self.orders_count = orders_count
+        self.orderitem1_count = orderitem1_count
+        self.orderitem1_cents = orderitem1_cents if orderitem1_amount is None else to_cents(orderitem1_amount)
+        self.orderitem2_count = orderitem2_count
+        self.orderitem2_cents = orderitem2_cents if orderitem2_amount is None else to_cents(orderitem2_amount)
+        self.partial = partial
+
+    @property
+    def orderitem1_amount(self) -> Decimal:
+        return Decimal(self.orderitem1_cents).scaleb(-2)
+
+    @orderitem1_amount.setter
+    def orderitem1_amount(self, amount):
+        self.orderitem1_cents = to_cents(amount)
 
     @property
-    def orders_total_amount(self):
-        return self.orderitem1_amount + self.orderitem2_amount
+    def orderitem2_amount(self) -> Decimal:
+        return Decimal(self.orderitem2_cents).scaleb(-2)
+
+    @orderitem2_amount.setter
+    def orderitem2_amount(self, amount):
+        self.orderitem2_cents = to_cents(amount)
+
+    @property
+    def orders_total_amount(self) -> Decimal:
+        return Decimal(self.orderitem1_cents + self.orderitem2_cents).scaleb(-2)
+
+    def _values(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
 
-    def to_dict(self):
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def copy(self) -> "ReportRow":
+        row = object.__new__(type(self))
+        for cls in type(self).__mro__:
+            for name in getattr(cls, "__slots__", ()):
+                setattr(row, name, getattr(self, name))
+        return row
+
+    def to_dict(self) -> dict:
         return {
-            **asdict(self),
+            "period": self.period,
+            "new_users": self.new_users,
+            "activated_users": self.activated_users,
+            "orders_count": self.orders_count,
+            "orderitem1_count": self.orderitem1_count,
+            "orderitem1_amount": self.orderitem1_amount,
+            "orderitem2_count": self.orderitem2_count,
+            "orderitem2_amount": self.orderitem2_amount,
+            "partial": self.partial,
             "orders_total_amount": self.orders_total_amount,
         }
 
+    def to_json(self) -> str:
+        """to_dict as compact JSON (amounts as numbers), without building the dict."""
+        # period labels are digits, dashes and spaces, nothing to escape
+        return (
+            f'{{"period":"{self.period}","new_users":{self.new_users},'
+            f'"activated_users":{self.activated_users},"orders_count":{self.orders_count},'
+            f'"orderitem1_count":{self.orderitem1_count},"orderitem1_amount":{cents_to_str(self.orderitem1_cents)},'
+            f'"orderitem2_count":{self.orderitem2_count},"orderitem2_amount":{cents_to_str(self.orderitem2_cents)},'
+            f'"partial":{"true" if self.partial else "false"},'
+            f'"orders_total_amount":{cents_to_str(self.orderitem1_cents + self.orderitem2_cents)}}}'
+        )
 
-def generate_user_orders_report(
-    start: date,
-    end: date = None,
-    period: Period = Period.WEEKLY,
-) -> list[ReportRow]:
-    if (end and start and (end < start)):
-        raise ValueError("end must be >= start")
-    if start is None:
-        raise ValueError("start date is required")
-
-    for (start, end) in iter_period_starts(
-        start_date=as_aware_datetime(start), end_date=as_aware_datetime(end, end_of_day=True),
-    ):
+
+# additive ReportRow fields: the row of a union of disjoint bounds is their sum
+ROW_TOTALS = (
+    "new_users",
+    "activated_users",
+    "orders_count",
+    "orderitem1_count",
+    "orderitem1_cents",
+    "orderitem2_count",
+    "orderitem2_cents",
+)
+
+
+def period_label(start: datetime, end: datetime) -> str:
+    return f"{start.strftime('%Y-%m-%d')} - {end.strftime('%Y-%m-%d')}"
+
+
+def empty_row(start: datetime, end: datetime) -> ReportRow:
+    return ReportRow(
+        period=period_label(start, end),
+        new_users=0,
+        activated_users=0,
+        orders_count=0,
+        orderitem1_count=0,
+        orderitem2_count=0,
+    )
+
+
+def report_aggregates(user_rows) -> dict:
+    money_zero = Value(Decimal("0.0"))
+    return dict(
+        new_users=Count("id"),
+        activated_users=Count("id", filter=Q(is_active=True)),
+        orders_count=Coalesce(Sum(user_rows.query.annotations["orders_count"]), 0),
+        orderitem1_count=Coalesce(Sum(user_rows.query.annotations["items1_count"]), 0),
+        orderitem1_amount=Coalesce(Sum(user_rows.query.annotations["items1_spent"]), money_zero),
+        orderitem2_count=Coalesce(Sum(user_rows.query.annotations["items2_count"]), 0),
+        orderitem2_amount=Coalesce(Sum(user_rows.query.annotations["items2_spent"]), money_zero),
+    )
+
+
+def iter_rows_per_period(bounds: Bounds) -> Iterator[ReportRow]:
+    for (start, end) in bounds:
         user_rows = (
             get_user_model()
             .objects
@@ -55,19 +225,235 @@ def generate_user_orders_report(
             .with_stats()
             .order_by('date_joined')
         )
-        money_zero = Value(Decimal("0.0"))
-        report_data = user_rows.aggregate(
-            new_users=Count("id"),
-            activated_users=Count("id", filter=Q(is_active=True)),
-            orders_count=Coalesce(Sum(user_rows.query.annotations["orders_count"]), 0),
-            orderitem1_count=Coalesce(Sum(user_rows.query.annotations["items1_count"]), 0),
-            orderitem1_amount=Coalesce(Sum(user_rows.query.annotations["items1_spent"]), money_zero),
-            orderitem2_count=Coalesce(Sum(user_rows.query.annotations["items2_count"]), 0),
-            orderitem2_amount=Coalesce(Sum(user_rows.query.annotations["items2_spent"]), money_zero),
-        )
+        report_data = user_rows.aggregate(**report_aggregates(user_rows))
         yield ReportRow(
-            period=f"{start.strftime('%Y-%m-%d')} - {end.strftime('%Y-%m-%d')}",
+            period=period_label(start, end),
             **report_data,
         )
 
 
+def iter_rows_bucketed(bounds: Bounds) -> Iterator[ReportRow]:
+    """
+    Same rows as iter_rows_per_period, but every user is assigned to its bound
+    with a CASE over the bounds and all of them are aggregated in one grouped query.
+    """
+    if not bounds:
+        return
+
+    bucket = Case(
+        *(
+            When(date_joined__gte=start, date_joined__lt=end, then=Value(idx))
+            for idx, (start, end) in enumerate(bounds)
+        ),
+        default=None,
+        output_field=IntegerField(),
+    )
+    user_rows = (
+        get_user_model()
+        .objects
+        .filter(
+            date_joined__gte=min(start for start, _ in bounds),
+            date_joined__lt=max(end for _, end in bounds),
+        )
+        .with_stats()
+        .annotate(bucket=bucket)
+        .filter(bucket__isnull=False)
+    )
+    grouped = {
+        row.pop("bucket"): row
+        for row in user_rows.order_by().values("bucket").annotate(**report_aggregates(user_rows))
+    }
+
+    for idx, (start, end) in enumerate(bounds):
+        report_data = grouped.get(idx)
+        if report_data is None:
+            yield empty_row(start, end)
+        else:
+            yield ReportRow(period=period_label(start, end), **report_data)
+
+
+def get_engine(name: str):
+    try:
+        return import_string(ENGINES[name])
+    except KeyError:
+        raise ValueError(f"unknown report engine: {name}") from None
+
+
+class UserOrdersReport(Sequence):
+    """
+    Lazy sequence of the report rows from start through end (default: today),
+    one per calendar-aligned period (see report.chrono). Rows of the periods cut
+    by the range edges only cover the days inside it and are marked partial.
+    Its length comes from period arithmetic and slicing runs the engine for the
+    sliced periods only, so paginating it costs one page of periods.
+    param engine: name from ENGINES
+    param cache: optional report.cache.PeriodCellCache, only periods missing
+        from it are handed to the engine; partial periods are not cached
+    param profile: optional report.profiling.ReportProfile recording row
+        build time and the statements run per period
+    param accuracy: "approx" estimates the rows from a sample (report.approx),
+        overriding engine; estimates are never cached
+    """
+
+    def __init__(
+        self,
+        start: date,
+        end: date = None,
+        period: Period = Period.WEEKLY,
+        engine: str = DEFAULT_ENGINE,
+        cache=None,
+        profile=None,
+        accuracy: str = "exact",
+    ):
+        if accuracy not in ACCURACIES:
+            raise ValueError(f"unknown accuracy: {accuracy}")
+        if accuracy == "approx":
+            engine, cache = "approx", None
+        if (end and start and (end < start)):
+            raise ValueError("end must be >= start")
+        if start is None:
+            raise ValueError("start date is required")
+
+        if end is None:
+            end = report_localdate()
+        end = end.date() if isinstance(end, datetime) else end
+
+        self.start_date = as_aware_datetime(start)
+        # exclusive, so the last day is a whole period like the others
+        self.end_date = as_aware_datetime(end + timedelta(days=1))
+        self.period = period
+        self.run_engine = get_engine(engine)
+        self.cache = cache
+        self.profile = profile
+
+    def bounds(self, offset: int = 0, limit: int = None) -> Bounds:
+        return list(iter_period_starts(
+            start_date=self.start_date, end_date=self.end_date, period=self.period, offset=offset, limit=limit,
+        ))
+
+    def rows(self, bounds: Bounds) -> Iterator[ReportRow]:
+        if self.cache is None:
+            rows = self.run_engine(bounds)
+        else:
+            rows = _iter_cached(self.run_engine, bounds, self.period, self.cache)
+        rows = self.mark_partial(rows, bounds)
+        if self.profile is not None:
+            return self.profile.track_rows(rows, bounds)
+        return rows
+
+    def mark_partial(self, rows, bounds: Bounds) -> Iterator[ReportRow]:
+        """Sets row.partial of the rows of `bounds` (periods of this report), as rows() does."""
+        for row, (start, end) in zip(rows, bounds):
+            row.partial = is_partial(start, end, self.period)
+            yield row
+
+    def __len__(self):
+        return count_periods(self.start_date, self.end_date, self.period)
+
+    def __iter__(self):
+        return self.rows(self.bounds())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, stride = index.indices(len(self))
+            rows = list(self.rows(self.bounds(offset=start, limit=max(stop - start, 0))))
+            return rows[::stride]
+        if index < 0:
+            index += len(self)
+        rows = list(self.rows(self.bounds(offset=index, limit=1))) if index >= 0 else []
+        if not rows:
+            raise IndexError("report period index out of range")
+        return rows[0]
+
+
+def generate_user_orders_report(
+    start: date,
+    end: date = None,
+    period: Period = Period.WEEKLY,
+    engine: str = DEFAULT_ENGINE,
+    cache=None,
+    profile=None,
+    accuracy: str = "exact",
+) -> Iterator[ReportRow]:
+    """Yields one ReportRow per period between start and end, see UserOrdersReport."""
+    return iter(UserOrdersReport(
+        start, end, period, engine=engine, cache=cache, profile=profile, accuracy=accuracy,
+    ))
+
+
+def _iter_cached(run_engine, bounds: Bounds, period: Period, cache) -> Iterator[ReportRow]:
+    keys = [(start, end, str(period)) for start, end in bounds]
+    # partial periods are specific to the requested range, only whole ones are shared
+    shared = [not is_partial(start, end, period) for start, end in bounds]
+    generation = cache.sync()
+    rows = [cache.get(key) if share else None for key, share in zip(keys, shared)]
+    missing = [idx for idx, row in enumerate(rows) if row is None]
+    if missing:
+        for idx, row in zip(missing, run_engine([bounds[idx] for idx in missing])):
+            if shared[idx]:
+                cache.set(keys[idx], row, generation)
+            rows[idx] = row
+    yield from rows
+
+
+class ReportSpec(NamedTuple):
+    start: date
+    end: Optional[date] = None
+    period: Period = Period.WEEKLY
+
+
+def elementary_bounds(report_bounds: Iterable[Bounds]) -> Bounds:
+    """
+    The finest bounds every given bound is a union of: the intervals between
+    consecutive edges of all bounds, leaving out the gaps no bound covers.
+    """
+    report_bounds = [bounds for bounds in report_bounds if bounds]
+    edges = sorted({edge for bounds in report_bounds for bound in bounds for edge in bound})
+    # the bounds of one report are contiguous, so its range is first lower to last upper
+    ranges = [(bounds[0][0], bounds[-1][1]) for bounds in report_bounds]
+    return [
+        (lower, upper)
+        for lower, upper in zip(edges, edges[1:])
+        if any(start <= lower and upper <= end for start, end in ranges)
+    ]
+
+
+def generate_user_orders_reports(
+    specs: Iterable[ReportSpec | tuple],
+    engine: str = DEFAULT_ENGINE,
+) -> list[list[ReportRow]]:
+    """
+    Rows of several reports at once, one list per spec, as
+    generate_user_orders_report would give them. The periods of all reports
+    are cut into their elementary bounds, the engine computes those in one
+    call and every period is summed from the ones it spans, so ranges and
+    periods that overlap (this week, the last 4 weeks, the year by month)
+    are scanned once.
+    """
+    if engine == "approx":
+        raise ValueError("approx rows are estimates with intervals and cannot be summed")
+    reports = [UserOrdersReport(*ReportSpec(*spec), engine=engine) for spec in specs]
+    report_bounds = [report.bounds() for report in reports]
+    intervals = elementary_bounds(report_bounds)
+
+    # prefix sums over the intervals, a period is then one subtraction per field
+    totals = {name: [0] * (len(intervals) + 1) for name in ROW_TOTALS}
+    for idx, row in enumerate(get_engine(engine)(intervals), 1):
+        for name, column in totals.items():
+            column[idx] = column[idx - 1] + getattr(row, name)
+    first = {lower: idx for idx, (lower, _) in enumerate(intervals)}
+    last = {upper: idx + 1 for idx, (_, upper) in enumerate(intervals)}
+
+    return [
+        list(report.mark_partial(
+            (
+                ReportRow(
+                    period_label(start, end),
+                    **{name: column[last[end]] - column[first[start]] for name, column in totals.items()},
+                )
+                for start, end in bounds
+            ),
+            bounds,
+        ))
+        for report, bounds in zip(reports, report_bounds)
+    ]
@@ -0,0 +1,105 @@
+"""
+Background user/orders reports on a DB-backed queue (orders.models.ReportJob).
+
+submit_job() enqueues a report or returns the pending/running job with the
+same parameters. Workers (the run_report_worker command) claim the oldest
+pending job with SELECT ... FOR UPDATE SKIP LOCKED, so any number of them can
+poll the same table, compute it in chunks of periods and record the progress
+after every chunk. The result keeps the column names once and one value list
+per period.
+"""
+import os
+import socket
+from datetime import date, timedelta
+from typing import Optional
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from orders.models import ReportJob
+from report.chrono import report_localdate
+from report.generator import REPORT_COLUMNS, UserOrdersReport
+from report.period import Period
+
+CHUNK_PERIODS = 100
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def submit_job(start: date, end: Optional[date] = None, period: Period = Period.WEEKLY) -> tuple[ReportJob, bool]:
+    """The active job for these parameters, created if there is none; the flag tells which."""
+    params = dict(start_date=start, end_date=end or report_localdate(), period=str(period))
+    existing = ReportJob.objects.filter(status__in=ReportJob.ACTIVE, **params).first()
+    if existing is not None:
+        return existing, False
+    try:
+        with transaction.atomic():
+            return ReportJob.objects.create(**params), True
+    except IntegrityError:
+        # another request enqueued the same report in the meantime
+        return ReportJob.objects.get(status__in=ReportJob.ACTIVE, **params), False
+
+
+def claim_job(worker: str) -> Optional[ReportJob]:
+    """Marks the oldest pending job as running for `worker` and returns it."""
+    with transaction.atomic():
+        job = (
+            ReportJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=ReportJob.Status.PENDING)
+            .order_by("created_at")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = ReportJob.Status.RUNNING
+        job.worker = worker
+        job.started_at = timezone.now()
+        job.save(update_fields=["status", "worker", "started_at", "updated_at"])
+    return job
+
+
+def requeue_stale_jobs(stale_after: int) -> int:
+    """Puts running jobs without progress for `stale_after` seconds (dead workers) back in the queue."""
+    return (
+        ReportJob.objects
+        .filter(status=ReportJob.Status.RUNNING, updated_at__lt=timezone.now() - timedelta(seconds=stale_after))
+        .update(status=ReportJob.Status.PENDING, worker="", periods_done=0, updated_at=timezone.now())
+    )
+
+
+def compact_row(row) -> list:
+    return [getattr(row, column) for column in REPORT_COLUMNS]
+
+
+def run_job(job: ReportJob, chunk_periods: int = CHUNK_PERIODS):
+    """Computes a claimed job, saving the progress after every `chunk_periods` periods."""
+    jobs = ReportJob.objects.filter(pk=job.pk)
+    try:
+        report = UserOrdersReport(job.start_date, job.end_date, period=Period(job.period))
+        total = len(report)
+        jobs.update(periods_total=total, updated_at=timezone.now())
+
+        rows = []
+        for offset in range(0, total, chunk_periods):
+            rows += [compact_row(row) for row in report.rows(report.bounds(offset=offset, limit=chunk_periods))]
+            jobs.update(periods_done=len(rows), updated_at=timezone.now())
+
+        jobs.update(
+            status=ReportJob.Status.DONE,
+            result={"columns": list(REPORT_COLUMNS), "rows": rows},
+            finished_at=timezone.now(),
+            updated_at=timezone.now(),
+        )
+    except Exception as exc:
+        jobs.update(
+            status=ReportJob.Status.FAILED,
+            error=f"{type(exc).__name__}: {exc}",
+            finished_at=timezone.now(),
+            updated_at=timezone.now(),
+        )
+        raise
+    job.refresh_from_db()
+    return job
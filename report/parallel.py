@@ -0,0 +1,56 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from report.generator import Bounds, ReportRow, UserOrdersReport
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Process-wide pool the async report view fans periods out to. Every worker
+    thread uses its own DB connection, so REPORT_ASYNC_WORKERS also bounds the
+    number of connections the async reports can hold.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "REPORT_ASYNC_WORKERS", 4),
+                thread_name_prefix="report",
+            )
+        return _executor
+
+
+def _compute_period(report: UserOrdersReport, bounds: Bounds) -> list[ReportRow]:
+    close_old_connections()
+    try:
+        return list(report.rows(bounds))
+    finally:
+        close_old_connections()
+
+
+async def compute_rows_concurrently(report: UserOrdersReport, bounds: Bounds) -> list[ReportRow]:
+    """
+    Computes every period of `bounds` as a separate job on the report pool and
+    returns the rows in period order. If the awaiting task is cancelled (client
+    disconnected), periods that have not started yet are dropped.
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    futures = [
+        loop.run_in_executor(executor, _compute_period, report, [period_bounds])
+        for period_bounds in bounds
+    ]
+    try:
+        results = await asyncio.gather(*futures)
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+    return [row for rows in results for row in rows]
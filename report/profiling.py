@@ -0,0 +1,157 @@
+"""
+Opt-in profiling of report requests (settings.REPORT_PROFILING).
+
+A ReportProfile collects exclusive wall time per stage and every SQL statement
+run while report rows are produced, attributed to the period whose row was
+being built. Engines that cover several periods with one statement (e.g.
+"bucketed") show it under the first period of the batch.
+"""
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.db import connection
+
+from report.generator import period_label
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("validate", "query", "build", "paginate", "render")
+
+
+def profiling_enabled() -> bool:
+    return getattr(settings, "REPORT_PROFILING", False)
+
+
+def profile_stage(profile: Optional["ReportProfile"], name: str):
+    return profile.stage(name) if profile is not None else nullcontext()
+
+
+@dataclass
+class Statement:
+    sql: str
+    params: Optional[tuple]
+    many: bool
+    duration: float
+    period: Optional[str]
+
+
+class ReportProfile:
+    def __init__(self):
+        self.stages: dict[str, float] = {}
+        self.statements: list[Statement] = []
+        self.current_period: Optional[str] = None
+        self._stack: list[float] = []
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Times the block as `name`, minus the time of stages nested in it."""
+        started = time.perf_counter()
+        self._stack.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            nested = self._stack.pop()
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed - nested
+            if self._stack:
+                self._stack[-1] += elapsed
+
+    def __call__(self, execute, sql, params, many, context):
+        """connection.execute_wrapper hook."""
+        started = time.perf_counter()
+        try:
+            with self.stage("query"):
+                return execute(sql, params, many, context)
+        finally:
+            self.statements.append(Statement(
+                sql=sql,
+                params=params,
+                many=many,
+                duration=time.perf_counter() - started,
+                period=self.current_period,
+            ))
+
+    def track_rows(self, rows, bounds) -> Iterator:
+        """
+        Passes the rows through, timing each one as "build" and recording the
+        statements run while it is produced. The wrapper is installed around
+        every step, so rows consumed later (streaming responses) are covered too.
+        """
+        rows = iter(rows)
+        for start, end in bounds:
+            self.current_period = period_label(start, end)
+            try:
+                with self.stage("build"), connection.execute_wrapper(self):
+                    row = next(rows)
+            except StopIteration:
+                return
+            finally:
+                self.current_period = None
+            yield row
+
+    def track_stream(self, chunks, label: str) -> Iterator:
+        """Times producing every chunk of a streamed body as "render" and logs the profile at the end."""
+        chunks = iter(chunks)
+        while True:
+            with self.stage("render"):
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+        self.log(label)
+
+    @property
+    def total(self) -> float:
+        return time.perf_counter() - self._started
+
+    def per_period(self) -> dict[str, dict]:
+        periods = defaultdict(lambda: {"queries": 0, "db_ms": 0.0})
+        for statement in self.statements:
+            stats = periods[statement.period]
+            stats["queries"] += 1
+            stats["db_ms"] += statement.duration * 1000
+        return dict(periods)
+
+    def server_timing(self) -> str:
+        metrics = []
+        names = [name for name in STAGES if name in self.stages]
+        names += [name for name in self.stages if name not in STAGES]
+        for name in names:
+            seconds = self.stages[name]
+            metric = f"{name};dur={seconds * 1000:.2f}"
+            if name == "query":
+                metric += f';desc="{len(self.statements)} statements"'
+            metrics.append(metric)
+        metrics.append(f"total;dur={self.total * 1000:.2f}")
+        return ", ".join(metrics)
+
+    def slowest(self, limit: int) -> list[Statement]:
+        return sorted(self.statements, key=lambda statement: statement.duration, reverse=True)[:limit]
+
+    def log(self, label: str):
+        """Logs the stages and per-period statements, plus EXPLAIN of the slowest statements if configured."""
+        logger.info("%s: %s", label, self.server_timing())
+        for period, stats in self.per_period().items():
+            logger.info("%s: period %s: %d statements, %.2f ms", label, period, stats["queries"], stats["db_ms"])
+
+        for statement in self.slowest(getattr(settings, "REPORT_PROFILING_EXPLAIN_SLOWEST", 0)):
+            logger.info(
+                "%s: %.2f ms (period %s)\n%s\n%s",
+                label, statement.duration * 1000, statement.period, statement.sql, explain(statement),
+            )
+
+
+def explain(statement: Statement, analyze: bool = False) -> str:
+    """EXPLAIN of a recorded SELECT; with `analyze` it is run again, with buffer usage."""
+    if statement.many or not statement.sql.lstrip().upper().startswith("SELECT"):
+        return "(not explained)"
+    options = "(ANALYZE, BUFFERS) " if analyze else ""
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN {options}{statement.sql}", statement.params)
+        return "\n".join(str(line[0]) for line in cursor.fetchall())
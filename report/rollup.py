@@ -0,0 +1,161 @@
+from bisect import bisect_left
+from datetime import date, timedelta
+from typing import Iterable, Iterator, Optional
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from orders.models import DailyReportRollup, PendingRollupDay
+from report.chrono import as_aware_datetime, report_localdate, report_timezone
+from report.generator import Bounds, ReportRow, empty_row, report_aggregates
+
+# queued days refreshed per refresh_pending_rollup_days call
+PENDING_BATCH_DAYS = 500
+
+ROLLUP_FIELDS = (
+    "new_users",
+    "activated_users",
+    "orders_count",
+    "orderitem1_count",
+    "orderitem1_amount",
+    "orderitem2_count",
+    "orderitem2_amount",
+)
+
+
+def _days_filter(days: list[date]) -> Q:
+    """OR of date_joined ranges, one per run of consecutive days."""
+    condition = Q()
+    run_start = run_end = None
+    for day in [*days, None]:
+        if run_end is not None and day == run_end + timedelta(days=1):
+            run_end = day
+            continue
+        if run_start is not None:
+            condition |= Q(
+                date_joined__gte=as_aware_datetime(run_start),
+                date_joined__lt=as_aware_datetime(run_end + timedelta(days=1)),
+            )
+        run_start = run_end = day
+    return condition
+
+
+def compute_rollup_days(days: Optional[Iterable[date]] = None) -> list[DailyReportRollup]:
+    """Unsaved rollup rows for `days` (all days when None) computed from the source tables."""
+    days = None if days is None else sorted(set(days))
+    if days == []:
+        return []
+
+    user_rows = get_user_model().objects.all()
+    if days is not None:
+        user_rows = user_rows.filter(_days_filter(days))
+    user_rows = user_rows.with_stats()
+    return [
+        DailyReportRollup(**row)
+        for row in (
+            user_rows
+            .annotate(day=TruncDate("date_joined", tzinfo=report_timezone()))
+            .order_by()
+            .values("day")
+            .annotate(**report_aggregates(user_rows))
+        )
+    ]
+
+
+def refresh_rollup_days(days: Optional[Iterable[date]] = None) -> int:
+    """
+    Recompute the rollup rows for `days` (all days when None) from the source tables.
+    Days that no longer have any users are removed. Returns the number of rows written.
+    """
+    days = None if days is None else sorted(set(days))
+    if days == []:
+        return 0
+    computed = compute_rollup_days(days)
+
+    with transaction.atomic():
+        stale = DailyReportRollup.objects.exclude(day__in=[r.day for r in computed])
+        if days is not None:
+            stale = stale.filter(day__in=days)
+        stale.delete()
+        DailyReportRollup.objects.bulk_create(
+            computed,
+            update_conflicts=True,
+            unique_fields=["day"],
+            update_fields=list(ROLLUP_FIELDS),
+        )
+    return len(computed)
+
+
+def queue_rollup_days(days: Iterable[date]):
+    """
+    Marks the rollups of `days` out of date for refresh_pending_rollup_days.
+    Re-queueing a day that is being refreshed waits for that refresh and
+    queues it again, so no committed write is missed.
+    """
+    now = timezone.now()
+    PendingRollupDay.objects.bulk_create(
+        [PendingRollupDay(day=day, queued_at=now) for day in set(days)],
+        update_conflicts=True,
+        unique_fields=["day"],
+        update_fields=["queued_at"],
+    )
+
+
+def refresh_pending_rollup_days(limit: int = PENDING_BATCH_DAYS) -> int:
+    """Refreshes up to `limit` queued days (oldest day first) and dequeues them. Returns how many."""
+    with transaction.atomic():
+        days = list(
+            PendingRollupDay.objects
+            .select_for_update(skip_locked=True)
+            .order_by("day")
+            .values_list("day", flat=True)[:limit]
+        )
+        if not days:
+            return 0
+        refresh_rollup_days(days)
+        PendingRollupDay.objects.filter(day__in=days).delete()
+    return len(days)
+
+
+def queue_rollups_on_change(sender, days, **kwargs):
+    queue_rollup_days(days)
+
+
+def iter_rows_from_rollups(bounds: Bounds) -> Iterator[ReportRow]:
+    """
+    Build report rows by summing the daily rollups that fall into each bound.
+    Bounds must start and end at midnight in the report timezone, as
+    generate_user_orders_report makes them; rollups cannot split a day.
+    Days queued in PendingRollupDay are out of date in the table until the
+    worker refreshes them, they are computed from the source tables instead.
+    """
+    if not bounds:
+        return
+    for bound in bounds:
+        for edge in bound:
+            if as_aware_datetime(report_localdate(edge)) != edge:
+                raise ValueError(f"rollup bounds must be whole days, {edge} is not a day start")
+
+    in_range = {
+        "day__gte": report_localdate(min(start for start, _ in bounds)),
+        "day__lte": report_localdate(max(end for _, end in bounds)),
+    }
+    by_day = {r["day"]: r for r in DailyReportRollup.objects.filter(**in_range).values("day", *ROLLUP_FIELDS)}
+    pending = list(PendingRollupDay.objects.filter(**in_range).values_list("day", flat=True))
+    if pending:
+        for day in pending:
+            by_day.pop(day, None)
+        for rollup in compute_rollup_days(pending):
+            by_day[rollup.day] = {"day": rollup.day, **{field: getattr(rollup, field) for field in ROLLUP_FIELDS}}
+    rollups = [by_day[day] for day in sorted(by_day)]
+    day_starts = [as_aware_datetime(r["day"]) for r in rollups]
+
+    for (start, end) in bounds:
+        row = empty_row(start, end)
+        for rollup in rollups[bisect_left(day_starts, start):bisect_left(day_starts, end)]:
+            for field in ROLLUP_FIELDS:
+                setattr(row, field, getattr(row, field) + rollup[field])
+        yield row
@@ -0,0 +1,356 @@
+"""
+Columnar on-disk snapshot of users, orders and items for the report.
+
+A snapshot directory holds one raw fixed-width file per column plus
+manifest.json with the format version, a generation counter, and per table the
+committed row count, the export watermark and a checksum of the exported
+columns of the rows up to the watermark. Readers memory-map the columns
+(np.memmap, mode "r"), so processes opening the same snapshot share one page
+cache copy. Exports append rows past the watermark and publish them by
+atomically replacing the manifest; bytes past the manifest row counts are
+leftovers of an interrupted export and are truncated by the next one.
+Exported rows that were inserted, deleted or updated since (is_active
+toggles, price edits, reassigned orders) change the row counts or checksums
+and make the next export a full rebuild. Full rebuilds write a new set of
+files (a new "base") so that mapped files are never truncated under a reader.
+"""
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import BigIntegerField, CharField, F, Func, Sum, Value
+from django.db.models.functions import Cast, Concat, MD5
+from django.utils import timezone
+
+from orders.models import Order, OrderItem1, OrderItem2
+from report.generator import Bounds, ReportRow, to_cents
+from report.vectorized import EPOCH, CHUNK_SIZE, ReportFrame, consistent_reads
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+
+COLUMNS = {
+    "users": {"id": "S16", "joined": "<i8", "active": "u1"},
+    "orders": {"id": "S16", "user": "<i8", "created": "<i8"},
+    "items1": {"order": "<i8", "cents": "<i8", "created": "<i8"},
+    "items2": {"order": "<i8", "cents": "<i8", "created": "<i8"},
+}
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def to_micros(value: datetime) -> int:
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def from_micros(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=value)
+
+
+def column_path(path: Path, base: int, table: str, column: str) -> Path:
+    return path / f"{table}.{column}.{base}.bin"
+
+
+def read_manifest(path: Path) -> Optional[dict]:
+    try:
+        with open(path / MANIFEST) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class Snapshot:
+    def __init__(self, path, manifest: dict):
+        self.path = Path(path)
+        self.manifest = manifest
+
+    @classmethod
+    def open(cls, path) -> "Snapshot":
+        manifest = read_manifest(Path(path))
+        if manifest is None:
+            raise SnapshotError(f"no snapshot at {path}, run export_snapshot first")
+        if manifest["format"] != FORMAT_VERSION:
+            raise SnapshotError(f"snapshot format {manifest['format']} is not supported, re-export it")
+        return cls(path, manifest)
+
+    @property
+    def generation(self) -> int:
+        return self.manifest["generation"]
+
+    def rows(self, table: str) -> int:
+        return self.manifest["tables"][table]["rows"]
+
+    def column(self, table: str, column: str) -> np.ndarray:
+        """Read-only, zero-copy view of the committed rows of a column."""
+        dtype = np.dtype(COLUMNS[table][column])
+        rows = self.rows(table)
+        if rows == 0:
+            return np.empty(0, dtype=dtype)
+        path = column_path(self.path, self.manifest["base"], table, column)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(rows,))
+
+    def frame(self) -> ReportFrame:
+        return ReportFrame.from_arrays(
+            users_joined=self.column("users", "joined").view("datetime64[us]"),
+            users_active=self.column("users", "active"),
+            order_users=self.column("orders", "user"),
+            items1=(self.column("items1", "order"), None, self.column("items1", "cents")),
+            items2=(self.column("items2", "order"), None, self.column("items2", "cents")),
+        )
+
+
+class _IdIndex:
+    """Row index lookup by 16-byte id over a snapshot id column."""
+
+    def __init__(self, ids: np.ndarray):
+        self.ids = ids
+        self.sorter = np.argsort(ids, kind="stable")
+
+    def positions(self, ids: np.ndarray, what: str) -> np.ndarray:
+        if not len(ids):
+            return np.empty(0, dtype=np.int64)
+        if not len(self.ids):
+            raise SnapshotError(f"{what} missing from the snapshot, re-export it with --full")
+        found = np.searchsorted(self.ids, ids, sorter=self.sorter)
+        found = self.sorter[np.minimum(found, len(self.ids) - 1)]
+        if (self.ids[found] != ids).any():
+            raise SnapshotError(f"{what} missing from the snapshot, re-export it with --full")
+        return found.astype(np.int64)
+
+
+def _empty_manifest(previous: Optional[dict]) -> dict:
+    return {
+        "format": FORMAT_VERSION,
+        "generation": previous["generation"] if previous else 0,
+        "base": previous.get("base", 0) + 1 if previous else 1,
+        "exported_at": None,
+        "tables": {table: {"rows": 0, "watermark": None, "checksum": 0} for table in COLUMNS},
+    }
+
+
+class _HashBits(Func):
+    """The first 60 bits of an md5 hex digest as a BIGINT (PostgreSQL)."""
+    template = "('x' || LEFT(%(expressions)s, 15))::bit(60)::bigint"
+    output_field = BigIntegerField()
+
+
+def _tables():
+    """(table, queryset, watermark field, watermark decoder, fields the exported columns come from)"""
+    return (
+        ("users", get_user_model().objects, "date_joined", from_micros, ("id", "date_joined", "is_active")),
+        ("orders", Order.objects, "created_at", from_micros, ("id", "user_id", "created_at")),
+        ("items1", OrderItem1.objects, "id", int, ("id", "order_id", "price", "created_at")),
+        ("items2", OrderItem2.objects, "id", int, ("id", "order_id", "placement_price", "article_price", "created_at")),
+    )
+
+
+def _checksum(queryset, fields) -> int:
+    """
+    Order independent checksum of `fields` over the rows: the sum of the first
+    60 bits of the md5 of each row. Summed in SQL on PostgreSQL, elsewhere the
+    row hashes are streamed.
+    """
+    parts = []
+    for field in fields:
+        parts += [Cast(field, CharField()), Value("|")]
+    row_hash = MD5(Concat(*parts[:-1]))
+    if connection.vendor == "postgresql":
+        return int(queryset.aggregate(checksum=Sum(_HashBits(row_hash)))["checksum"] or 0)
+    hashes = queryset.annotate(row_hash=row_hash).values_list("row_hash", flat=True)
+    return sum(int(value[:15], 16) for value in hashes.iterator(chunk_size=CHUNK_SIZE))
+
+
+def _exported(objects, field: str, watermark, decode):
+    if watermark is None:
+        return objects.none()
+    return objects.filter(**{f"{field}__lte": decode(watermark)})
+
+
+def _is_consistent(manifest: dict) -> bool:
+    """
+    Incremental exports only see rows past the watermarks. If the rows up to
+    the watermarks were inserted, deleted or updated since, the snapshot has to
+    be rebuilt. Costs one aggregate scan of the exported rows per table.
+    """
+    tables = manifest["tables"]
+    for table, objects, field, decode, fields in _tables():
+        state = tables[table]
+        exported = _exported(objects, field, state["watermark"], decode)
+        if exported.count() != state["rows"] or _checksum(exported, fields) != state.get("checksum"):
+            return False
+    return True
+
+
+def _store_checksums(manifest: dict):
+    tables = manifest["tables"]
+    for table, objects, field, decode, fields in _tables():
+        state = tables[table]
+        state["checksum"] = _checksum(_exported(objects, field, state["watermark"], decode), fields)
+
+
+class _Writer:
+    def __init__(self, path: Path, manifest: dict):
+        self.path = path
+        self.manifest = manifest
+
+    def column_path(self, table: str, column: str) -> Path:
+        return column_path(self.path, self.manifest["base"], table, column)
+
+    def truncate(self):
+        for table, columns in COLUMNS.items():
+            rows = self.manifest["tables"][table]["rows"]
+            for column, dtype in columns.items():
+                with open(self.column_path(table, column), "ab") as f:
+                    f.truncate(rows * np.dtype(dtype).itemsize)
+
+    def append(self, table: str, watermark, **arrays):
+        for column, dtype in COLUMNS[table].items():
+            with open(self.column_path(table, column), "ab") as f:
+                f.write(np.asarray(arrays[column], dtype=dtype).tobytes())
+        state = self.manifest["tables"][table]
+        state["rows"] += len(arrays[next(iter(arrays))])
+        state["watermark"] = watermark
+
+    def commit(self):
+        self.manifest["generation"] += 1
+        self.manifest["exported_at"] = timezone.now().isoformat()
+        tmp = self.path / f"{MANIFEST}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path / MANIFEST)
+
+        # files of replaced bases stay readable for processes that still map them
+        current = {self.column_path(table, column).name for table in COLUMNS for column in COLUMNS[table]}
+        for stale in self.path.glob("*.bin"):
+            if stale.name not in current:
+                stale.unlink()
+
+
+def _chunks(rows, size: int) -> Iterator[list]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def export_snapshot(path, full: bool = False, chunk_size: int = CHUNK_SIZE) -> dict:
+    """
+    Appends users, orders and items newer than the snapshot watermarks, or
+    rebuilds the snapshot when `full`, when there is none yet, or when the
+    exported rows no longer match the tables (row counts and checksums, see
+    _is_consistent). All reads see one snapshot of the data (consistent_reads).
+    Memory use is bounded by `chunk_size` rows plus the id indexes. Returns the
+    new manifest.
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    with consistent_reads():
+        return _export(path, full, chunk_size)
+
+
+def _export(path: Path, full: bool, chunk_size: int) -> dict:
+    previous = read_manifest(path)
+    manifest = previous
+    if full or (manifest is not None and (manifest["format"] != FORMAT_VERSION or not _is_consistent(manifest))):
+        manifest = None
+    writer = _Writer(path, manifest or _empty_manifest(previous))
+    writer.truncate()
+    tables = writer.manifest["tables"]
+
+    def newer(objects, field: str, table: str, decode):
+        watermark = tables[table]["watermark"]
+        if watermark is None:
+            return objects
+        return objects.filter(**{f"{field}__gt": decode(watermark)})
+
+    users = (
+        newer(get_user_model().objects, "date_joined", "users", from_micros)
+        .order_by("date_joined")
+        .values_list("id", "date_joined", "is_active")
+    )
+    for chunk in _chunks(users.iterator(chunk_size=chunk_size), chunk_size):
+        writer.append(
+            "users",
+            to_micros(chunk[-1][1]),
+            id=[user_id.bytes for user_id, _, _ in chunk],
+            joined=[to_micros(joined) for _, joined, _ in chunk],
+            active=[is_active for _, _, is_active in chunk],
+        )
+
+    snapshot = Snapshot(path, writer.manifest)
+    user_index = _IdIndex(snapshot.column("users", "id"))
+    orders = (
+        newer(Order.objects, "created_at", "orders", from_micros)
+        .order_by("created_at")
+        .values_list("id", "user_id", "created_at")
+    )
+    for chunk in _chunks(orders.iterator(chunk_size=chunk_size), chunk_size):
+        user_ids = np.array([user_id.bytes for _, user_id, _ in chunk], dtype="S16")
+        writer.append(
+            "orders",
+            to_micros(chunk[-1][2]),
+            id=[order_id.bytes for order_id, _, _ in chunk],
+            user=user_index.positions(user_ids, "users"),
+            created=[to_micros(created) for _, _, created in chunk],
+        )
+    del user_index
+
+    order_index = _IdIndex(snapshot.column("orders", "id"))
+    for table, objects, amount in (
+        ("items1", OrderItem1.objects, F("price")),
+        ("items2", OrderItem2.objects, F("placement_price") + F("article_price")),
+    ):
+        items = (
+            newer(objects, "id", table, int)
+            .order_by("id")
+            .annotate(amount=amount)
+            .values_list("id", "order_id", "amount", "created_at")
+        )
+        for chunk in _chunks(items.iterator(chunk_size=chunk_size), chunk_size):
+            order_ids = np.array([order_id.bytes for _, order_id, _, _ in chunk], dtype="S16")
+            writer.append(
+                table,
+                chunk[-1][0],
+                order=order_index.positions(order_ids, "orders"),
+                cents=[to_cents(amount) for _, _, amount, _ in chunk],
+                created=[to_micros(created) for _, _, _, created in chunk],
+            )
+
+    _store_checksums(writer.manifest)
+    writer.commit()
+    return writer.manifest
+
+
+_frames = {}
+_frames_lock = threading.Lock()
+
+
+def get_snapshot_frame(path=None) -> ReportFrame:
+    """Frame over the snapshot at `path`, rebuilt when a new generation is exported."""
+    path = Path(path or settings.REPORT_SNAPSHOT_DIR)
+    snapshot = Snapshot.open(path)
+    with _frames_lock:
+        generation, frame = _frames.get(path, (None, None))
+        if generation != snapshot.generation:
+            frame = snapshot.frame()
+            _frames[path] = (snapshot.generation, frame)
+        return frame
+
+
+def iter_rows_from_snapshot(bounds: Bounds) -> Iterator[ReportRow]:
+    return get_snapshot_frame().rows(bounds)
@@ -0,0 +1,185 @@
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Iterator
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+from orders.models import Order
+from report.generator import Bounds, ReportRow, period_label, to_cents
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+CHUNK_SIZE = 20_000
+
+
+def to_datetime64(values) -> np.ndarray:
+    """Aware datetimes to datetime64[us] (UTC)."""
+    micros = np.fromiter(
+        ((value - EPOCH) // timedelta(microseconds=1) for value in values),
+        dtype=np.int64,
+    )
+    return micros.astype("datetime64[us]")
+
+
+@contextmanager
+def consistent_reads():
+    """
+    Transaction whose queries see one snapshot of the data: REPEATABLE READ on
+    PostgreSQL. Inside a caller's transaction the isolation level cannot be
+    changed any more, the caller's is kept.
+    """
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        if outermost and connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        yield
+
+
+class ReportFrame:
+    """
+    Users with their lifetime order/item stats as NumPy columns, sorted by
+    date_joined. Once loaded, report rows for any bounds are worked out with
+    searchsorted over the join timestamps and prefix sums, without SQL.
+    """
+
+    def __init__(self, joined, active, orders, items1_count, items1_cents, items2_count, items2_cents):
+        order = np.argsort(joined, kind="stable")
+        self.joined = joined[order]
+        columns = dict(
+            active=active, orders=orders,
+            items1_count=items1_count, items1_cents=items1_cents,
+            items2_count=items2_count, items2_cents=items2_cents,
+        )
+        # prefix sums with a leading 0: the total of users [lo, hi) is cumsum[hi] - cumsum[lo]
+        self._cumsums = {
+            name: np.concatenate(([0], np.cumsum(column[order], dtype=np.int64)))
+            for name, column in columns.items()
+        }
+
+    def __len__(self):
+        return len(self.joined)
+
+    @classmethod
+    def load(cls) -> "ReportFrame":
+        """
+        Loads users, and orders with their item totals, with two queries that
+        see one snapshot (consistent_reads). Inside a caller's READ COMMITTED
+        transaction, orders of users committed after the first query are skipped.
+        """
+        with consistent_reads():
+            return cls._load()
+
+    @classmethod
+    def _load(cls) -> "ReportFrame":
+        users = get_user_model().objects.order_by().values_list("id", "date_joined", "is_active")
+        user_codes, joined, active = {}, [], []
+        for code, (user_id, date_joined, is_active) in enumerate(users.iterator(chunk_size=CHUNK_SIZE)):
+            user_codes[user_id] = code
+            joined.append(date_joined)
+            active.append(is_active)
+
+        orders = Order.objects.order_by().values_list(
+            "user_id", "items1_count", "items1_total", "items2_count", "items2_total",
+        )
+        order_users, items1_count, items1_cents, items2_count, items2_cents = [], [], [], [], []
+        for user_id, count1, total1, count2, total2 in orders.iterator(chunk_size=CHUNK_SIZE):
+            code = user_codes.get(user_id)
+            if code is None:
+                continue
+            order_users.append(code)
+            items1_count.append(count1)
+            items1_cents.append(to_cents(total1))
+            items2_count.append(count2)
+            items2_cents.append(to_cents(total2))
+
+        order_index = np.arange(len(order_users), dtype=np.int64)
+        return cls.from_arrays(
+            users_joined=to_datetime64(joined),
+            users_active=np.array(active, dtype=bool),
+            order_users=np.array(order_users, dtype=np.int64),
+            items1=(order_index, np.array(items1_count, dtype=np.int64), np.array(items1_cents, dtype=np.int64)),
+            items2=(order_index, np.array(items2_count, dtype=np.int64), np.array(items2_cents, dtype=np.int64)),
+        )
+
+    @classmethod
+    def from_arrays(cls, users_joined, users_active, order_users, items1, items2) -> "ReportFrame":
+        """
+        users_*: one entry per user, order_users: user index of every order,
+        items1/items2: (order index, item count, amount in cents) columns, one
+        entry per pre-grouped order total, or per item with counts=None.
+        """
+        n_users = len(users_joined)
+        columns = {}
+        for prefix, (orders, counts, cents) in (("items1", items1), ("items2", items2)):
+            users = order_users[orders]
+            if counts is None:
+                columns[f"{prefix}_count"] = np.bincount(users, minlength=n_users)
+            else:
+                columns[f"{prefix}_count"] = np.bincount(users, weights=counts, minlength=n_users).astype(np.int64)
+            columns[f"{prefix}_cents"] = _bincount_cents(users, cents, n_users)
+        return cls(
+            joined=users_joined,
+            active=users_active.astype(np.int64),
+            orders=np.bincount(order_users, minlength=n_users),
+            **columns,
+        )
+
+    def rows(self, bounds: Bounds) -> Iterator[ReportRow]:
+        if not bounds:
+            return
+        starts = to_datetime64(start for start, _ in bounds)
+        ends = to_datetime64(end for _, end in bounds)
+        lo = np.searchsorted(self.joined, starts, side="left")
+        hi = np.searchsorted(self.joined, ends, side="left")
+        totals = {name: cumsum[hi] - cumsum[lo] for name, cumsum in self._cumsums.items()}
+
+        for idx, (start, end) in enumerate(bounds):
+            yield ReportRow(
+                period=period_label(start, end),
+                new_users=int(hi[idx] - lo[idx]),
+                activated_users=int(totals["active"][idx]),
+                orders_count=int(totals["orders"][idx]),
+                orderitem1_count=int(totals["items1_count"][idx]),
+                orderitem1_cents=int(totals["items1_cents"][idx]),
+                orderitem2_count=int(totals["items2_count"][idx]),
+                orderitem2_cents=int(totals["items2_cents"][idx]),
+            )
+
+
+def _bincount_cents(users, cents, n_users) -> np.ndarray:
+    # float64 weights are exact for integers below 2**53 cents per user
+    return np.rint(np.bincount(users, weights=cents, minlength=n_users)).astype(np.int64)
+
+
+_frame = None
+_frame_loaded_at = 0.0
+_frame_lock = threading.Lock()
+
+
+def get_frame() -> ReportFrame:
+    """
+    Process-wide frame, reloaded once it is older than REPORT_FRAME_MAX_AGE
+    seconds. Data written after the load is not visible until then.
+    """
+    global _frame, _frame_loaded_at
+    with _frame_lock:
+        max_age = getattr(settings, "REPORT_FRAME_MAX_AGE", 300)
+        if _frame is None or time.monotonic() - _frame_loaded_at > max_age:
+            _frame = ReportFrame.load()
+            _frame_loaded_at = time.monotonic()
+        return _frame
+
+
+def reset_frame():
+    global _frame
+    with _frame_lock:
+        _frame = None
+
+
+def iter_rows_vectorized(bounds: Bounds) -> Iterator[ReportRow]:
+    return get_frame().rows(bounds)